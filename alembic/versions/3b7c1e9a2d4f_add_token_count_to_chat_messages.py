@@ -0,0 +1,71 @@
+"""Add token_count to chat_messages
+
+Revision ID: 3b7c1e9a2d4f
+Revises: f0db5629e9f7
+Create Date: 2025-03-02 14:10:21.418305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b7c1e9a2d4f'
+down_revision: Union[str, None] = 'f0db5629e9f7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+
+def _token_counter():
+    """
+    Подсчёт токенов для backfill. Миграция не зависит от кода приложения:
+    tiktoken (cl100k_base) грузим здесь же, без него — та же приближённая
+    оценка, что в token_counter.estimate_tokens (~3 символа на токен).
+    """
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return lambda text: (len(text) + 2) // 3
+    return lambda text: len(encoding.encode(text, disallowed_special=())) if text else 0
+
+
+def upgrade() -> None:
+    op.add_column('chat_messages', sa.Column('token_count', sa.Integer(), nullable=True))
+
+    # Backfill: считаем токены для существующих сообщений пачками по id
+    chat_messages = sa.table(
+        'chat_messages',
+        sa.column('id', sa.Integer),
+        sa.column('content', sa.String),
+        sa.column('token_count', sa.Integer),
+    )
+    count_tokens = _token_counter()
+    conn = op.get_bind()
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(chat_messages.c.id, chat_messages.c.content)
+            .where(chat_messages.c.id > last_id)
+            .order_by(chat_messages.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        conn.execute(
+            chat_messages.update()
+            .where(chat_messages.c.id == sa.bindparam('msg_id'))
+            .values(token_count=sa.bindparam('tokens')),
+            [{'msg_id': row.id, 'tokens': count_tokens(row.content or '')} for row in rows]
+        )
+        last_id = rows[-1].id
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('chat_messages') as batch_op:
+        batch_op.drop_column('token_count')
@@ -0,0 +1,34 @@
+"""Add lookup indexes
+
+Revision ID: 5d2a8f17c3e6
+Revises: c41d9f6e8a25
+Create Date: 2025-03-11 10:27:44.281930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2a8f17c3e6'
+down_revision: Union[str, None] = 'c41d9f6e8a25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # История чата: WHERE chat_id = ? ORDER BY id — без сортировки и без скана
+    op.create_index('ix_chat_messages_chat_id_id', 'chat_messages', ['chat_id', 'id'], unique=False)
+    # Списки чатов пользователя
+    op.create_index('ix_user_chats_user_id', 'user_chats', ['user_id'], unique=False)
+    # Поиск платежа по order_id (webhook) и история платежей пользователя
+    op.create_index('ix_transactions_order_id', 'transactions', ['order_id'], unique=False)
+    op.create_index('ix_transactions_user_id', 'transactions', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_transactions_user_id', table_name='transactions')
+    op.drop_index('ix_transactions_order_id', table_name='transactions')
+    op.drop_index('ix_user_chats_user_id', table_name='user_chats')
+    op.drop_index('ix_chat_messages_chat_id_id', table_name='chat_messages')
@@ -0,0 +1,29 @@
+"""Add rolling summary to user_chats
+
+Revision ID: 8e2a5c71f0b3
+Revises: 3b7c1e9a2d4f
+Create Date: 2025-03-05 11:42:07.193554
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e2a5c71f0b3'
+down_revision: Union[str, None] = '3b7c1e9a2d4f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('user_chats', sa.Column('summary', sa.String(), nullable=True))
+    op.add_column('user_chats', sa.Column('summary_message_id', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('user_chats') as batch_op:
+        batch_op.drop_column('summary_message_id')
+        batch_op.drop_column('summary')
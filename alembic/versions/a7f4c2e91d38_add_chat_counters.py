@@ -0,0 +1,59 @@
+"""Add message_count/last_message_at to user_chats
+
+Revision ID: a7f4c2e91d38
+Revises: 5d2a8f17c3e6
+Create Date: 2025-03-13 16:48:02.775410
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7f4c2e91d38'
+down_revision: Union[str, None] = '5d2a8f17c3e6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('user_chats', sa.Column('message_count', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('user_chats', sa.Column('last_message_at', sa.DateTime(), nullable=True))
+
+    # Backfill: число сообщений считаем по истории. Времени сообщений в БД нет,
+    # поэтому старые чаты получают одинаковый last_message_at и
+    # сортируются между собой по id (новые выше).
+    user_chats = sa.table(
+        'user_chats',
+        sa.column('id', sa.Integer),
+        sa.column('message_count', sa.Integer),
+        sa.column('last_message_at', sa.DateTime),
+    )
+    chat_messages = sa.table('chat_messages', sa.column('chat_id', sa.Integer))
+    op.execute(
+        user_chats.update().values(
+            message_count=sa.select(sa.func.count())
+            .where(chat_messages.c.chat_id == user_chats.c.id)
+            .scalar_subquery(),
+            last_message_at=sa.func.current_timestamp(),
+        )
+    )
+
+    # Составной индекс покрывает и поиск по user_id — одиночный больше не нужен
+    op.create_index(
+        'ix_user_chats_user_id_last_message_at',
+        'user_chats',
+        ['user_id', 'last_message_at', 'id'],
+        unique=False
+    )
+    op.drop_index('ix_user_chats_user_id', table_name='user_chats')
+
+
+def downgrade() -> None:
+    op.create_index('ix_user_chats_user_id', 'user_chats', ['user_id'], unique=False)
+    op.drop_index('ix_user_chats_user_id_last_message_at', table_name='user_chats')
+    with op.batch_alter_table('user_chats') as batch_op:
+        batch_op.drop_column('last_message_at')
+        batch_op.drop_column('message_count')
@@ -0,0 +1,32 @@
+"""Add bot_state
+
+Revision ID: b58e0c3d9a61
+Revises: e6b3d0a4f172
+Create Date: 2025-03-18 10:05:12.604117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b58e0c3d9a61'
+down_revision: Union[str, None] = 'e6b3d0a4f172'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('bot_state',
+    sa.Column('namespace', sa.String(), nullable=False),
+    sa.Column('key', sa.String(), nullable=False),
+    sa.Column('data', sa.String(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('namespace', 'key')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('bot_state')
@@ -0,0 +1,32 @@
+"""Add telegram_assets
+
+Revision ID: c41d9f6e8a25
+Revises: 8e2a5c71f0b3
+Create Date: 2025-03-08 18:03:55.602117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41d9f6e8a25'
+down_revision: Union[str, None] = '8e2a5c71f0b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('telegram_assets',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('bot_id', sa.String(), nullable=False),
+    sa.Column('checksum', sa.String(), nullable=False),
+    sa.Column('file_id', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('name', 'bot_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('telegram_assets')
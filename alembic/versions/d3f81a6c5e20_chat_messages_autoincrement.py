@@ -0,0 +1,65 @@
+"""chat_messages: AUTOINCREMENT ids
+
+Revision ID: d3f81a6c5e20
+Revises: b58e0c3d9a61
+Create Date: 2025-03-19 09:42:17.215630
+
+"""
+import json
+import zlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3f81a6c5e20'
+down_revision: Union[str, None] = 'b58e0c3d9a61'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _max_archived_id(bind) -> int:
+    """Наибольший id среди сообщений, лежащих в chat_archives (zlib(JSON [[id, ...], ...]))."""
+    top = 0
+    for (payload,) in bind.execute(sa.text("SELECT payload FROM chat_archives")):
+        rows = json.loads(zlib.decompress(payload).decode("utf-8"))
+        top = max([top] + [row[0] for row in rows])
+    return top
+
+
+def upgrade() -> None:
+    # Без AUTOINCREMENT SQLite выдаёт max(id)+1 и повторно использует id
+    # удалённых (заархивированных) сообщений — возврат из архива с прежними id
+    # упирается в IntegrityError. В других СУБД последовательности id не переиспользуют.
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite':
+        return
+
+    with op.batch_alter_table(
+        'chat_messages', recreate='always', table_kwargs={'sqlite_autoincrement': True}
+    ) as batch_op:
+        pass
+
+    # Счётчик не ниже id, уже выданных заархивированным сообщениям
+    top = max(
+        _max_archived_id(bind),
+        bind.execute(sa.text("SELECT COALESCE(MAX(id), 0) FROM chat_messages")).scalar(),
+    )
+    bind.execute(sa.text("DELETE FROM sqlite_sequence WHERE name = 'chat_messages'"))
+    bind.execute(
+        sa.text("INSERT INTO sqlite_sequence (name, seq) VALUES ('chat_messages', :seq)"),
+        {"seq": top},
+    )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite':
+        return
+
+    with op.batch_alter_table(
+        'chat_messages', recreate='always', table_kwargs={'sqlite_autoincrement': False}
+    ) as batch_op:
+        pass
@@ -0,0 +1,33 @@
+"""Add chat_archives
+
+Revision ID: e6b3d0a4f172
+Revises: a7f4c2e91d38
+Create Date: 2025-03-16 12:20:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6b3d0a4f172'
+down_revision: Union[str, None] = 'a7f4c2e91d38'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('chat_archives',
+    sa.Column('chat_id', sa.Integer(), nullable=False),
+    sa.Column('message_count', sa.Integer(), nullable=False),
+    sa.Column('payload', sa.LargeBinary(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['chat_id'], ['user_chats.id'], ),
+    sa.PrimaryKeyConstraint('chat_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('chat_archives')
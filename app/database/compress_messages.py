@@ -0,0 +1,131 @@
+# app/database/compress_messages.py
+"""
+Фоновое сжатие уже сохранённых ChatMessage.content (SQLite) и бенчмарк.
+
+    python -m app.database.compress_messages             # сжать старые строки
+    python -m app.database.compress_messages --benchmark # экономия и цена декодирования
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+
+from sqlalchemy import select, update, func, type_coerce, String
+
+from app.database.compression import compress_text, decompress_text
+from app.database.models import ChatMessage
+from app.services.token_counter import count_tokens, load_encoding_in_background
+
+logger = logging.getLogger(__name__)
+
+# Сырое значение колонки (str или bytes) — без распаковки в CompressibleText
+_raw_content = type_coerce(ChatMessage.content, String)
+
+
+async def compress_existing_messages(
+    session_factory,
+    batch_size: int = 500,
+    pause: float = 0.05,
+    min_bytes: int | None = None,
+) -> dict:
+    """
+    Сжимает несжатые строки chat_messages пачками по batch_size (по возрастанию id),
+    каждая пачка — отдельная короткая транзакция, между пачками — пауза,
+    чтобы не мешать боту. Заодно заполняет token_count, если его не было.
+    Можно прерывать и запускать снова: сжатые строки пропускаются.
+    Возвращает статистику: просмотрено/сжато строк и байты до/после.
+    """
+    stats = {"scanned": 0, "compressed": 0, "bytes_before": 0, "bytes_after": 0}
+    last_id = 0
+    while True:
+        async with session_factory() as session:
+            stmt = (
+                select(ChatMessage.id, _raw_content, ChatMessage.token_count)
+                .where(ChatMessage.id > last_id, func.typeof(ChatMessage.content) == "text")
+                .order_by(ChatMessage.id.asc())
+                .limit(batch_size)
+            )
+            rows = (await session.execute(stmt)).all()
+            if not rows:
+                break
+            for message_id, content, token_count in rows:
+                stats["scanned"] += 1
+                packed = compress_text(content, min_bytes=min_bytes)
+                if isinstance(packed, str):
+                    continue
+                values = {"content": packed}
+                if token_count is None:
+                    values["token_count"] = count_tokens(content)
+                await session.execute(
+                    update(ChatMessage).where(ChatMessage.id == message_id).values(**values)
+                )
+                stats["compressed"] += 1
+                stats["bytes_before"] += len(content.encode("utf-8"))
+                stats["bytes_after"] += len(packed)
+            await session.commit()
+            last_id = rows[-1][0]
+        logger.info(f"Сжатие сообщений: {stats}")
+        await asyncio.sleep(pause)
+    return stats
+
+
+async def benchmark(session_factory, sample_size: int = 1000, min_bytes: int | None = None) -> dict:
+    """
+    На последних sample_size сообщениях: сколько места экономит сжатие
+    (в том числе для ещё несжатых строк) и сколько стоит распаковка.
+    """
+    async with session_factory() as session:
+        stmt = select(_raw_content).order_by(ChatMessage.id.desc()).limit(sample_size)
+        raw_values = (await session.execute(stmt)).scalars().all()
+
+    texts = [decompress_text(value) for value in raw_values]
+    packed = [compress_text(text, min_bytes=min_bytes) for text in texts]
+    stored_now = [value if isinstance(value, bytes) else value.encode("utf-8") for value in raw_values]
+
+    started = time.perf_counter()
+    for value in packed:
+        decompress_text(value)
+    decode_seconds = time.perf_counter() - started
+
+    plain_bytes = sum(len(text.encode("utf-8")) for text in texts)
+    packed_bytes = sum(len(v) if isinstance(v, bytes) else len(v.encode("utf-8")) for v in packed)
+    return {
+        "messages": len(texts),
+        "compressible": sum(isinstance(v, bytes) for v in packed),
+        "plain_bytes": plain_bytes,
+        "stored_bytes": sum(len(v) for v in stored_now),
+        "compressed_bytes": packed_bytes,
+        "savings": round(1 - packed_bytes / plain_bytes, 4) if plain_bytes else 0.0,
+        "decode_us_per_message": round(decode_seconds / len(texts) * 1e6, 2) if texts else 0.0,
+    }
+
+
+def main() -> None:
+    from app.database.connection import engine, async_session_maker
+
+    parser = argparse.ArgumentParser(description="Сжатие ChatMessage.content")
+    parser.add_argument("--benchmark", action="store_true", help="только измерить, ничего не меняя")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--pause", type=float, default=0.05)
+    parser.add_argument("--sample-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    async def run():
+        # token_count пересчитываем точно, если токенизатор доступен
+        await load_encoding_in_background()
+        try:
+            if args.benchmark:
+                result = await benchmark(async_session_maker, args.sample_size)
+            else:
+                result = await compress_existing_messages(async_session_maker, args.batch_size, args.pause)
+            print(result)
+        finally:
+            await engine.dispose()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
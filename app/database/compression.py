@@ -0,0 +1,96 @@
+# app/database/compression.py
+
+import logging
+import zlib
+from functools import lru_cache
+
+from sqlalchemy.types import TypeDecorator, String
+
+from app.config import (
+    CHAT_COMPRESSION_ENABLED,
+    CHAT_COMPRESSION_CODEC,
+    CHAT_COMPRESSION_MIN_BYTES,
+    CHAT_COMPRESSION_LEVEL,
+)
+
+logger = logging.getLogger(__name__)
+
+# Первый байт сжатого значения — формат полезной нагрузки
+MARKER_ZLIB = 0x01
+MARKER_ZSTD = 0x02
+
+
+@lru_cache(maxsize=1)
+def _zstd():
+    """
+    Модуль zstandard, если он установлен. Иначе None — тогда сжимаем zlib.
+    """
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        logger.warning("zstandard не установлен, для сжатия сообщений используется zlib")
+        return None
+
+
+def compress_text(
+    text: str,
+    codec: str | None = None,
+    min_bytes: int | None = None,
+    level: int | None = None,
+) -> str | bytes:
+    """
+    Сжимает text, если он не короче min_bytes (в UTF-8) и сжатие даёт выигрыш.
+    Возвращает bytes (маркер + данные) или исходную строку.
+    Параметры по умолчанию — CHAT_COMPRESSION_* из config.
+    """
+    codec = codec or CHAT_COMPRESSION_CODEC
+    min_bytes = CHAT_COMPRESSION_MIN_BYTES if min_bytes is None else min_bytes
+    level = CHAT_COMPRESSION_LEVEL if level is None else level
+    raw = text.encode("utf-8")
+    if len(raw) < min_bytes:
+        return text
+    zstd = _zstd() if codec == "zstd" else None
+    if zstd is not None:
+        packed = bytes([MARKER_ZSTD]) + zstd.ZstdCompressor(level=level).compress(raw)
+    else:
+        packed = bytes([MARKER_ZLIB]) + zlib.compress(raw, level)
+    return packed if len(packed) < len(raw) else text
+
+
+def decompress_text(value: str | bytes) -> str:
+    """Обратное к compress_text: строки возвращаются как есть."""
+    if isinstance(value, str):
+        return value
+    marker, payload = value[0], value[1:]
+    if marker == MARKER_ZLIB:
+        return zlib.decompress(payload).decode("utf-8")
+    if marker == MARKER_ZSTD:
+        zstd = _zstd()
+        if zstd is None:
+            raise RuntimeError("Сообщение сжато zstd, но пакет zstandard не установлен")
+        return zstd.ZstdDecompressor().decompress(payload).decode("utf-8")
+    raise ValueError(f"Неизвестный формат сжатого сообщения: {marker:#x}")
+
+
+class CompressibleText(TypeDecorator):
+    """
+    Строковая колонка, большие значения которой хранятся сжатыми (BLOB с маркером).
+    Только для SQLite: колонка остаётся VARCHAR, а SQLite хранит в ней и BLOB.
+    На других СУБД и при выключенном сжатии значения пишутся как обычный текст;
+    чтение понимает оба варианта, поэтому старые строки не требуют миграции.
+    """
+
+    impl = String
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        # bytes — уже сжатое значение (см. compress_messages)
+        if not isinstance(value, str) or not CHAT_COMPRESSION_ENABLED or dialect.name != "sqlite":
+            return value
+        return compress_text(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return value
+        return decompress_text(value)
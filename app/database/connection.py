@@ -1,15 +1,143 @@
 # app/database/connection.py
 
-import os
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
+import time
 from typing import AsyncGenerator
 
-DATABASE_URL = os.getenv("DB_URL")  # или берёте из config.py
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.config import (
+    DB_URL,
+    DB_ECHO,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE,
+    SQLITE_WAL,
+    SQLITE_SYNCHRONOUS,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_MMAP_SIZE,
+    PG_STATEMENT_CACHE_SIZE,
+)
+
+
+class PoolMetrics:
+    """
+    Ожидание соединения из пула (сколько раз, суммарно/максимум секунд,
+    сколько раз упёрлись в таймаут) и текущая загрузка пула.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record_wait(self, seconds: float, timed_out: bool = False) -> None:
+        if timed_out:
+            self.timeouts += 1
+            return
+        self.checkouts += 1
+        self.wait_total += seconds
+        self.wait_max = max(self.wait_max, seconds)
+
+    def snapshot(self, pool) -> dict:
+        data = {
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_avg_ms": round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+            "wait_max_ms": round(self.wait_max * 1000, 3),
+        }
+        if isinstance(pool, AsyncAdaptedQueuePool):
+            capacity = pool.size() + max(pool._max_overflow, 0)
+            checked_out = pool.checkedout()
+            data.update(
+                pool_size=pool.size(),
+                checked_out=checked_out,
+                overflow=max(pool.overflow(), 0),
+                saturation=round(checked_out / capacity, 4) if capacity else 0.0,
+            )
+        return data
+
+
+# Метрики пула процесса (движок в процессе один)
+pool_metrics = PoolMetrics()
+
+
+class MeteredQueuePool(AsyncAdaptedQueuePool):
+    """Очередь соединений, которая замеряет время ожидания checkout."""
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            pool_metrics.record_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        pool_metrics.record_wait(time.perf_counter() - started)
+        return connection
+
+
+def _is_sqlite_memory(url) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """PRAGMA на каждое новое соединение SQLite."""
+    cursor = dbapi_connection.cursor()
+    try:
+        if SQLITE_WAL:
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={int(SQLITE_BUSY_TIMEOUT_MS)}")
+        cursor.execute(f"PRAGMA mmap_size={int(SQLITE_MMAP_SIZE)}")
+    finally:
+        cursor.close()
+
+
+def create_db_engine(url: str = DB_URL, echo: bool = DB_ECHO) -> AsyncEngine:
+    """
+    Создаёт AsyncEngine по настройкам из config:
+      - пул (размер/overflow/таймаут/recycle) с замером ожидания checkout;
+      - SQLite: WAL, synchronous, busy_timeout, mmap_size на каждом соединении;
+      - PostgreSQL (asyncpg): размер кэша подготовленных запросов.
+    """
+    parsed = make_url(url)
+    kwargs = {"echo": echo}
+
+    if not _is_sqlite_memory(parsed):
+        kwargs.update(
+            poolclass=MeteredQueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=parsed.get_backend_name() != "sqlite",
+        )
+    if parsed.get_driver_name() == "asyncpg":
+        kwargs["connect_args"] = {"statement_cache_size": PG_STATEMENT_CACHE_SIZE}
+
+    new_engine = create_async_engine(parsed, **kwargs)
+    if parsed.get_backend_name() == "sqlite":
+        event.listen(new_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    return new_engine
+
+
+# Единственный движок и фабрика сессий приложения (бот, FastAPI, вебхуки)
+engine = create_db_engine()
 async_session_maker = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
+
+def pool_snapshot() -> dict:
+    return pool_metrics.snapshot(engine.pool)
+
+
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_maker() as session:
         yield session
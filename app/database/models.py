@@ -6,11 +6,15 @@ from sqlalchemy import (
     String,
     DateTime,
     Boolean,
-    ForeignKey
+    ForeignKey,
+    Index,
+    LargeBinary
 )
 from sqlalchemy.orm import relationship
 import datetime
 
+from app.database.compression import CompressibleText
+
 Base = declarative_base()
 
 class User(Base):
@@ -39,12 +43,26 @@ class User(Base):
 
 class Chat(Base):
     __tablename__ = "user_chats"
+    __table_args__ = (
+        # Списки чатов пользователя: WHERE user_id = ? ORDER BY last_message_at DESC, id DESC
+        Index("ix_user_chats_user_id_last_message_at", "user_id", "last_message_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     title = Column(String, nullable=False, default="Новый чат")
     is_favorite = Column(Boolean, default=False)
 
+    # Денормализованные счётчики (обновляются в chat_service.add_message):
+    # число сообщений и время последнего (у нового чата — время создания).
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_message_at = Column(DateTime, nullable=True, default=datetime.datetime.utcnow)
+
+    # Сжатая «выжимка» старой части диалога (см. summary_service)
+    # и id последнего сообщения, которое в неё уже вошло.
+    summary = Column(String, nullable=True)
+    summary_message_id = Column(Integer, nullable=True)
+
     user = relationship("User", back_populates="chats")
     messages = relationship(
         "ChatMessage",
@@ -54,19 +72,53 @@ class Chat(Base):
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        # История чата читается как WHERE chat_id = ? ORDER BY id
+        Index("ix_chat_messages_chat_id_id", "chat_id", "id"),
+        # id не переиспользуются: сообщения возвращаются из архива с прежними id
+        {"sqlite_autoincrement": True},
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     chat_id = Column(Integer, ForeignKey("user_chats.id"), nullable=False)
     role = Column(String, nullable=False)  # user / assistant / system
-    content = Column(String, nullable=False)
+    # Большие тексты хранятся сжатыми, если включено CHAT_COMPRESSION_ENABLED
+    content = Column(CompressibleText, nullable=False)
+    # Число токенов в content (считается при вставке, см. token_counter)
+    token_count = Column(Integer, nullable=True)
 
     chat = relationship("Chat", back_populates="messages")
 
+class ChatArchive(Base):
+    """
+    Сообщения неактивного чата, вынесенные из chat_messages одним сегментом
+    (см. app/services/archive_service.py). Возвращаются при обращении к чату.
+    """
+    __tablename__ = "chat_archives"
+
+    chat_id = Column(Integer, ForeignKey("user_chats.id"), primary_key=True)
+    message_count = Column(Integer, nullable=False)
+    # zlib(JSON [[id, role, content, token_count], ...])
+    payload = Column(LargeBinary, nullable=False)
+    archived_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+class BotState(Base):
+    """
+    Состояние PTB между перезапусками (см. app/telegram_bot/persistence.py):
+    namespace "user"/"chat" — user_data/chat_data, "conversation:<имя>" — состояния диалогов.
+    """
+    __tablename__ = "bot_state"
+
+    namespace = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)   # id пользователя/чата или JSON-ключ диалога
+    data = Column(String, nullable=False)    # JSON
+    updated_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+
 class Transaction(Base):
     __tablename__ = "transactions"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
 
     amount_rub = Column(Float, default=0.0)
     tokens = Column(Float, default=0.0)
@@ -77,6 +129,17 @@ class Transaction(Base):
         nullable=False,
         default=datetime.datetime.utcnow
     )
-    order_id = Column(String, nullable=True)  # например, "order-123"
+    order_id = Column(String, nullable=True, index=True)  # например, "order-123"
 
     user = relationship("User")
+
+class TelegramAsset(Base):
+    """
+    file_id картинок, уже загруженных в Telegram (см. app/telegram_bot/assets.py).
+    """
+    __tablename__ = "telegram_assets"
+
+    name = Column(String, primary_key=True)      # имя файла, напр. "Chats.png"
+    bot_id = Column(String, primary_key=True)    # file_id действителен только для своего бота
+    checksum = Column(String, nullable=False)    # sha256 содержимого файла
+    file_id = Column(String, nullable=False)
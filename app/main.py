@@ -1,3 +1,4 @@
+import asyncio
 import logging
 logging.basicConfig(level=logging.INFO)
 
@@ -6,14 +7,29 @@ from fastapi import FastAPI, Request
 from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
 from starlette.responses import HTMLResponse
 
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
 from contextlib import asynccontextmanager
 
-from app.config import DB_URL
+from app.database.connection import engine, async_session_maker, pool_snapshot
 from app.webhooks.tkassa_webhook import router as tkassa_router
+from app.webhooks.telegram_webhook import (
+    router as telegram_router,
+    register_webhook,
+    unregister_webhook,
+)
 from app.telegram_bot.bot import create_telegram_application
 from app.database.utils import get_db_session
+from app.telegram_bot import proxyapi_client
+from app.telegram_bot.completion_cache import completion_cache
+from app.telegram_bot.resilience import proxy_resilience
+from app.telegram_bot.model_router import model_router
+from app.telegram_bot.model_catalog import model_catalog
+from app.services.user_service import profile_cache
+from app.services.token_counter import load_encoding_in_background
+from app.services.archive_service import Archiver, archive_stats
+from app.services.chat_service import message_buffer
+from app.telegram_bot.send_scheduler import send_scheduler
+from app.telegram_bot.callback_router import callback_router
+from app.config import MESSAGE_BUFFER_ENABLED, TELEGRAM_MODE
 
 # Подключаем SQLAdmin (пакет, ориентированный на FastAPI + SQLAlchemy)
 from sqladmin import Admin, ModelView
@@ -21,14 +37,9 @@ from sqladmin import Admin, ModelView
 logger = logging.getLogger(__name__)
 
 # ------------------------------------------------------------------------------
-# 1) Создаём асинхронный движок и фабрику сессий
+# 1) Общий движок и фабрика сессий (настройки пула — см. app/database/connection.py)
 # ------------------------------------------------------------------------------
-engine = create_async_engine(DB_URL, echo=False, future=True)
-async_session_factory = sessionmaker(
-    bind=engine,
-    expire_on_commit=False,
-    class_=AsyncSession
-)
+async_session_factory = async_session_maker
 
 # ------------------------------------------------------------------------------
 # 2) (Опционально) Объявить ModelView для вашей модели, напр. User.
@@ -50,17 +61,36 @@ async_session_factory = sessionmaker(
 async def lifespan(app: FastAPI):
     """
     Lifespan-функция:
-      - Запускает Telegram-бот (PTB) в режиме polling
+      - Открывает общий пул соединений к Proxy API и загружает каталог моделей
+      - Запускает Telegram-бот (PTB) в режиме polling или webhook (TELEGRAM_MODE)
       - Настраивает SQLAdmin (админка на /admin)
     """
-    logger.info("Starting up FastAPI with PTB (polling)...")
+    logger.info(f"Starting up FastAPI with PTB ({TELEGRAM_MODE})...")
+
+    # 0) Общий HTTP-клиент к Proxy API (пул соединений + прогрев)
+    await proxyapi_client.init_client()
+    # Токенизатор грузится в фоне; пока его нет, токены считаются приближённо
+    tokenizer_task = asyncio.create_task(load_encoding_in_background())
+    # Каталог моделей: первая загрузка + фоновое обновление по TTL
+    await model_catalog.start()
+    # Фоновая архивация сообщений неактивных чатов
+    archiver = Archiver(async_session_factory)
+    archiver.start()
+    # Отложенная пачечная запись ответов ассистента
+    if MESSAGE_BUFFER_ENABLED:
+        message_buffer.start(async_session_factory)
 
     # 1) Поднимаем Telegram-бот
     application = await create_telegram_application(async_session_factory)
     await application.initialize()
     await application.start()
-    await application.updater.start_polling()
-    logger.info("Bot polling started...")
+    app.state.bot_application = application
+    if TELEGRAM_MODE == "webhook":
+        # Апдейты приходят POST-запросами на /telegram-webhook (app/webhooks/telegram_webhook.py)
+        await register_webhook(application, app.state)
+    else:
+        await application.updater.start_polling()
+        logger.info("Bot polling started...")
 
     # 2) Подключаем SQLAdmin на /admin
     admin = Admin(app, engine)
@@ -72,9 +102,29 @@ async def lifespan(app: FastAPI):
 
     # 3) Останавливаем Telegram-бот при завершении приложения
     logger.info("Shutting down PTB...")
-    await application.updater.stop()
+    if TELEGRAM_MODE == "webhook":
+        await unregister_webhook(application, app.state)
+    else:
+        await application.updater.stop()
+    coalescer = application.bot_data.get("message_coalescer")
+    if coalescer:
+        # Дорабатываем уже принятые сообщения пользователей
+        await coalescer.drain()
     await application.stop()
+    # shutdown() дописывает в БД user_data и состояния диалогов (persistence.flush)
+    await application.shutdown()
     logger.info("PTB stopped.")
+    # Дописываем в БД отложенные сообщения
+    await message_buffer.stop()
+
+    await archiver.stop()
+    if not tokenizer_task.done():
+        tokenizer_task.cancel()
+    await model_catalog.stop()
+    await proxyapi_client.close_client()
+    await completion_cache.close()
+    logger.info(f"Proxy API client closed. Completion cache stats: {completion_cache.stats}")
+    await engine.dispose()
 
 # ------------------------------------------------------------------------------
 # Инициализируем FastAPI
@@ -101,8 +151,35 @@ def root_page():
     </html>
     """
 
+# Метрики (JSON) для мониторинга: состояние Proxy API и кэшей
+@app.get("/metrics")
+def metrics(request: Request):
+    bot_application = getattr(request.app.state, "bot_application", None)
+    return {
+        "proxyapi": proxy_resilience.snapshot(),
+        "models": model_router.snapshot(),
+        "model_catalog": model_catalog.snapshot(),
+        "completion_cache": {
+            **completion_cache.stats,
+            "hit_rate": round(completion_cache.hit_rate(), 4),
+        },
+        "user_profile_cache": profile_cache.snapshot(),
+        "db_pool": pool_snapshot(),
+        "chat_archive": archive_stats,
+        "message_buffer": {**message_buffer.stats, "pending": message_buffer.pending_count()},
+        "updates": bot_application.snapshot() if bot_application else None,
+        "telegram_send": send_scheduler.snapshot(),
+        "callbacks": callback_router.stats,
+        "bot_persistence": (
+            bot_application.persistence.snapshot()
+            if bot_application and bot_application.persistence else None
+        ),
+    }
+
 # Подключаем router для T-Касса webhook
 app.include_router(tkassa_router, tags=["tkassa"])
+# Апдейты Telegram в режиме webhook
+app.include_router(telegram_router, tags=["telegram"])
 
 # ------------------------------------------------------------------------------
 # Мидлварь: создаём AsyncSession на каждый запрос, передаём в request.state.db_session
@@ -0,0 +1,166 @@
+# app/services/archive_service.py
+
+import asyncio
+import datetime
+import json
+import logging
+import zlib
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete, insert, exists
+
+from app.config import (
+    ARCHIVE_ENABLED,
+    ARCHIVE_AFTER_DAYS,
+    ARCHIVE_INTERVAL,
+    ARCHIVE_BATCH_CHATS,
+)
+from app.database.models import Chat, ChatMessage, ChatArchive
+
+logger = logging.getLogger(__name__)
+
+archive_stats = {"archived_chats": 0, "archived_messages": 0, "rehydrated_chats": 0}
+
+
+def _pack(messages: list[ChatMessage]) -> bytes:
+    rows = [[m.id, m.role, m.content, m.token_count] for m in messages]
+    return zlib.compress(json.dumps(rows, ensure_ascii=False).encode("utf-8"))
+
+
+def _unpack(payload: bytes) -> list[dict]:
+    rows = json.loads(zlib.decompress(payload).decode("utf-8"))
+    return [
+        {"id": id_, "role": role, "content": content, "token_count": token_count}
+        for id_, role, content, token_count in rows
+    ]
+
+
+async def archive_chat(session: AsyncSession, chat_db_id: int, cutoff: datetime.datetime) -> int:
+    """
+    Переносит все сообщения чата в один сегмент chat_archives, если чат
+    по-прежнему неактивен с cutoff и ещё не в архиве. Возвращает число
+    перенесённых сообщений (0 — чат пропущен). Один commit.
+    """
+    chat = await session.get(Chat, chat_db_id)
+    if chat is None or chat.last_message_at is None or chat.last_message_at >= cutoff:
+        return 0
+    if await session.get(ChatArchive, chat_db_id) is not None:
+        return 0
+
+    result = await session.execute(
+        select(ChatMessage).where(ChatMessage.chat_id == chat_db_id).order_by(ChatMessage.id.asc())
+    )
+    messages = result.scalars().all()
+    if not messages:
+        return 0
+
+    session.add(ChatArchive(chat_id=chat_db_id, message_count=len(messages), payload=_pack(messages)))
+    # Удаляем ровно заархивированные id: сообщение, пришедшее в процессе, останется
+    await session.execute(
+        delete(ChatMessage)
+        .where(ChatMessage.id.in_([m.id for m in messages]))
+        .execution_options(synchronize_session=False)
+    )
+    await session.commit()
+    for message in messages:
+        session.expunge(message)
+    return len(messages)
+
+
+async def ensure_chat_hot(session: AsyncSession, chat_db_id: int, commit: bool = True) -> bool:
+    """
+    Возвращает сообщения чата из архива в chat_messages (с прежними id,
+    поэтому курсоры истории и summary_message_id остаются верными; новые
+    сообщения эти id не займут — у chat_messages AUTOINCREMENT).
+    Для неархивированного чата — один поиск по первичному ключу.
+    commit=False — без фиксации (в составе более крупной транзакции).
+    Возвращает True, если чат был в архиве.
+    """
+    archive = await session.get(ChatArchive, chat_db_id)
+    if archive is None:
+        return False
+
+    rows = _unpack(archive.payload)
+    if rows:
+        await session.execute(insert(ChatMessage), [{**row, "chat_id": chat_db_id} for row in rows])
+    await session.delete(archive)
+    if commit:
+        await session.commit()
+    else:
+        await session.flush()
+    archive_stats["rehydrated_chats"] += 1
+    logger.info(f"Чат {chat_db_id}: {len(rows)} сообщений возвращено из архива.")
+    return True
+
+
+async def archive_inactive_chats(
+    session_factory,
+    older_than_days: int = ARCHIVE_AFTER_DAYS,
+    batch_size: int = ARCHIVE_BATCH_CHATS,
+) -> int:
+    """
+    Один проход архиватора: до batch_size чатов без активности older_than_days дней,
+    у которых ещё есть сообщения в chat_messages. Каждый чат — своя транзакция.
+    Возвращает число заархивированных чатов.
+    """
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=older_than_days)
+    async with session_factory() as session:
+        stmt = (
+            select(Chat.id)
+            .where(
+                Chat.last_message_at < cutoff,
+                exists().where(ChatMessage.chat_id == Chat.id),
+                ~exists().where(ChatArchive.chat_id == Chat.id),
+            )
+            .order_by(Chat.last_message_at.asc())
+            .limit(batch_size)
+        )
+        chat_ids = (await session.execute(stmt)).scalars().all()
+
+    archived = 0
+    for chat_db_id in chat_ids:
+        try:
+            async with session_factory() as session:
+                moved = await archive_chat(session, chat_db_id, cutoff)
+        except Exception as e:
+            logger.error(f"Не удалось заархивировать чат {chat_db_id}: {e}", exc_info=True)
+            continue
+        if moved:
+            archived += 1
+            archive_stats["archived_chats"] += 1
+            archive_stats["archived_messages"] += moved
+    if archived:
+        logger.info(f"Архивировано чатов: {archived}")
+    return archived
+
+
+class Archiver:
+    """Фоновый архиватор: проход archive_inactive_chats раз в interval секунд."""
+
+    def __init__(self, session_factory, interval: float = ARCHIVE_INTERVAL):
+        self.session_factory = session_factory
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                # Пока проход забирает полную пачку — продолжаем без паузы
+                while await archive_inactive_chats(self.session_factory) >= ARCHIVE_BATCH_CHATS:
+                    pass
+            except Exception as e:
+                logger.error(f"Ошибка архиватора: {e}", exc_info=True)
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if ARCHIVE_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -1,12 +1,21 @@
 # app/services/chat_service.py
 
+import asyncio
+import datetime
+import logging
+
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete
-from app.database.models import Chat, ChatMessage
+from sqlalchemy import select, update, delete, insert, func
+from app.config import MESSAGE_BUFFER_MAX_BATCH, MESSAGE_BUFFER_INTERVAL, MESSAGE_BUFFER_MAX_ATTEMPTS
+from app.database.models import Chat, ChatMessage, ChatArchive
+from app.services.token_counter import count_tokens, MESSAGE_OVERHEAD_TOKENS
+
+logger = logging.getLogger(__name__)
 
-async def create_chat(session: AsyncSession, user_id: int, title: str) -> Chat:
+async def create_chat(session: AsyncSession, user_id: int, title: str, commit: bool = True) -> Chat:
     """
     Создаёт новый Chat и возвращает объект Chat.
+    commit=False — только flush (id уже доступен), фиксирует вызывающий код.
     """
     new_chat = Chat(
         user_id=user_id,
@@ -14,6 +23,9 @@ async def create_chat(session: AsyncSession, user_id: int, title: str) -> Chat:
         is_favorite=False
     )
     session.add(new_chat)
+    if not commit:
+        await session.flush()
+        return new_chat
     await session.commit()
     await session.refresh(new_chat)
     return new_chat
@@ -34,6 +46,41 @@ async def get_favorite_chats(session: AsyncSession, user_id: int) -> list[Chat]:
     result = await session.execute(stmt)
     return result.scalars().all()
 
+def _user_chats_filter(user_id: int, favorites_only: bool):
+    conditions = [Chat.user_id == user_id]
+    if favorites_only:
+        conditions.append(Chat.is_favorite == True)
+    return conditions
+
+async def count_user_chats(session: AsyncSession, user_id: int, favorites_only: bool = False) -> int:
+    """
+    Число чатов пользователя (SELECT COUNT, без загрузки самих чатов).
+    """
+    stmt = select(func.count(Chat.id)).where(*_user_chats_filter(user_id, favorites_only))
+    result = await session.execute(stmt)
+    return int(result.scalar_one())
+
+async def list_user_chats(
+    session: AsyncSession,
+    user_id: int,
+    limit: int,
+    offset: int = 0,
+    favorites_only: bool = False
+) -> list[Chat]:
+    """
+    Страница чатов пользователя, свежие (по last_message_at) сверху.
+    Читается по индексу (user_id, last_message_at, id) — не больше offset + limit строк.
+    """
+    stmt = (
+        select(Chat)
+        .where(*_user_chats_filter(user_id, favorites_only))
+        .order_by(Chat.last_message_at.desc(), Chat.id.desc())
+        .offset(offset)
+        .limit(limit)
+    )
+    result = await session.execute(stmt)
+    return result.scalars().all()
+
 async def delete_chat(session: AsyncSession, chat_db_id: int) -> None:
     """
     Удаляет ChatMessage для chat_db_id, затем сам Chat.
@@ -42,8 +89,11 @@ async def delete_chat(session: AsyncSession, chat_db_id: int) -> None:
     # Если у вас cascade в моделях, достаточно удалить сам Chat.
     # Иначе - удаляем сообщения вручную.
     await session.execute(delete(ChatMessage).where(ChatMessage.chat_id == chat_db_id))
+    await session.execute(delete(ChatArchive).where(ChatArchive.chat_id == chat_db_id))
     await session.execute(delete(Chat).where(Chat.id == chat_db_id))
     await session.commit()
+    # Отложенные сообщения удалённого чата писать уже некуда
+    message_buffer.discard(chat_db_id)
 
 async def rename_chat(session: AsyncSession, chat_db_id: int, new_title: str) -> None:
     """
@@ -85,17 +135,220 @@ async def is_favorite_chat(session: AsyncSession, chat_db_id: int) -> bool:
     row = result.fetchone()
     return (row[0] == True) if row else False
 
-async def add_message(session: AsyncSession, chat_db_id: int, role: str, content: str) -> None:
+async def add_message(
+    session: AsyncSession,
+    chat_db_id: int,
+    role: str,
+    content: str,
+    commit: bool = True
+) -> None:
     """
-    Добавляет новое сообщение (ChatMessage) к чату chat_db_id.
+    Добавляет новое сообщение (ChatMessage) к чату chat_db_id
+    и обновляет Chat.message_count / Chat.last_message_at.
+    commit=False — без фиксации (в составе более крупной транзакции).
     """
     new_msg = ChatMessage(
         chat_id=chat_db_id,
         role=role,
-        content=content
+        content=content,
+        token_count=count_tokens(content)
     )
     session.add(new_msg)
-    await session.commit()
+    # Счётчики чата обновляются в той же транзакции, что и вставка
+    await session.execute(
+        update(Chat)
+        .where(Chat.id == chat_db_id)
+        .values(
+            message_count=Chat.message_count + 1,
+            last_message_at=datetime.datetime.utcnow()
+        )
+    )
+    if commit:
+        await session.commit()
+
+class MessageWriteBuffer:
+    """
+    Отложенная (write-behind) запись сообщений: add() кладёт сообщение в очередь,
+    фоновая задача пишет очередь одним executemany INSERT и одним commit
+    раз в interval секунд или как только набралось max_batch сообщений.
+
+    Чтобы чтение видело свои записи, перед чтением чата вызывается
+    flush(chat_db_id=...) или flush(owner=...) — до открытия своей сессии.
+    Все записи идут под одним asyncio.Lock, поэтому flush дожидается и пачки,
+    которая уже пишется фоном. Неудачная пачка возвращается в очередь
+    (в том числе при отмене), после max_attempts неудач — отбрасывается.
+    Пока буфер не запущен (start), add() пишет сразу, как add_message.
+    """
+
+    def __init__(
+        self,
+        max_batch: int = MESSAGE_BUFFER_MAX_BATCH,
+        interval: float = MESSAGE_BUFFER_INTERVAL,
+        max_attempts: int = MESSAGE_BUFFER_MAX_ATTEMPTS,
+    ):
+        self.max_batch = max_batch
+        self.interval = interval
+        self.max_attempts = max_attempts
+        self.session_factory = None
+        self._pending: list[dict] = []
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+        self.stats = {"queued": 0, "flushes": 0, "written": 0, "errors": 0, "dropped": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def pending_tail(self, chat_db_id: int) -> tuple[int, int]:
+        """
+        Сколько сообщений чата ждут записи и сколько в них токенов
+        (со служебными, как в count_unsummarized_tokens). Это всегда самые свежие сообщения чата.
+        """
+        rows = [row for row in self._pending if row["chat_id"] == chat_db_id]
+        return len(rows), sum(row["token_count"] + MESSAGE_OVERHEAD_TOKENS for row in rows)
+
+    async def add(
+        self,
+        session_factory,
+        chat_db_id: int,
+        role: str,
+        content: str,
+        owner: int | None = None
+    ) -> None:
+        """
+        Ставит сообщение в очередь. owner — Telegram chat_id владельца чата,
+        чтобы перед следующим запросом пользователя сбросить его сообщения.
+        """
+        if not self.running:
+            async with session_factory() as session:
+                await add_message(session, chat_db_id, role, content)
+            return
+        self._pending.append({
+            "chat_id": chat_db_id,
+            "role": role,
+            "content": content,
+            "token_count": count_tokens(content),
+            "owner": owner,
+            "created_at": datetime.datetime.utcnow(),
+            "attempts": 0,
+        })
+        self.stats["queued"] += 1
+        if len(self._pending) >= self.max_batch:
+            self._wakeup.set()
+
+    def discard(self, chat_db_id: int) -> None:
+        self._pending = [row for row in self._pending if row["chat_id"] != chat_db_id]
+
+    async def flush(self, chat_db_id: int | None = None, owner: int | None = None) -> int:
+        """
+        Пишет в БД отложенные сообщения: все, только чата chat_db_id
+        или только владельца owner. Возвращает число записанных сообщений.
+        """
+        async with self._lock:
+            if chat_db_id is None and owner is None:
+                batch, self._pending = self._pending, []
+            else:
+                batch, rest = [], []
+                for row in self._pending:
+                    matches = row["chat_id"] == chat_db_id or (owner is not None and row["owner"] == owner)
+                    (batch if matches else rest).append(row)
+                self._pending = rest
+            if not batch:
+                return 0
+            try:
+                await self._write(batch)
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Не удалось записать {len(batch)} отложенных сообщений: {e}", exc_info=True)
+                self._requeue(batch, failed=True)
+                raise
+            except BaseException:
+                # Отмена посреди записи: пачку не теряем, попытку не засчитываем
+                self._requeue(batch, failed=False)
+                raise
+            self.stats["flushes"] += 1
+            self.stats["written"] += len(batch)
+            return len(batch)
+
+    def _requeue(self, batch: list[dict], failed: bool) -> None:
+        """Возвращает пачку в начало очереди; после max_attempts неудач сообщения отбрасываются."""
+        if failed:
+            for row in batch:
+                row["attempts"] += 1
+            dropped = [row for row in batch if row["attempts"] >= self.max_attempts]
+            if dropped:
+                batch = [row for row in batch if row["attempts"] < self.max_attempts]
+                self.stats["dropped"] += len(dropped)
+                logger.error(
+                    f"Отбрасываем {len(dropped)} отложенных сообщений после {self.max_attempts} неудачных попыток "
+                    f"(чаты {sorted({row['chat_id'] for row in dropped})})"
+                )
+        self._pending = batch + self._pending
+
+    async def _write(self, batch: list[dict]) -> None:
+        per_chat: dict[int, tuple[int, datetime.datetime]] = {}
+        for row in batch:
+            count, _ = per_chat.get(row["chat_id"], (0, None))
+            per_chat[row["chat_id"]] = (count + 1, row["created_at"])
+
+        async with self.session_factory() as session:
+            await session.execute(
+                insert(ChatMessage),
+                [
+                    {key: row[key] for key in ("chat_id", "role", "content", "token_count")}
+                    for row in batch
+                ]
+            )
+            for chat_db_id, (count, last_at) in per_chat.items():
+                await session.execute(
+                    update(Chat)
+                    .where(Chat.id == chat_db_id)
+                    .values(message_count=Chat.message_count + count, last_message_at=last_at)
+                )
+            await session.commit()
+
+    async def _loop(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                pass  # уже залогировано, пачка осталась в очереди
+
+    def start(self, session_factory) -> None:
+        self.session_factory = session_factory
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        """
+        Останавливает фоновую запись и дописывает всё, что осталось в очереди.
+        Цикл не отменяется, а выходит сам — текущая пачка дописывается целиком.
+        """
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        if self._pending:
+            try:
+                await self.flush()
+            except Exception:
+                pass  # уже залогировано
+
+
+# Общий буфер процесса (запускается в lifespan при MESSAGE_BUFFER_ENABLED)
+message_buffer = MessageWriteBuffer()
 
 async def get_chat_messages(session: AsyncSession, chat_db_id: int) -> list[dict]:
     """
@@ -110,3 +363,159 @@ async def get_chat_messages(session: AsyncSession, chat_db_id: int) -> list[dict
         for row in rows
     ]
     return messages
+
+async def get_chat_history_page(
+    session: AsyncSession,
+    chat_db_id: int,
+    limit: int,
+    after_id: int | None = None,
+    before_id: int | None = None
+) -> tuple[list[dict], bool, bool]:
+    """
+    Одна страница истории чата (keyset-пагинация по ChatMessage.id):
+    - after_id — следующая страница: limit сообщений с id > after_id;
+    - before_id — предыдущая: limit сообщений с id < before_id;
+    - без курсора — первая страница.
+    Возвращает (messages, has_prev, has_next); messages — [{"id", "role", "content"}]
+    в порядке id ASC. Читается не больше limit + 1 строк плюс одна проверка EXISTS.
+    """
+    stmt = select(ChatMessage.id, ChatMessage.role, ChatMessage.content).where(
+        ChatMessage.chat_id == chat_db_id
+    )
+    if before_id is not None:
+        stmt = stmt.where(ChatMessage.id < before_id).order_by(ChatMessage.id.desc())
+    else:
+        if after_id is not None:
+            stmt = stmt.where(ChatMessage.id > after_id)
+        stmt = stmt.order_by(ChatMessage.id.asc())
+    result = await session.execute(stmt.limit(limit + 1))
+    rows = result.all()
+
+    # Лишняя (limit + 1)-я строка говорит, есть ли ещё сообщения в направлении чтения
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if before_id is not None:
+        rows.reverse()
+    messages = [{"id": id_, "role": role, "content": content} for id_, role, content in rows]
+    if not messages:
+        return messages, False, False
+
+    # С другой стороны страницы — одна проверка EXISTS по индексу
+    if before_id is not None:
+        has_prev = has_more
+        has_next = await _has_messages(session, chat_db_id, ChatMessage.id > messages[-1]["id"])
+    elif after_id is not None:
+        has_next = has_more
+        has_prev = await _has_messages(session, chat_db_id, ChatMessage.id < messages[0]["id"])
+    else:
+        has_prev, has_next = False, has_more
+    return messages, has_prev, has_next
+
+async def _has_messages(session: AsyncSession, chat_db_id: int, condition) -> bool:
+    stmt = select(select(ChatMessage.id).where(ChatMessage.chat_id == chat_db_id, condition).exists())
+    result = await session.execute(stmt)
+    return bool(result.scalar())
+
+def _message_tokens():
+    """
+    SQL-выражение: токены сообщения + служебные токены.
+    Для старых строк без token_count — оценка по длине текста.
+    """
+    return func.coalesce(
+        ChatMessage.token_count,
+        (func.length(ChatMessage.content) + 2) // 3
+    ) + MESSAGE_OVERHEAD_TOKENS
+
+async def get_chat_tail(
+    session: AsyncSession,
+    chat_db_id: int,
+    token_budget: int,
+    after_id: int | None = None
+) -> list[dict]:
+    """
+    Возвращает самые свежие сообщения чата (role, content), суммарно
+    укладывающиеся в token_budget (с учётом служебных токенов), в порядке (id ASC).
+    after_id — брать только сообщения новее него (например, не вошедшие в summary).
+    Нарастающая сумма считается оконной функцией в БД, поэтому
+    из базы читается только подходящий «хвост», а не весь чат.
+    """
+    running_total = func.sum(_message_tokens()).over(order_by=ChatMessage.id.desc()).label("running_total")
+    conditions = [ChatMessage.chat_id == chat_db_id]
+    if after_id is not None:
+        conditions.append(ChatMessage.id > after_id)
+    tail = (
+        select(ChatMessage.id, ChatMessage.role, ChatMessage.content, running_total)
+        .where(*conditions)
+        .subquery()
+    )
+    stmt = (
+        select(tail.c.role, tail.c.content)
+        .where(tail.c.running_total <= token_budget)
+        .order_by(tail.c.id.asc())
+    )
+    result = await session.execute(stmt)
+    return [{"role": role, "content": content} for role, content in result.all()]
+
+async def get_chat_summary(session: AsyncSession, chat_db_id: int) -> tuple[str | None, int | None]:
+    """
+    Возвращает (summary, summary_message_id) чата, или (None, None).
+    """
+    stmt = select(Chat.summary, Chat.summary_message_id).where(Chat.id == chat_db_id)
+    result = await session.execute(stmt)
+    row = result.fetchone()
+    return (row[0], row[1]) if row else (None, None)
+
+async def set_chat_summary(session: AsyncSession, chat_db_id: int, summary: str, upto_message_id: int) -> None:
+    """
+    Сохраняет новое краткое содержание чата и id последнего вошедшего в него сообщения.
+    """
+    await session.execute(
+        update(Chat)
+        .where(Chat.id == chat_db_id)
+        .values(summary=summary, summary_message_id=upto_message_id)
+    )
+    await session.commit()
+
+async def count_unsummarized_tokens(session: AsyncSession, chat_db_id: int, after_id: int | None) -> int:
+    """
+    Сумма токенов сообщений чата, ещё не вошедших в summary.
+    """
+    stmt = select(func.coalesce(func.sum(_message_tokens()), 0)).where(ChatMessage.chat_id == chat_db_id)
+    if after_id is not None:
+        stmt = stmt.where(ChatMessage.id > after_id)
+    result = await session.execute(stmt)
+    return int(result.scalar_one())
+
+async def get_nth_latest_message_id(session: AsyncSession, chat_db_id: int, n: int) -> int | None:
+    """
+    Возвращает id n-го с конца сообщения чата (n=1 — последнее), или None.
+    """
+    stmt = (
+        select(ChatMessage.id)
+        .where(ChatMessage.chat_id == chat_db_id)
+        .order_by(ChatMessage.id.desc())
+        .offset(max(0, n - 1))
+        .limit(1)
+    )
+    result = await session.execute(stmt)
+    return result.scalar_one_or_none()
+
+async def get_messages_between(
+    session: AsyncSession,
+    chat_db_id: int,
+    after_id: int | None,
+    before_id: int | None,
+    limit: int
+) -> list[ChatMessage]:
+    """
+    Возвращает до limit сообщений чата с after_id < id < before_id, в порядке (id ASC).
+    None в границе означает «без ограничения».
+    """
+    stmt = select(ChatMessage).where(ChatMessage.chat_id == chat_db_id)
+    if after_id is not None:
+        stmt = stmt.where(ChatMessage.id > after_id)
+    if before_id is not None:
+        stmt = stmt.where(ChatMessage.id < before_id)
+    stmt = stmt.order_by(ChatMessage.id.asc()).limit(limit)
+    result = await session.execute(stmt)
+    return result.scalars().all()
@@ -0,0 +1,66 @@
+# app/services/context_service.py
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import CONTEXT_MAX_HISTORY_TOKENS
+from app.services.chat_service import get_chat_tail, get_chat_summary
+from app.services.token_counter import count_tokens, MESSAGE_OVERHEAD_TOKENS
+from app.telegram_bot.model_catalog import model_catalog
+
+SUMMARY_PREFIX = "Краткое содержание предыдущей части диалога:"
+
+def get_context_window(model: str) -> int:
+    """
+    Контекстное окно модели (в токенах) — из каталога моделей в памяти.
+    """
+    return model_catalog.context_window(model)
+
+
+def get_history_budget(model: str, max_tokens: int, fixed_tokens: int = 0) -> int:
+    """
+    Сколько токенов можно отдать под историю чата:
+    окно модели минус ответ (max_tokens) минус обязательные сообщения
+    (инструкции + текущее сообщение пользователя), но не больше
+    CONTEXT_MAX_HISTORY_TOKENS (если задан), чтобы ограничить стоимость запроса.
+    """
+    budget = get_context_window(model) - max_tokens - fixed_tokens
+    if CONTEXT_MAX_HISTORY_TOKENS > 0:
+        budget = min(budget, CONTEXT_MAX_HISTORY_TOKENS)
+    return max(0, budget)
+
+
+async def build_context(
+    session: AsyncSession,
+    chat_db_id: int,
+    model: str,
+    instructions: str,
+    user_text: str,
+    max_tokens: int,
+) -> list[dict]:
+    """
+    Собирает messages для API: инструкции (system) + краткое содержание старой
+    части чата (если есть, см. summary_service) + самые свежие сообщения,
+    которые помещаются в бюджет модели + новое сообщение пользователя.
+    Из БД читается только «хвост», который влезает в бюджет.
+    """
+    messages_for_api = []
+    fixed_tokens = count_tokens(user_text) + MESSAGE_OVERHEAD_TOKENS
+    if instructions.strip():
+        messages_for_api.append({"role": "system", "content": instructions})
+        fixed_tokens += count_tokens(instructions) + MESSAGE_OVERHEAD_TOKENS
+
+    summary, summary_message_id = await get_chat_summary(session, chat_db_id)
+    if summary:
+        summary_text = f"{SUMMARY_PREFIX}\n{summary}"
+        messages_for_api.append({"role": "system", "content": summary_text})
+        fixed_tokens += count_tokens(summary_text) + MESSAGE_OVERHEAD_TOKENS
+
+    budget = get_history_budget(model, max_tokens, fixed_tokens)
+    history = (
+        await get_chat_tail(session, chat_db_id, budget, after_id=summary_message_id)
+        if budget > 0 else []
+    )
+
+    messages_for_api.extend(history)
+    messages_for_api.append({"role": "user", "content": user_text})
+    return messages_for_api
@@ -0,0 +1,77 @@
+# app/services/message_pipeline.py
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import DEFAULT_INSTRUCTIONS
+from app.services.user_service import get_or_create_user, debit_balance, remember_user
+from app.services.subscription_service import has_active_subscription, consume_free_request
+from app.services.chat_service import create_chat, add_message
+from app.services.context_service import build_context
+from app.services.archive_service import ensure_chat_hot
+
+# Стоимость одного запроса к LLM в токенах баланса
+MESSAGE_COST = 1
+DEFAULT_MODEL = "gpt-3.5-turbo"
+
+
+class PreparedTurn:
+    """Результат подготовки запроса: куда сохранять ответ и что отправить в LLM."""
+
+    __slots__ = ("chat_db_id", "model", "messages")
+
+    def __init__(self, chat_db_id: int, model: str, messages: list[dict]):
+        self.chat_db_id = chat_db_id
+        self.model = model
+        self.messages = messages
+
+
+async def prepare_turn(
+    session: AsyncSession,
+    chat_id: int,
+    user_text: str,
+    max_tokens: int,
+) -> PreparedTurn | None:
+    """
+    Всё, что нужно сделать до запроса к LLM, — одной транзакцией:
+    1. списание с баланса (атомарный UPDATE ... RETURNING), иначе
+       проверка подписки, иначе бесплатный запрос (тоже атомарно);
+    2. создание активного чата, если его нет (или возврат его сообщений из архива);
+    3. сборка контекста и сохранение сообщения пользователя.
+    Один commit в конце. Возвращает None (и откатывает транзакцию),
+    если у пользователя нет ни баланса, ни подписки, ни бесплатных запросов.
+    """
+    user = await get_or_create_user(session, chat_id)
+
+    # 1. Баланс / подписка / бесплатный лимит
+    if await debit_balance(session, user.id, MESSAGE_COST) is None:
+        if not await has_active_subscription(user):
+            if not await consume_free_request(session, user.id):
+                await session.rollback()
+                return None
+
+    model = user.selected_model or DEFAULT_MODEL
+
+    # 2. Активный чат
+    chat_db_id = user.active_chat_id
+    if not chat_db_id:
+        new_chat = await create_chat(session, user_id=chat_id, title="Новый чат", commit=False)
+        user.active_chat_id = new_chat.id
+        chat_db_id = new_chat.id
+    else:
+        await ensure_chat_hot(session, chat_db_id, commit=False)
+
+    # 3. Инструкции + «хвост» истории, который влезает в контекст модели
+    messages = await build_context(
+        session,
+        chat_db_id,
+        model=model,
+        instructions=user.instructions or DEFAULT_INSTRUCTIONS,
+        user_text=user_text,
+        max_tokens=max_tokens,
+    )
+    await add_message(session, chat_db_id, "user", user_text, commit=False)
+
+    await session.commit()
+    # Новый баланс и активный чат — сразу в кэш профилей
+    remember_user(user)
+    return PreparedTurn(chat_db_id, model, messages)
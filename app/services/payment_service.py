@@ -3,6 +3,7 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from app.database.models import Transaction, User
+from app.services.user_service import invalidate_user_profile
 import datetime
 
 
@@ -57,6 +58,8 @@ async def update_transaction_successful(session: AsyncSession, txn_id: int):
         user.balance_tokens = (user.balance_tokens or 0) + (txn.tokens or 0)
 
     await session.commit()
+    if user:
+        invalidate_user_profile(user.chat_id)
 
 
 async def find_transaction_by_order_id(session: AsyncSession, order_id: str) -> Transaction | None:
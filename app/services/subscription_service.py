@@ -2,6 +2,7 @@
 
 import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import update, func, or_
 from app.database.models import User
 
 async def can_use_free_request(session: AsyncSession, user: User) -> bool:
@@ -37,6 +38,38 @@ async def increment_free_requests(session: AsyncSession, user: User) -> None:
     user.free_requests_used += 1
     await session.commit()
 
+async def consume_free_request(session: AsyncSession, user_id: int) -> bool:
+    """
+    Атомарный аналог can_use_free_request + increment_free_requests:
+    - если период не начат или начался в прошлом месяце — сбрасываем счётчик;
+    - увеличиваем free_requests_used, только если лимит ещё не исчерпан
+      (условие в самом UPDATE, поэтому параллельные запросы не превысят лимит).
+    Возвращает True, если бесплатный запрос засчитан. Без commit.
+    """
+    now = datetime.datetime.now()
+    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    await session.execute(
+        update(User)
+        .where(
+            User.id == user_id,
+            or_(User.free_period_start.is_(None), User.free_period_start < month_start)
+        )
+        .values(free_period_start=now, free_requests_used=0)
+        .execution_options(synchronize_session="fetch")
+    )
+    result = await session.execute(
+        update(User)
+        .where(
+            User.id == user_id,
+            func.coalesce(User.free_requests_used, 0) < User.free_requests_limit
+        )
+        .values(free_requests_used=func.coalesce(User.free_requests_used, 0) + 1)
+        .returning(User.free_requests_used)
+        .execution_options(synchronize_session="fetch")
+    )
+    return result.first() is not None
+
 async def has_active_subscription(user: User) -> bool:
     """
     Возвращает True, если subscription_status == True
@@ -0,0 +1,136 @@
+# app/services/summary_service.py
+
+import asyncio
+import logging
+
+from app.config import (
+    SUMMARY_ENABLED,
+    SUMMARY_MODEL,
+    SUMMARY_TRIGGER_TOKENS,
+    SUMMARY_KEEP_RECENT_MESSAGES,
+    SUMMARY_BATCH_TOKENS,
+    SUMMARY_MAX_TOKENS,
+)
+from app.services.chat_service import (
+    get_chat_summary,
+    set_chat_summary,
+    count_unsummarized_tokens,
+    get_nth_latest_message_id,
+    get_messages_between,
+    message_buffer,
+)
+from app.services.token_counter import estimate_tokens, MESSAGE_OVERHEAD_TOKENS
+from app.telegram_bot.proxyapi_client import create_chat_completion
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_SYSTEM_PROMPT = (
+    "Ты сжимаешь переписку пользователя с ассистентом в краткое содержание, "
+    "которое заменит старую часть диалога в контексте модели. "
+    "Сохрани факты, договорённости, предпочтения пользователя, имена, числа и "
+    "идентификаторы из кода. Пиши кратко, на языке диалога, без вступлений."
+)
+
+# Максимум сообщений, читаемых за один шаг сворачивания
+SUMMARY_FETCH_LIMIT = 200
+
+# Чаты, для которых сворачивание уже идёт (чтобы не запускать параллельно)
+_in_progress: set[int] = set()
+# Ссылки на фоновые задачи, чтобы их не собрал GC до завершения
+_background_tasks: set[asyncio.Task] = set()
+
+
+def schedule_summarization(session_factory, chat_db_id: int) -> None:
+    """
+    Запускает summarize_chat_if_needed в фоне — вне пути ответа пользователю.
+    """
+    if not SUMMARY_ENABLED or chat_db_id in _in_progress:
+        return
+    task = asyncio.create_task(summarize_chat_if_needed(session_factory, chat_db_id))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+def _format_transcript(messages) -> str:
+    return "\n\n".join(f"{m.role}: {m.content}" for m in messages)
+
+
+async def _summarize_step(session, chat_db_id: int) -> bool:
+    """
+    Один шаг: если несвёрнутая история больше порога, сворачивает очередную
+    порцию старых сообщений (не трогая SUMMARY_KEEP_RECENT_MESSAGES последних).
+    Возвращает True, если summary обновлено.
+    """
+    summary, summary_message_id = await get_chat_summary(session, chat_db_id)
+    # Ещё не записанный «хвост» из буфера тоже учитываем: он входит и в порог,
+    # и в SUMMARY_KEEP_RECENT_MESSAGES последних сообщений
+    pending, pending_tokens = message_buffer.pending_tail(chat_db_id)
+    total = await count_unsummarized_tokens(session, chat_db_id, summary_message_id) + pending_tokens
+    if total <= SUMMARY_TRIGGER_TOKENS:
+        return False
+
+    keep_from_id = await get_nth_latest_message_id(
+        session, chat_db_id, max(1, SUMMARY_KEEP_RECENT_MESSAGES - pending)
+    )
+    if keep_from_id is None:
+        # Сообщений не больше, чем нужно оставить целиком, — сворачивать нечего
+        return False
+    candidates = await get_messages_between(
+        session, chat_db_id, summary_message_id, keep_from_id, SUMMARY_FETCH_LIMIT
+    )
+
+    batch = []
+    batch_tokens = 0
+    for msg in candidates:
+        tokens = (msg.token_count if msg.token_count is not None else estimate_tokens(msg.content))
+        tokens += MESSAGE_OVERHEAD_TOKENS
+        if batch and batch_tokens + tokens > SUMMARY_BATCH_TOKENS:
+            break
+        batch.append(msg)
+        batch_tokens += tokens
+    if not batch:
+        return False
+
+    prompt = ""
+    if summary:
+        prompt += f"Предыдущее краткое содержание:\n{summary}\n\n"
+    prompt += f"Новые реплики:\n{_format_transcript(batch)}"
+
+    response_data = await create_chat_completion(
+        model=SUMMARY_MODEL,
+        messages=[
+            {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt},
+        ],
+        temperature=0.2,
+        max_tokens=SUMMARY_MAX_TOKENS,
+    )
+    new_summary = response_data["choices"][0]["message"]["content"].strip()
+    if not new_summary:
+        return False
+
+    await set_chat_summary(session, chat_db_id, new_summary, batch[-1].id)
+    logger.info(f"Чат {chat_db_id}: свёрнуто {len(batch)} сообщений (~{batch_tokens} токенов).")
+    return True
+
+
+async def summarize_chat_if_needed(session_factory, chat_db_id: int) -> None:
+    """
+    Сворачивает старую часть чата, пока несвёрнутая история больше порога.
+    Ошибки только логируются: без summary бот продолжает работать на «хвосте».
+    """
+    if chat_db_id in _in_progress:
+        return
+    _in_progress.add(chat_db_id)
+    try:
+        # В буфере — самые свежие сообщения. Сворачивание читает их, только если
+        # их не меньше, чем оставляется целиком; иначе сбрасывать буфер незачем
+        if message_buffer.pending_tail(chat_db_id)[0] >= SUMMARY_KEEP_RECENT_MESSAGES:
+            await message_buffer.flush(chat_db_id=chat_db_id)
+        async with session_factory() as session:
+            while await _summarize_step(session, chat_db_id):
+                pass
+    except Exception as e:
+        logger.error(f"Не удалось свернуть историю чата {chat_db_id}: {e}", exc_info=True)
+    finally:
+        _in_progress.discard(chat_db_id)
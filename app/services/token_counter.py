@@ -0,0 +1,58 @@
+# app/services/token_counter.py
+
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Служебные токены, которые API добавляет к каждому сообщению (role, разделители)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+# Токенизатор грузится один раз при старте (load_encoding_in_background):
+# первая загрузка может скачивать словарь BPE, и в event loop ей не место.
+# Пока он не готов (или недоступен), count_tokens считает приближённо.
+_encoding = None
+_encoding_loaded = False
+
+
+def load_encoding():
+    """
+    Синхронно загружает локальный токенизатор tiktoken (cl100k_base), если он
+    установлен и словарь доступен; иначе None. Из async-кода — только через
+    load_encoding_in_background().
+    """
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            logger.warning(f"tiktoken недоступен, используем приближённый подсчёт токенов: {e}")
+        _encoding_loaded = True
+    return _encoding
+
+
+async def load_encoding_in_background() -> None:
+    """Загрузка токенизатора в отдельном потоке, не блокируя event loop."""
+    await asyncio.to_thread(load_encoding)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Грубая оценка без токенизатора: ~3 символа на токен (с запасом для кириллицы).
+    Та же формула используется в SQL для строк без token_count.
+    """
+    return (len(text) + 2) // 3
+
+
+def count_tokens(text: str) -> int:
+    """
+    Возвращает количество токенов в тексте (без служебных токенов сообщения).
+    """
+    if not text:
+        return 0
+    encoding = _encoding
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
@@ -1,10 +1,115 @@
 # app/services/user_service.py
 
 import datetime
+from collections import OrderedDict
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
+from sqlalchemy import select, update, case
+from sqlalchemy.orm.attributes import set_committed_value
 from app.database.models import User
-from app.config import DEFAULT_INSTRUCTIONS
+from app.config import DEFAULT_INSTRUCTIONS, USER_PROFILE_CACHE_SIZE
+
+
+class UserProfile:
+    """Поля User, которые читают меню и колбэки (снимок строки users)."""
+
+    __slots__ = (
+        "chat_id",
+        "id",
+        "selected_model",
+        "instructions",
+        "active_chat_id",
+        "balance_tokens",
+        "subscription_status",
+    )
+
+    FIELDS = __slots__
+
+    def __init__(self, **values):
+        for field in self.FIELDS:
+            setattr(self, field, values.get(field))
+
+    @classmethod
+    def from_user(cls, user: User) -> "UserProfile":
+        return cls(**{field: getattr(user, field) for field in cls.FIELDS})
+
+
+class ProfileCache:
+    """
+    LRU-кэш UserProfile по chat_id в памяти процесса.
+    Сеттеры user_service пишут в него сразу после commit (write-through),
+    сторонние изменения строки users сбрасывают запись через invalidate().
+    """
+
+    def __init__(self, max_entries: int = USER_PROFILE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[int, UserProfile] = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "invalidations": 0}
+
+    def hit_rate(self) -> float:
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
+
+    def get(self, chat_id: int) -> UserProfile | None:
+        profile = self._entries.get(chat_id)
+        if profile is None:
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(chat_id)
+        self.stats["hits"] += 1
+        return profile
+
+    def put(self, profile: UserProfile) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[profile.chat_id] = profile
+        self._entries.move_to_end(profile.chat_id)
+        self.stats["stores"] += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def invalidate(self, chat_id: int) -> None:
+        if self._entries.pop(chat_id, None) is not None:
+            self.stats["invalidations"] += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "size": len(self._entries), "hit_rate": round(self.hit_rate(), 4)}
+
+
+# Общий кэш процесса
+profile_cache = ProfileCache()
+
+
+def remember_user(user: User) -> None:
+    """Кладёт в кэш актуальный (уже закоммиченный) снимок пользователя."""
+    profile_cache.put(UserProfile.from_user(user))
+
+
+def invalidate_user_profile(chat_id: int) -> None:
+    """Сбрасывает кэш профиля (после изменения users в обход user_service)."""
+    profile_cache.invalidate(chat_id)
+
+
+async def get_user_profile(session: AsyncSession, chat_id: int) -> UserProfile | None:
+    """
+    Профиль пользователя из кэша, при промахе — один SELECT нужных колонок.
+    None, если пользователя ещё нет.
+    """
+    profile = profile_cache.get(chat_id)
+    if profile is not None:
+        return profile
+
+    columns = [getattr(User, field) for field in UserProfile.FIELDS]
+    result = await session.execute(select(*columns).where(User.chat_id == chat_id))
+    row = result.fetchone()
+    if not row:
+        return None
+    profile = UserProfile(**row._asdict())
+    profile_cache.put(profile)
+    return profile
 
 async def get_or_create_user(session: AsyncSession, chat_id: int) -> User:
     """
@@ -24,16 +129,15 @@ async def get_or_create_user(session: AsyncSession, chat_id: int) -> User:
         session.add(user)
         await session.commit()
         await session.refresh(user)
+    remember_user(user)
     return user
 
 async def get_user_model(session: AsyncSession, chat_id: int) -> str | None:
     """
     Возвращает выбранную модель пользователя (user.selected_model).
     """
-    stmt = select(User.selected_model).where(User.chat_id == chat_id)
-    result = await session.execute(stmt)
-    row = result.fetchone()
-    return row[0] if row else None
+    profile = await get_user_profile(session, chat_id)
+    return profile.selected_model if profile else None
 
 async def set_user_model(session: AsyncSession, chat_id: int, model: str) -> None:
     """
@@ -43,15 +147,14 @@ async def set_user_model(session: AsyncSession, chat_id: int, model: str) -> Non
     user = await get_or_create_user(session, chat_id)
     user.selected_model = model
     await session.commit()
+    remember_user(user)
 
 async def get_user_instructions(session: AsyncSession, chat_id: int) -> str | None:
     """
     Возвращает user.instructions.
     """
-    stmt = select(User.instructions).where(User.chat_id == chat_id)
-    result = await session.execute(stmt)
-    row = result.fetchone()
-    return row[0] if row and row[0] else None
+    profile = await get_user_profile(session, chat_id)
+    return profile.instructions if profile and profile.instructions else None
 
 async def set_user_instructions(session: AsyncSession, chat_id: int, instructions: str) -> None:
     """
@@ -60,15 +163,14 @@ async def set_user_instructions(session: AsyncSession, chat_id: int, instruction
     user = await get_or_create_user(session, chat_id)
     user.instructions = instructions
     await session.commit()
+    remember_user(user)
 
 async def get_active_chat_id(session: AsyncSession, chat_id: int) -> int | None:
     """
     Возвращает user.active_chat_id.
     """
-    stmt = select(User.active_chat_id).where(User.chat_id == chat_id)
-    result = await session.execute(stmt)
-    row = result.fetchone()
-    return row[0] if row else None
+    profile = await get_user_profile(session, chat_id)
+    return profile.active_chat_id if profile else None
 
 async def set_active_chat_id(session: AsyncSession, chat_id: int, chat_db_id: int | None) -> None:
     """
@@ -77,3 +179,31 @@ async def set_active_chat_id(session: AsyncSession, chat_id: int, chat_db_id: in
     user = await get_or_create_user(session, chat_id)
     user.active_chat_id = chat_db_id
     await session.commit()
+    remember_user(user)
+
+async def debit_balance(session: AsyncSession, user_id: int, cost: float) -> float | None:
+    """
+    Атомарно списывает cost токенов, если баланс положительный
+    (баланс не уходит ниже нуля). Один UPDATE ... RETURNING без
+    чтения-изменения-записи, поэтому параллельные списания не теряются.
+    Возвращает новый баланс или None, если списывать нечего. Без commit.
+    """
+    stmt = (
+        update(User)
+        .where(User.id == user_id, User.balance_tokens > 0)
+        .values(balance_tokens=case(
+            (User.balance_tokens > cost, User.balance_tokens - cost),
+            else_=0.0
+        ))
+        .returning(User.balance_tokens)
+        .execution_options(synchronize_session=False)
+    )
+    result = await session.execute(stmt)
+    row = result.first()
+    if not row:
+        return None
+    # Уже загруженный в сессию User получает новый баланс без повторного SELECT
+    user = session.identity_map.get(session.identity_key(User, user_id))
+    if user is not None:
+        set_committed_value(user, "balance_tokens", row[0])
+    return row[0]
@@ -0,0 +1,189 @@
+# app/telegram_bot/assets.py
+
+import hashlib
+import logging
+import os
+
+from sqlalchemy import select
+from telegram import Bot, CallbackQuery, InputMediaPhoto, Message
+from telegram.error import BadRequest
+
+from app.database.models import TelegramAsset
+
+logger = logging.getLogger(__name__)
+
+IMAGES_DIR = os.path.join(os.path.dirname(__file__), "images")
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+# Имена обложек (файлы в IMAGES_DIR)
+CABINET_COVER = "Cabinet.png"
+CHATS_COVER = "Chats.png"
+HELP_COVER = "Help.png"
+MENU_COVER = "Menu.png"
+START_COVER = "Start_cover.png"
+
+
+class AssetRegistry:
+    """
+    Реестр картинок-обложек бота.
+    - При старте читает все файлы из IMAGES_DIR в память (никаких open() в хендлерах).
+    - Каждая картинка загружается в Telegram один раз: file_id из первого
+      ответа запоминается и сохраняется в БД (таблица telegram_assets),
+      дальше отправляется только file_id.
+    - file_id привязан к боту и содержимому файла: если сменился токен или
+      картинка, сохранённый id игнорируется и картинка загружается заново.
+    """
+
+    def __init__(self, images_dir: str = IMAGES_DIR):
+        self.images_dir = images_dir
+        self._content: dict[str, bytes] = {}
+        self._checksums: dict[str, str] = {}
+        self._file_ids: dict[str, str] = {}
+        self._session_factory = None
+        self._bot_id: str | None = None
+
+    def preload(self) -> None:
+        """Читает все картинки из images_dir в память."""
+        for filename in sorted(os.listdir(self.images_dir)):
+            if not filename.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            with open(os.path.join(self.images_dir, filename), "rb") as f:
+                content = f.read()
+            self._content[filename] = content
+            self._checksums[filename] = hashlib.sha256(content).hexdigest()
+        logger.info(f"Загружено обложек в память: {len(self._content)}")
+
+    async def load(self, bot: Bot, session_factory=None, upload_chat_id: int | None = None) -> None:
+        """
+        Вызывается при старте бота: читает картинки, подтягивает сохранённые
+        file_id из БД и (если задан upload_chat_id) заранее загружает
+        недостающие картинки в служебный чат.
+        """
+        self.preload()
+        self._session_factory = session_factory
+        # file_id действителен только для бота, который его получил
+        self._bot_id = bot.token.split(":", 1)[0]
+
+        if session_factory:
+            async with session_factory() as session:
+                result = await session.execute(
+                    select(TelegramAsset).where(TelegramAsset.bot_id == self._bot_id)
+                )
+                for row in result.scalars().all():
+                    if self._checksums.get(row.name) == row.checksum:
+                        self._file_ids[row.name] = row.file_id
+
+        if upload_chat_id:
+            for name in self._content:
+                if name in self._file_ids:
+                    continue
+                try:
+                    message = await bot.send_photo(
+                        chat_id=upload_chat_id,
+                        photo=self._content[name],
+                        disable_notification=True
+                    )
+                    await self.remember(name, message)
+                except Exception as e:
+                    logger.warning(f"Не удалось заранее загрузить {name}: {e}")
+
+        logger.info(f"Обложек с готовым file_id: {len(self._file_ids)} из {len(self._content)}")
+
+    def media(self, name: str) -> str | bytes:
+        """
+        Что передавать в photo/InputMediaPhoto: file_id, если он уже известен,
+        иначе байты картинки (первая загрузка).
+        """
+        file_id = self._file_ids.get(name)
+        if file_id:
+            return file_id
+        if name not in self._content:
+            # Картинка не была загружена при старте (например, в тестах)
+            with open(os.path.join(self.images_dir, name), "rb") as f:
+                self._content[name] = f.read()
+            self._checksums[name] = hashlib.sha256(self._content[name]).hexdigest()
+        return self._content[name]
+
+    def has_file_id(self, name: str) -> bool:
+        return name in self._file_ids
+
+    def forget(self, name: str) -> None:
+        """Сбрасывает file_id (например, Telegram его больше не принимает)."""
+        self._file_ids.pop(name, None)
+
+    async def remember(self, name: str, message) -> None:
+        """
+        Запоминает file_id из ответа Telegram (Message с photo) и сохраняет его в БД.
+        """
+        if name in self._file_ids or not isinstance(message, Message) or not message.photo:
+            return
+        file_id = message.photo[-1].file_id
+        self._file_ids[name] = file_id
+
+        if not self._session_factory or not self._bot_id:
+            return
+        try:
+            async with self._session_factory() as session:
+                await session.merge(TelegramAsset(
+                    name=name,
+                    bot_id=self._bot_id,
+                    checksum=self._checksums.get(name, ""),
+                    file_id=file_id,
+                ))
+                await session.commit()
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить file_id для {name}: {e}")
+
+
+# Общий реестр процесса
+asset_registry = AssetRegistry()
+
+
+def _is_stale_file_id_error(error: BadRequest) -> bool:
+    text = str(error).lower()
+    return "file" in text and ("identifier" in text or "not found" in text or "wrong" in text)
+
+
+async def reply_cover(message: Message, name: str, **kwargs) -> Message:
+    """
+    message.reply_photo с обложкой из реестра (file_id или байты при первой отправке).
+    kwargs — как у reply_photo (caption, reply_markup, parse_mode, ...).
+    """
+    used_file_id = asset_registry.has_file_id(name)
+    try:
+        sent = await message.reply_photo(photo=asset_registry.media(name), **kwargs)
+    except BadRequest as e:
+        if not (used_file_id and _is_stale_file_id_error(e)):
+            raise
+        asset_registry.forget(name)
+        sent = await message.reply_photo(photo=asset_registry.media(name), **kwargs)
+    await asset_registry.remember(name, sent)
+    return sent
+
+
+async def edit_cover(
+    query: CallbackQuery,
+    name: str,
+    caption: str | None = None,
+    parse_mode: str | None = None,
+    reply_markup=None,
+):
+    """
+    query.edit_message_media с обложкой из реестра и новой подписью.
+    """
+    used_file_id = asset_registry.has_file_id(name)
+    try:
+        result = await query.edit_message_media(
+            media=InputMediaPhoto(asset_registry.media(name), caption=caption, parse_mode=parse_mode),
+            reply_markup=reply_markup
+        )
+    except BadRequest as e:
+        if not (used_file_id and _is_stale_file_id_error(e)):
+            raise
+        asset_registry.forget(name)
+        result = await query.edit_message_media(
+            media=InputMediaPhoto(asset_registry.media(name), caption=caption, parse_mode=parse_mode),
+            reply_markup=reply_markup
+        )
+    await asset_registry.remember(name, result)
+    return result
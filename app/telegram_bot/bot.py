@@ -15,9 +15,19 @@ from telegram.ext import (
     filters
 )
 
-from app.config import TELEGRAM_TOKEN
+from app.config import (
+    TELEGRAM_TOKEN,
+    ASSETS_UPLOAD_CHAT_ID,
+    COALESCE_WINDOW,
+    COALESCE_MAX_WAIT,
+    UPDATE_CONCURRENCY,
+    UPDATE_MAX_PENDING,
+    TELEGRAM_RATE_LIMIT_ENABLED,
+    BOT_PERSISTENCE_ENABLED
+)
+from app.telegram_bot.assets import asset_registry
 from app.telegram_bot.handlers.menu import start_command, menu_command, help_command
-from app.telegram_bot.handlers.cabinet import show_cabinet, cabinet_callback_handler
+from app.telegram_bot.handlers.cabinet import show_cabinet
 from app.telegram_bot.handlers.payments import pre_checkout_query_handler, successful_payment_handler
 from app.telegram_bot.handlers.callback_general import button_handler
 from app.telegram_bot.handlers.conversation import (
@@ -32,7 +42,18 @@ from app.telegram_bot.handlers.conversation import (
     SET_NEW_CHAT_TITLE,
     SET_RENAME_CHAT
 )
-from app.telegram_bot.handlers.message_handler import handle_user_message
+from app.telegram_bot.handlers.message_handler import handle_user_message, process_user_message
+from app.telegram_bot.coalescer import MessageCoalescer
+from app.telegram_bot.update_ordering import ChatOrderedApplication
+from app.telegram_bot.send_scheduler import send_scheduler
+from app.telegram_bot.persistence import DatabasePersistence
+from app.telegram_bot.callback_router import (
+    callback_router,
+    NEW_CHAT,
+    RENAME_CHAT,
+    INSTRUCTIONS_ADD,
+    INSTRUCTIONS_EDIT
+)
 
 logger = logging.getLogger(__name__)
 
@@ -46,14 +67,42 @@ async def create_telegram_application(session_factory=None) -> Application:
              запускать (polling или webhook) в другом месте.
     """
 
-    # 1. Создаём приложение PTB
-    application = ApplicationBuilder().token(TELEGRAM_TOKEN).build()
+    # 1. Создаём приложение PTB: апдейты разных чатов — параллельно,
+    # одного чата — по порядку (см. update_ordering.py)
+    # Исходящие запросы — через общий планировщик лимитов (см. send_scheduler.py)
+    builder = (
+        ApplicationBuilder()
+        .token(TELEGRAM_TOKEN)
+        .application_class(ChatOrderedApplication, kwargs={"update_concurrency": UPDATE_CONCURRENCY})
+        .concurrent_updates(UPDATE_MAX_PENDING)
+    )
+    if TELEGRAM_RATE_LIMIT_ENABLED:
+        builder = builder.rate_limiter(send_scheduler)
+    # user_data и состояния диалогов переживают перезапуск (см. persistence.py)
+    persistent = BOT_PERSISTENCE_ENABLED and session_factory is not None
+    if persistent:
+        builder = builder.persistence(DatabasePersistence(session_factory))
+    application = builder.build()
 
     # Если нужно передавать session_factory (SQLAlchemy) в хендлеры,
     # можем хранить его в bot_data:
     if session_factory:
         application.bot_data["session_factory"] = session_factory
 
+    # Склейка сообщений, отправленных пользователем подряд
+    if COALESCE_WINDOW > 0:
+        application.bot_data["message_coalescer"] = MessageCoalescer(
+            process_user_message,
+            window=COALESCE_WINDOW,
+            max_wait=COALESCE_MAX_WAIT,
+            # Пачки — в очереди своего чата, наравне с остальными апдейтами
+            serialize=application.chat_turn,
+        )
+
+    # Обложки: читаем в память и поднимаем сохранённые file_id,
+    # чтобы не загружать картинку в Telegram на каждый ответ
+    await asset_registry.load(application.bot, session_factory, ASSETS_UPLOAD_CHAT_ID)
+
     # 2. Регистрируем команды/хендлеры
     # --------------------------------
 
@@ -63,40 +112,41 @@ async def create_telegram_application(session_factory=None) -> Application:
     application.add_handler(CommandHandler("help", help_command))
     application.add_handler(CommandHandler("cabinet", show_cabinet))
 
-    # Личный кабинет (callback)
-    application.add_handler(CallbackQueryHandler(cabinet_callback_handler, pattern="^cabinet_|^show_cabinet"))
-
     # Telegram Payments
     application.add_handler(PreCheckoutQueryHandler(pre_checkout_query_handler))
     application.add_handler(MessageHandler(filters.SUCCESSFUL_PAYMENT, successful_payment_handler))
 
     # ConversationHandlers (например, создание/переименование чата)
     new_chat_conv_handler = ConversationHandler(
-        entry_points=[CallbackQueryHandler(new_chat_entry, pattern="^new_chat$")],
+        entry_points=[CallbackQueryHandler(new_chat_entry, pattern=callback_router.pattern(NEW_CHAT))],
         states={
             SET_NEW_CHAT_TITLE: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, set_new_chat_title),
             ]
         },
         fallbacks=[],
+        name="new_chat",
+        persistent=persistent,
     )
     application.add_handler(new_chat_conv_handler)
 
     rename_chat_conv_handler = ConversationHandler(
-        entry_points=[CallbackQueryHandler(rename_chat_entry, pattern=r"^rename_\d+$")],
+        entry_points=[CallbackQueryHandler(rename_chat_entry, pattern=callback_router.pattern(RENAME_CHAT))],
         states={
             SET_RENAME_CHAT: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, rename_chat_finish),
             ]
         },
         fallbacks=[],
+        name="rename_chat",
+        persistent=persistent,
     )
     application.add_handler(rename_chat_conv_handler)
 
     instructions_manage_conv_handler = ConversationHandler(
         entry_points=[
-            CallbackQueryHandler(instructions_add_entry, pattern="^instructions_add$"),
-            CallbackQueryHandler(instructions_edit_entry, pattern="^instructions_edit$")
+            CallbackQueryHandler(instructions_add_entry, pattern=callback_router.pattern(INSTRUCTIONS_ADD)),
+            CallbackQueryHandler(instructions_edit_entry, pattern=callback_router.pattern(INSTRUCTIONS_EDIT))
         ],
         states={
             INSTRUCTIONS_INPUT: [
@@ -104,10 +154,13 @@ async def create_telegram_application(session_factory=None) -> Application:
             ]
         },
         fallbacks=[],
+        name="instructions",
+        persistent=persistent,
     )
     application.add_handler(instructions_manage_conv_handler)
 
-    # Общий CallbackQueryHandler (на всё остальное)
+    # Общий CallbackQueryHandler: остальные кнопки (в т.ч. личного кабинета)
+    # по маршрутам callback_router
     application.add_handler(CallbackQueryHandler(button_handler))
 
     # Хендлер на обычное текстовое сообщение
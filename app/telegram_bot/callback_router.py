@@ -0,0 +1,237 @@
+# app/telegram_bot/callback_router.py
+"""
+Маршрутизация inline-кнопок.
+
+Каждая кнопка — Route: стабильное имя, короткий код и типы аргументов.
+callback_data = код + аргументы через точку, целые — в base36:
+OPEN_CHAT.data(1234) == "oc.ya". Код ищется в словаре, поэтому
+разбор и выбор хендлера не зависят от числа кнопок, а длина
+callback_data — от длины их названий.
+
+Коды — часть протокола: кнопки живут в старых сообщениях, поэтому код
+существующего маршрута не меняют. Кнопки прежнего формата
+("open_chat_12", "history_5:page_1", ...) разбирает _decode_legacy.
+"""
+
+import logging
+import re
+from typing import Awaitable, Callable
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+logger = logging.getLogger(__name__)
+
+# Лимит Bot API на callback_data
+MAX_CALLBACK_DATA_BYTES = 64
+
+_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+_CODE_RE = re.compile(r"[a-z][a-z0-9]*")
+# Ровно то, что выдаёт encode_int: int(..., 36) принял бы ещё "_", пробелы и "+"
+_INT_RE = re.compile(r"-?[0-9a-z]+")
+
+Handler = Callable[..., Awaitable[object]]
+
+
+def encode_int(value: int) -> str:
+    """Целое в base36 (int(..., 36) — обратное преобразование)."""
+    if value < 0:
+        return "-" + encode_int(-value)
+    digits = []
+    while True:
+        value, rest = divmod(value, 36)
+        digits.append(_DIGITS[rest])
+        if not value:
+            return "".join(reversed(digits))
+
+
+class Route:
+    """Маршрут кнопки: name — для логов и старого формата, code — в callback_data."""
+
+    __slots__ = ("name", "code", "types")
+
+    def __init__(self, name: str, code: str, types: tuple[type, ...]):
+        if not _CODE_RE.fullmatch(code):
+            raise ValueError(f"Некорректный код маршрута {code!r}")
+        if str in types[:-1] or any(t not in (int, str) for t in types):
+            raise ValueError(f"{name}: аргументы — int, строка допустима только последней")
+        self.name = name
+        self.code = code
+        self.types = types
+
+    def data(self, *args) -> str:
+        """callback_data для кнопки с аргументами args."""
+        if len(args) != len(self.types):
+            raise TypeError(f"{self.name}: ожидалось аргументов {len(self.types)}, получено {len(args)}")
+        parts = [self.code]
+        for value, kind in zip(args, self.types):
+            if kind is int:
+                if not isinstance(value, int) or isinstance(value, bool):
+                    raise TypeError(f"{self.name}: {value!r} не int")
+                parts.append(encode_int(value))
+            else:
+                parts.append(str(value))
+        data = ".".join(parts)
+        if len(data.encode("utf-8")) > MAX_CALLBACK_DATA_BYTES:
+            raise ValueError(f"{self.name}: callback_data длиннее {MAX_CALLBACK_DATA_BYTES} байт: {data!r}")
+        return data
+
+    def parse(self, rest: str) -> tuple | None:
+        """Аргументы из части callback_data после кода; None — не подходит."""
+        if not self.types:
+            return () if not rest else None
+        parts = rest.split(".", len(self.types) - 1)
+        if len(parts) != len(self.types):
+            return None
+        if any(kind is int and not _INT_RE.fullmatch(p) for p, kind in zip(parts, self.types)):
+            return None
+        return tuple(int(p, 36) if kind is int else p for p, kind in zip(parts, self.types))
+
+    def __repr__(self) -> str:
+        return f"Route({self.name!r}, {self.code!r})"
+
+
+class CallbackRouter:
+    """
+    Реестр маршрутов и их хендлеров. Хендлер вызывается как
+    handler(update, context, *args) с уже разобранными аргументами.
+    """
+
+    def __init__(self):
+        self._by_code: dict[str, Route] = {}
+        self._by_name: dict[str, Route] = {}
+        self._handlers: dict[Route, Handler] = {}
+        self._unknown: Handler | None = None
+        self.fallback_decoder: Callable[[str], tuple[Route, tuple] | None] | None = None
+        self.stats = {"dispatched": 0, "legacy": 0, "unknown": 0}
+
+    def route(self, name: str, code: str, *types: type) -> Route:
+        if code in self._by_code or name in self._by_name:
+            raise ValueError(f"Маршрут {name!r}/{code!r} уже объявлен")
+        route = Route(name, code, types)
+        self._by_code[code] = route
+        self._by_name[name] = route
+        return route
+
+    def by_name(self, name: str) -> Route | None:
+        return self._by_name.get(name)
+
+    def handler(self, route: Route):
+        """Декоратор: регистрирует хендлер маршрута."""
+        def register(func: Handler) -> Handler:
+            if route in self._handlers:
+                raise ValueError(f"Хендлер для {route.name} уже зарегистрирован")
+            self._handlers[route] = func
+            return func
+        return register
+
+    def unknown_handler(self, func: Handler) -> Handler:
+        """Декоратор: что показать на кнопку, которую не удалось разобрать."""
+        self._unknown = func
+        return func
+
+    def decode(self, data: str | None) -> tuple[Route, tuple] | None:
+        if not data:
+            return None
+        code, _, rest = data.partition(".")
+        route = self._by_code.get(code)
+        if route is not None:
+            args = route.parse(rest)
+            if args is not None:
+                return route, args
+        if self.fallback_decoder is not None:
+            decoded = self.fallback_decoder(data)
+            if decoded is not None:
+                self.stats["legacy"] += 1
+            return decoded
+        return None
+
+    def pattern(self, *routes: Route) -> Callable[[object], bool]:
+        """pattern для CallbackQueryHandler (например, entry_points ConversationHandler)."""
+        wanted = frozenset(routes)
+
+        def matches(data: object) -> bool:
+            decoded = self.decode(data) if isinstance(data, str) else None
+            return decoded is not None and decoded[0] in wanted
+
+        return matches
+
+    async def dispatch(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Общий CallbackQueryHandler: отвечает на нажатие и вызывает хендлер маршрута."""
+        query = update.callback_query
+        await query.answer()
+
+        decoded = self.decode(query.data)
+        handler = self._handlers.get(decoded[0]) if decoded else None
+        if handler is None:
+            self.stats["unknown"] += 1
+            logger.warning(f"Неизвестная кнопка: {query.data!r}")
+            if self._unknown is not None:
+                return await self._unknown(update, context)
+            return None
+
+        self.stats["dispatched"] += 1
+        route, args = decoded
+        return await handler(update, context, *args)
+
+
+callback_router = CallbackRouter()
+route = callback_router.route
+
+# ---------- маршруты (коды не менять: они сохранены в кнопках старых сообщений) ----------
+
+MENU = route("back_to_menu", "m")
+HELP = route("help", "hp")
+ALL_CHATS = route("all_chats", "ac", int)                 # page
+FAVORITE_CHATS = route("favorite_chats", "fc", int)       # page
+NEW_CHAT = route("new_chat", "nc")
+CHANGE_MODEL = route("change_model", "cm")
+SELECT_MODEL = route("model", "sm", str)                  # model id
+INSTRUCTIONS = route("update_instructions", "in")
+INSTRUCTIONS_ADD = route("instructions_add", "ia")
+INSTRUCTIONS_EDIT = route("instructions_edit", "ie")
+INSTRUCTIONS_DELETE = route("instructions_delete", "id")
+CURRENT_CHAT_HISTORY = route("history_current_chat", "hc")
+OPEN_CHAT = route("open_chat", "oc", int)                 # chat_db_id
+SET_ACTIVE_CHAT = route("set_active", "sa", int)          # chat_db_id
+RENAME_CHAT = route("rename", "rn", int)                  # chat_db_id
+DELETE_CHAT = route("delete_chat", "dc", int)             # chat_db_id
+FAVORITE_CHAT = route("fav", "fv", int)                   # chat_db_id
+UNFAVORITE_CHAT = route("unfav", "uf", int)               # chat_db_id
+HISTORY = route("history", "h", int)                      # chat_db_id (первая страница)
+HISTORY_AFTER = route("history_after", "ha", int, int, int)    # chat_db_id, after_id, page
+HISTORY_BEFORE = route("history_before", "hb", int, int, int)  # chat_db_id, before_id, page
+CABINET = route("show_cabinet", "cb")
+CABINET_TOPUP = route("cabinet_topup", "ct")
+CABINET_HISTORY = route("cabinet_history", "ch")
+CABINET_PAY_TKASSA = route("cabinet_pay_tkassa", "pk")
+CABINET_PAY_TELEGRAM = route("cabinet_pay_telegram", "pt")
+
+_LEGACY_ID = re.compile(r"(\w+?)_(\d+)")
+_LEGACY_HISTORY = re.compile(r"history_(\d+):page_\d+")
+
+
+def _decode_legacy(data: str) -> tuple[Route, tuple] | None:
+    """
+    Кнопки прежнего формата: "<имя>", "<имя>_<id>", "model_<id>"
+    и "history_<id>:page_<N>" (история теперь листается по id — открываем с начала).
+    """
+    if data.startswith("model_"):
+        return SELECT_MODEL, (data[len("model_"):],)
+    if ":" in data:
+        match = _LEGACY_HISTORY.fullmatch(data)
+        return (HISTORY, (int(match.group(1)),)) if match else None
+    match = _LEGACY_ID.fullmatch(data)
+    name, ident = (match.group(1), int(match.group(2))) if match else (data, None)
+    legacy = callback_router.by_name(name)
+    if legacy is None:
+        return None
+    if ident is not None:
+        return (legacy, (ident,)) if legacy.types == (int,) else None
+    if legacy.types == (int,):
+        # "all_chats" / "favorite_chats" — первая страница списка
+        return legacy, (0,)
+    return (legacy, ()) if not legacy.types else None
+
+
+callback_router.fallback_decoder = _decode_legacy
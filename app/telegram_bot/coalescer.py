@@ -0,0 +1,159 @@
+# app/telegram_bot/coalescer.py
+
+import asyncio
+import logging
+from typing import AsyncContextManager, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class _ChatState:
+    """Состояние одного чата: накопленные сообщения, таймер и замок обработки."""
+
+    def __init__(self):
+        self.texts: list[str] = []
+        self.update = None
+        self.context = None
+        self.first_at: float | None = None
+        self.timer: asyncio.TimerHandle | None = None
+        # Одна обработка за раз на чат (если нет общей очереди чата — serialize)
+        self.lock = asyncio.Lock()
+        self.in_flight = 0
+
+
+class MessageCoalescer:
+    """
+    Склеивает сообщения одного чата, пришедшие подряд в пределах window секунд,
+    в одну пачку и передаёт её handler(update, context, text) одним вызовом:
+    одна запись в БД, одно списание, один запрос к LLM.
+
+    - Каждое новое сообщение продлевает окно, но не дольше max_wait от первого.
+    - Пачки одного чата обрабатываются строго по очереди (не больше одного
+      запроса к LLM на пользователя); сообщения, пришедшие во время обработки,
+      копятся в следующую пачку.
+    - Разные чаты обрабатываются независимо.
+    - Подряд идущие одинаковые сообщения (двойная отправка) схлопываются.
+
+    serialize(chat_id) — асинхронный контекст-менеджер очереди чата
+    (ChatOrderedApplication.chat_turn): пачка обрабатывается в той же очереди
+    и под тем же общим лимитом, что и остальные апдейты чата. Сообщения
+    забираются из пачки только внутри очереди, а апдейт, пришедший раньше
+    срабатывания таймера, сначала дообрабатывает их (run_pending) — так
+    кнопка, нажатая после сообщения, не обгоняет его.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[..., Awaitable[None]],
+        window: float,
+        max_wait: float,
+        serialize: Callable[[int], AsyncContextManager] | None = None,
+    ):
+        self._handler = handler
+        self.window = window
+        self.max_wait = max_wait
+        self._serialize = serialize
+        self._chats: dict[int, _ChatState] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self.stats = {"received": 0, "batches": 0, "merged": 0, "duplicates": 0}
+
+    def submit(self, chat_id: int, update, context, text: str) -> None:
+        """
+        Добавляет сообщение в очередь чата. Возвращает управление сразу —
+        обработка пойдёт в фоне, когда окно закроется.
+        """
+        loop = asyncio.get_running_loop()
+        state = self._chats.get(chat_id)
+        if state is None:
+            state = self._chats[chat_id] = _ChatState()
+
+        self.stats["received"] += 1
+        if state.texts and state.texts[-1] == text:
+            self.stats["duplicates"] += 1
+        else:
+            state.texts.append(text)
+        # Отвечаем на последнее сообщение пачки
+        state.update = update
+        state.context = context
+
+        now = loop.time()
+        if state.first_at is None:
+            state.first_at = now
+        if state.timer is not None:
+            state.timer.cancel()
+        delay = min(self.window, max(0.0, state.first_at + self.max_wait - now))
+        state.timer = loop.call_later(delay, self._flush, chat_id)
+
+    def has_pending(self, chat_id: int) -> bool:
+        state = self._chats.get(chat_id)
+        return state is not None and bool(state.texts)
+
+    def _flush(self, chat_id: int) -> None:
+        state = self._chats.get(chat_id)
+        if state is None or not state.texts:
+            return
+        if state.timer is not None:
+            state.timer.cancel()
+            state.timer = None
+        state.in_flight += 1
+        task = asyncio.create_task(self._process(chat_id, state))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _process(self, chat_id: int, state: _ChatState) -> None:
+        try:
+            if self._serialize is not None:
+                async with self._serialize(chat_id):
+                    await self._run(chat_id, state)
+            else:
+                async with state.lock:
+                    await self._run(chat_id, state)
+        finally:
+            state.in_flight -= 1
+            self._forget_if_idle(chat_id, state)
+
+    async def run_pending(self, chat_id: int) -> None:
+        """
+        Сразу обрабатывает накопленную пачку чата. Вызывать только изнутри
+        очереди этого чата (serialize), например перед обработкой кнопки.
+        """
+        state = self._chats.get(chat_id)
+        if state is None or not state.texts:
+            return
+        try:
+            await self._run(chat_id, state)
+        finally:
+            self._forget_if_idle(chat_id, state)
+
+    async def _run(self, chat_id: int, state: _ChatState) -> None:
+        # Забираем сообщения только сейчас: всё, что пришло до начала обработки, — в этой пачке
+        if not state.texts:
+            return
+        if state.timer is not None:
+            state.timer.cancel()
+        texts, update, context = state.texts, state.update, state.context
+        state.texts = []
+        state.first_at = None
+        state.timer = None
+
+        self.stats["batches"] += 1
+        self.stats["merged"] += len(texts) - 1
+        try:
+            await self._handler(update, context, "\n\n".join(texts))
+        except Exception as e:
+            logger.error(f"Ошибка обработки сообщений чата {chat_id}: {e}", exc_info=True)
+
+    def _forget_if_idle(self, chat_id: int, state: _ChatState) -> None:
+        if state.in_flight == 0 and not state.texts and state.timer is None:
+            if self._chats.get(chat_id) is state:
+                self._chats.pop(chat_id, None)
+
+    async def drain(self) -> None:
+        """
+        Немедленно отправляет все накопленные пачки и ждёт их обработки
+        (вызывается при остановке бота).
+        """
+        for chat_id in list(self._chats):
+            self._flush(chat_id)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,194 @@
+# app/telegram_bot/completion_cache.py
+
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+
+from app.config import (
+    COMPLETION_CACHE_ENABLED,
+    COMPLETION_CACHE_MAX_ENTRIES,
+    COMPLETION_CACHE_TTL,
+    COMPLETION_CACHE_MAX_TEMPERATURE,
+    COMPLETION_CACHE_SQLITE_PATH,
+    COMPLETION_CACHE_SQLITE_MAX_ENTRIES,
+)
+
+logger = logging.getLogger(__name__)
+
+# Чистка SQLite-кэша от просроченных строк — раз в столько записей
+_PRUNE_EVERY = 100
+
+
+def _normalize_content(content):
+    """
+    Убирает пробелы/переносы по краям, чтобы "Привет!" и " Привет! " совпадали.
+    Внутри текста ничего не трогаем: отступы и переносы в коде меняют смысл запроса.
+    """
+    if isinstance(content, str):
+        return content.strip()
+    return content
+
+
+def make_cache_key(model: str, messages: list, params: dict) -> str:
+    """
+    Ключ кэша: sha256 от модели, параметров генерации и нормализованных сообщений.
+    """
+    normalized = [
+        {"role": m.get("role"), "content": _normalize_content(m.get("content"))}
+        for m in messages
+    ]
+    raw = json.dumps(
+        {"model": model, "params": params, "messages": normalized},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class CompletionCache:
+    """
+    Кэш ответов /chat/completions:
+      - in-memory LRU с TTL (первый уровень);
+      - опционально SQLite-файл (второй уровень, переживает рестарт).
+    Используется только для детерминированных запросов
+    (temperature <= COMPLETION_CACHE_MAX_TEMPERATURE).
+    """
+
+    def __init__(
+        self,
+        max_entries: int = COMPLETION_CACHE_MAX_ENTRIES,
+        ttl: float = COMPLETION_CACHE_TTL,
+        max_temperature: float = COMPLETION_CACHE_MAX_TEMPERATURE,
+        sqlite_path: str = COMPLETION_CACHE_SQLITE_PATH,
+        enabled: bool = COMPLETION_CACHE_ENABLED,
+        sqlite_max_entries: int = COMPLETION_CACHE_SQLITE_MAX_ENTRIES,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_temperature = max_temperature
+        self.sqlite_path = sqlite_path
+        self.sqlite_max_entries = sqlite_max_entries
+        self.enabled = enabled
+        self._writes_since_prune = 0
+        self._memory: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._db = None
+        self._db_lock = asyncio.Lock()
+        self.stats = {
+            "memory_hits": 0,
+            "sqlite_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "bypassed": 0,
+            "sqlite_pruned": 0,
+        }
+
+    def is_cacheable(self, temperature: float) -> bool:
+        return self.enabled and temperature <= self.max_temperature
+
+    def hit_rate(self) -> float:
+        hits = self.stats["memory_hits"] + self.stats["sqlite_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+    async def _get_db(self):
+        if not self.sqlite_path:
+            return None
+        async with self._db_lock:
+            if self._db is None:
+                import aiosqlite
+                self._db = await aiosqlite.connect(self.sqlite_path)
+                await self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS completion_cache ("
+                    " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+                )
+                await self._db.execute(
+                    "CREATE INDEX IF NOT EXISTS ix_completion_cache_expires_at"
+                    " ON completion_cache (expires_at)"
+                )
+                await self._prune(self._db)
+        return self._db
+
+    async def _prune(self, db) -> None:
+        """Удаляет просроченные строки и всё сверх sqlite_max_entries (ближайшие к истечению)."""
+        cursor = await db.execute("DELETE FROM completion_cache WHERE expires_at <= ?", (time.time(),))
+        pruned = cursor.rowcount
+        cursor = await db.execute(
+            "DELETE FROM completion_cache WHERE key IN ("
+            " SELECT key FROM completion_cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.sqlite_max_entries,),
+        )
+        pruned += cursor.rowcount
+        await db.commit()
+        self.stats["sqlite_pruned"] += max(0, pruned)
+        self._writes_since_prune = 0
+
+    def _remember(self, key: str, expires_at: float, value: dict) -> None:
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def get(self, key: str) -> dict | None:
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > now:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                # Копия: вызывающий код не должен менять закэшированный ответ
+                return copy.deepcopy(value)
+            del self._memory[key]
+
+        db = await self._get_db()
+        if db is not None:
+            try:
+                async with db.execute(
+                    "SELECT value, expires_at FROM completion_cache WHERE key = ?", (key,)
+                ) as cursor:
+                    row = await cursor.fetchone()
+                if row and row[1] > now:
+                    value = json.loads(row[0])
+                    self._remember(key, row[1], value)
+                    self.stats["sqlite_hits"] += 1
+                    return copy.deepcopy(value)
+            except Exception as e:
+                logger.warning(f"Ошибка чтения SQLite-кэша ответов: {e}")
+
+        self.stats["misses"] += 1
+        return None
+
+    async def put(self, key: str, value: dict) -> None:
+        expires_at = time.time() + self.ttl
+        self._remember(key, expires_at, copy.deepcopy(value))
+        self.stats["stores"] += 1
+
+        db = await self._get_db()
+        if db is not None:
+            try:
+                await db.execute(
+                    "INSERT OR REPLACE INTO completion_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), expires_at),
+                )
+                await db.commit()
+                self._writes_since_prune += 1
+                if self._writes_since_prune >= _PRUNE_EVERY:
+                    await self._prune(db)
+            except Exception as e:
+                logger.warning(f"Ошибка записи в SQLite-кэш ответов: {e}")
+
+    def clear(self) -> None:
+        self._memory.clear()
+
+    async def close(self) -> None:
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+
+# Общий кэш процесса
+completion_cache = CompletionCache()
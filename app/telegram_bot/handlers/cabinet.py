@@ -4,8 +4,7 @@ import logging
 from telegram import (
     Update,
     InlineKeyboardButton,
-    InlineKeyboardMarkup,
-    InputMediaPhoto
+    InlineKeyboardMarkup
 )
 from telegram.ext import ContextTypes
 
@@ -15,9 +14,20 @@ from app.services.payment_service import (
     calculate_tokens_for_amount
 )
 from app.services.tkassa_service import TKassaClient
+from app.services.user_service import get_user_profile, UserProfile
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from app.database.models import User
+from app.telegram_bot.assets import edit_cover, reply_cover, CABINET_COVER
+from app.telegram_bot.callback_router import (
+    callback_router,
+    MENU,
+    CABINET,
+    CABINET_TOPUP,
+    CABINET_HISTORY,
+    CABINET_PAY_TKASSA,
+    CABINET_PAY_TELEGRAM,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -25,8 +35,6 @@ async def show_cabinet(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Показывает личный кабинет с обложкой Cabinet.png
     """
-    cover_path = "app/telegram_bot/images/Cabinet.png"
-
     if update.callback_query:
         query = update.callback_query
         await query.answer()
@@ -39,11 +47,13 @@ async def show_cabinet(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error("No session_factory found in bot_data.")
         return
 
-    # Получаем/создаём пользователя, смотрим баланс
+    # Профиль (из кэша, если есть) или новый пользователь, смотрим баланс
     async with session_factory() as session:
-        user = await _get_or_create_user(session, chat_id)
-        balance = user.balance_tokens or 0
-        subscription_active = user.subscription_status  # bool
+        profile = await get_user_profile(session, chat_id)
+        if profile is None:
+            profile = UserProfile.from_user(await _get_or_create_user(session, chat_id))
+        balance = profile.balance_tokens or 0
+        subscription_active = profile.subscription_status  # bool
         sub_text = "Активна" if subscription_active else "Нет"
 
     text = (
@@ -54,168 +64,150 @@ async def show_cabinet(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
     keyboard = [
-        [InlineKeyboardButton("Пополнить баланс", callback_data="cabinet_topup")],
-        [InlineKeyboardButton("История платежей", callback_data="cabinet_history")],
-        [InlineKeyboardButton("Назад в меню", callback_data="back_to_menu")]
+        [InlineKeyboardButton("Пополнить баланс", callback_data=CABINET_TOPUP.data())],
+        [InlineKeyboardButton("История платежей", callback_data=CABINET_HISTORY.data())],
+        [InlineKeyboardButton("Назад в меню", callback_data=MENU.data())]
     ]
     markup = InlineKeyboardMarkup(keyboard)
 
     caption_text = text  # Пойдёт в caption
 
     if update.callback_query:
-        media = InputMediaPhoto(open(cover_path, "rb"), caption=caption_text, parse_mode="Markdown")
-        await update.callback_query.edit_message_media(
-            media=media,
+        await edit_cover(
+            update.callback_query,
+            CABINET_COVER,
+            caption=caption_text,
+            parse_mode="Markdown",
             reply_markup=markup
         )
     else:
-        with open(cover_path, "rb") as photo:
-            await update.message.reply_photo(
-                photo=photo,
-                caption=caption_text,
-                reply_markup=markup,
-                parse_mode="Markdown"
-            )
+        await reply_cover(
+            update.message,
+            CABINET_COVER,
+            caption=caption_text,
+            reply_markup=markup,
+            parse_mode="Markdown"
+        )
 
 
-async def cabinet_callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """
-    Общий callback-хендлер для inline-кнопок в личном кабинете.
-    """
+@callback_router.handler(CABINET)
+async def _cabinet(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await show_cabinet(update, context)
+
+
+# Для всех колбэков кабинета оставляем ту же «Cabinet.png», но с разным caption.
+# Если хотите разные картинки, меняйте CABINET_COVER.
+
+@callback_router.handler(CABINET_TOPUP)
+async def cabinet_topup(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Выбор способа пополнения."""
+    query = update.callback_query
+    text = "Выберите способ пополнения:"
+    keyboard = [
+        [
+            InlineKeyboardButton("Оплатить через T-Кассу", callback_data=CABINET_PAY_TKASSA.data()),
+            InlineKeyboardButton("Оплатить через Telegram", callback_data=CABINET_PAY_TELEGRAM.data())
+        ],
+        [InlineKeyboardButton("Назад", callback_data=CABINET.data())]
+    ]
+    markup = InlineKeyboardMarkup(keyboard)
+
+    await edit_cover(query, CABINET_COVER, caption=text, reply_markup=markup)
+
+
+@callback_router.handler(CABINET_HISTORY)
+async def cabinet_history(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Последние транзакции пользователя."""
     query = update.callback_query
-    await query.answer()
-    data = query.data
     chat_id = query.message.chat.id
 
-    # Для всех колбэков будем по умолчанию оставлять ту же «Cabinet.png»,
-    # но с разным caption. Если хотите разные картинки, меняйте cover_path.
-
-    cover_path = "app/telegram_bot/images/Cabinet.png"
-
-    if data == "cabinet_topup":
-        text = "Выберите способ пополнения:"
-        keyboard = [
-            [
-                InlineKeyboardButton("Оплатить через T-Кассу", callback_data="cabinet_pay_tkassa"),
-                InlineKeyboardButton("Оплатить через Telegram", callback_data="cabinet_pay_telegram")
-            ],
-            [InlineKeyboardButton("Назад", callback_data="show_cabinet")]
-        ]
-        markup = InlineKeyboardMarkup(keyboard)
-
-        from telegram import InputMediaPhoto
-        media = InputMediaPhoto(open(cover_path, "rb"), caption=text)
-        await query.edit_message_media(
-            media=media,
-            reply_markup=markup
-        )
+    session_factory = context.application.bot_data.get("session_factory")
+    if not session_factory:
+        logger.error("No session_factory found in bot_data.")
+        await query.edit_message_text("Ошибка: не можем получить историю (нет подключения к БД).")
         return
 
-    elif data == "cabinet_history":
-        session_factory = context.application.bot_data.get("session_factory")
-        if not session_factory:
-            logger.error("No session_factory found in bot_data.")
-            await query.edit_message_text("Ошибка: не можем получить историю (нет подключения к БД).")
-            return
+    async with session_factory() as session:
+        txns = await get_user_transactions(session, chat_id, limit=5)
 
-        async with session_factory() as session:
-            txns = await get_user_transactions(session, chat_id, limit=5)
-
-        if not txns:
-            text = "История платежей пуста."
-        else:
-            lines = ["Последние транзакции:"]
-            for t in txns:
-                lines.append(f"• ID {t.id} | {t.amount_rub}₽ => {t.tokens} токенов [{t.status}]")
-            text = "\n".join(lines)
-
-        keyboard = [[InlineKeyboardButton("Назад", callback_data="show_cabinet")]]
-        markup = InlineKeyboardMarkup(keyboard)
-        media = InputMediaPhoto(open(cover_path, "rb"), caption=text)
-        await query.edit_message_media(
-            media=media,
-            reply_markup=markup
-        )
-        return
+    if not txns:
+        text = "История платежей пуста."
+    else:
+        lines = ["Последние транзакции:"]
+        for t in txns:
+            lines.append(f"• ID {t.id} | {t.amount_rub}₽ => {t.tokens} токенов [{t.status}]")
+        text = "\n".join(lines)
 
-    elif data == "cabinet_pay_tkassa":
-        # Пример логики для T-Кассы
-        amount_rub = 100
-        tokens = calculate_tokens_for_amount(amount_rub)
+    keyboard = [[InlineKeyboardButton("Назад", callback_data=CABINET.data())]]
+    markup = InlineKeyboardMarkup(keyboard)
+    await edit_cover(query, CABINET_COVER, caption=text, reply_markup=markup)
 
-        session_factory = context.application.bot_data.get("session_factory")
-        if not session_factory:
-            logger.error("No session_factory found in bot_data.")
-            await query.edit_message_text("Ошибка: нет соединения с БД.")
-            return
 
-        async with session_factory() as session:
-            txn = await create_transaction(session, user_id=chat_id, amount_rub=amount_rub, tokens=tokens, method="T-Kassa")
-            txn_id = txn.id
-
-        tk_client = TKassaClient()
-        amount_coins = int(amount_rub * 100)
-        order_id = f"order-{txn_id}"
-        description = f"Пополнение баланса, транзакция #{txn_id}"
-
-        try:
-            init_resp = await tk_client.init_payment(
-                amount_coins,
-                order_id,
-                description,
-                customer_key=str(chat_id)
-            )
-            success = init_resp.get("Success", False)
-            if not success:
-                message = init_resp.get("Message", "Ошибка при инициализации платежа")
-                text = f"Не удалось создать платёж: {message}"
-                keyboard = [[InlineKeyboardButton("Назад", callback_data="show_cabinet")]]
-                markup = InlineKeyboardMarkup(keyboard)
-                media = InputMediaPhoto(open(cover_path, "rb"), caption=text)
-                await query.edit_message_media(media=media, reply_markup=markup)
-                return
-
-            payment_url = init_resp.get("PaymentURL")
-            text = (
-                f"Счёт на {amount_rub}₽ создан!\n"
-                f"Транзакция #{txn_id}\n\n"
-                f"[Оплатить >>>]({payment_url})"
-            )
-            keyboard = [[InlineKeyboardButton("Назад", callback_data="show_cabinet")]]
-            markup = InlineKeyboardMarkup(keyboard)
-            media = InputMediaPhoto(open(cover_path, "rb"), caption=text, parse_mode="Markdown")
-            await query.edit_message_media(media=media, reply_markup=markup)
-
-        except Exception as e:
-            logger.error(f"Ошибка при init_payment в T-Кассу: {e}", exc_info=True)
-            text = "Ошибка при создании платежа. Попробуйте позже."
-            keyboard = [[InlineKeyboardButton("Назад", callback_data="show_cabinet")]]
-            markup = InlineKeyboardMarkup(keyboard)
-            media = InputMediaPhoto(open(cover_path, "rb"), caption=text)
-            await query.edit_message_media(media=media, reply_markup=markup)
-        return
+@callback_router.handler(CABINET_PAY_TKASSA)
+async def cabinet_pay_tkassa(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Создаёт транзакцию и счёт в T-Кассе."""
+    query = update.callback_query
+    chat_id = query.message.chat.id
+    back_markup = InlineKeyboardMarkup([[InlineKeyboardButton("Назад", callback_data=CABINET.data())]])
 
-    elif data == "cabinet_pay_telegram":
-        # Запуск Telegram Invoice (пример)
-        from app.telegram_bot.handlers.payments import send_invoice_to_user
-        await send_invoice_to_user(update, context)
-        return
+    # Пример логики для T-Кассы
+    amount_rub = 100
+    tokens = calculate_tokens_for_amount(amount_rub)
 
-    elif data == "show_cabinet":
-        await show_cabinet(update, context)
+    session_factory = context.application.bot_data.get("session_factory")
+    if not session_factory:
+        logger.error("No session_factory found in bot_data.")
+        await query.edit_message_text("Ошибка: нет соединения с БД.")
         return
 
-    elif data == "back_to_menu":
-        from app.telegram_bot.handlers.menu import menu_command
-        await menu_command(update, context)
-        return
+    async with session_factory() as session:
+        txn = await create_transaction(session, user_id=chat_id, amount_rub=amount_rub, tokens=tokens, method="T-Kassa")
+        txn_id = txn.id
+
+    tk_client = TKassaClient()
+    amount_coins = int(amount_rub * 100)
+    order_id = f"order-{txn_id}"
+    description = f"Пополнение баланса, транзакция #{txn_id}"
+
+    try:
+        init_resp = await tk_client.init_payment(
+            amount_coins,
+            order_id,
+            description,
+            customer_key=str(chat_id)
+        )
+        success = init_resp.get("Success", False)
+        if not success:
+            message = init_resp.get("Message", "Ошибка при инициализации платежа")
+            text = f"Не удалось создать платёж: {message}"
+            await edit_cover(query, CABINET_COVER, caption=text, reply_markup=back_markup)
+            return
 
-    else:
-        # Неизвестная кнопка
-        text = "Неизвестная команда кнопки."
-        media = InputMediaPhoto(open(cover_path, "rb"), caption=text)
-        await query.edit_message_media(media=media)
-        return
+        payment_url = init_resp.get("PaymentURL")
+        text = (
+            f"Счёт на {amount_rub}₽ создан!\n"
+            f"Транзакция #{txn_id}\n\n"
+            f"[Оплатить >>>]({payment_url})"
+        )
+        await edit_cover(
+            query,
+            CABINET_COVER,
+            caption=text,
+            parse_mode="Markdown",
+            reply_markup=back_markup
+        )
+
+    except Exception as e:
+        logger.error(f"Ошибка при init_payment в T-Кассу: {e}", exc_info=True)
+        text = "Ошибка при создании платежа. Попробуйте позже."
+        await edit_cover(query, CABINET_COVER, caption=text, reply_markup=back_markup)
+
+
+@callback_router.handler(CABINET_PAY_TELEGRAM)
+async def cabinet_pay_telegram(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Запуск Telegram Invoice (пример)."""
+    from app.telegram_bot.handlers.payments import send_invoice_to_user
+    await send_invoice_to_user(update, context)
 
 
 async def _get_or_create_user(session: AsyncSession, chat_id: int) -> User:
@@ -4,8 +4,7 @@ import logging
 from telegram import (
     Update,
     InlineKeyboardButton,
-    InlineKeyboardMarkup,
-    InputMediaPhoto
+    InlineKeyboardMarkup
 )
 from telegram.ext import ContextTypes, ConversationHandler
 
@@ -44,12 +43,35 @@ from app.config import (
     SET_NEW_CHAT_TITLE,
     SET_RENAME_CHAT
 )
+from app.telegram_bot.assets import edit_cover, CHATS_COVER
+from app.telegram_bot.model_catalog import model_catalog
+from app.telegram_bot.callback_router import (
+    callback_router,
+    MENU,
+    HELP,
+    ALL_CHATS,
+    FAVORITE_CHATS,
+    NEW_CHAT,
+    CHANGE_MODEL,
+    SELECT_MODEL,
+    INSTRUCTIONS,
+    INSTRUCTIONS_ADD,
+    INSTRUCTIONS_EDIT,
+    INSTRUCTIONS_DELETE,
+    CURRENT_CHAT_HISTORY,
+    OPEN_CHAT,
+    SET_ACTIVE_CHAT,
+    RENAME_CHAT,
+    DELETE_CHAT,
+    FAVORITE_CHAT,
+    UNFAVORITE_CHAT,
+    HISTORY,
+    HISTORY_AFTER,
+    HISTORY_BEFORE,
+)
 
 logger = logging.getLogger(__name__)
 
-# Одна обложка «на все случаи» в этом модуле (можно сделать несколько)
-CALLBACK_COVER = "app/telegram_bot/images/Chats.png"
-
 
 async def instructions_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
@@ -63,8 +85,7 @@ async def instructions_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not session_factory:
         logger.error("No session_factory found. Can't load instructions.")
         text = "Ошибка: нет подключения к БД."
-        media = InputMediaPhoto(open(CALLBACK_COVER, "rb"), caption=text)
-        await query.edit_message_media(media=media)
+        await edit_cover(query, CHATS_COVER, caption=text)
         return
 
     # Получаем инструкции из БД
@@ -75,20 +96,16 @@ async def instructions_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     if is_empty:
         text = "Текущие инструкции: (пусто)"
-        keyboard = [[InlineKeyboardButton("Добавить инструкции", callback_data="instructions_add")]]
+        keyboard = [[InlineKeyboardButton("Добавить инструкции", callback_data=INSTRUCTIONS_ADD.data())]]
     else:
         text = f"Текущие инструкции:\n\n{current_instructions}"
         keyboard = [[
-            InlineKeyboardButton("Редактировать инструкции", callback_data="instructions_edit"),
-            InlineKeyboardButton("Удалить", callback_data="instructions_delete")
+            InlineKeyboardButton("Редактировать инструкции", callback_data=INSTRUCTIONS_EDIT.data()),
+            InlineKeyboardButton("Удалить", callback_data=INSTRUCTIONS_DELETE.data())
         ]]
 
-    keyboard.append([InlineKeyboardButton("В меню", callback_data="back_to_menu")])
-    media = InputMediaPhoto(open(CALLBACK_COVER, "rb"), caption=text)
-    await query.edit_message_media(
-        media=media,
-        reply_markup=InlineKeyboardMarkup(keyboard)
-    )
+    keyboard.append([InlineKeyboardButton("В меню", callback_data=MENU.data())])
+    await edit_cover(query, CHATS_COVER, caption=text, reply_markup=InlineKeyboardMarkup(keyboard))
 
 
 async def instructions_delete(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -103,8 +120,7 @@ async def instructions_delete(update: Update, context: ContextTypes.DEFAULT_TYPE
     if not session_factory:
         logger.error("No session_factory found. Can't delete instructions.")
         text = "Ошибка: нет подключения к БД."
-        media = InputMediaPhoto(open(CALLBACK_COVER, "rb"), caption=text)
-        await query.edit_message_media(media=media)
+        await edit_cover(query, CHATS_COVER, caption=text)
         return
 
     async with session_factory() as session:
@@ -117,214 +133,234 @@ async def instructions_delete(update: Update, context: ContextTypes.DEFAULT_TYPE
     await instructions_menu(update, context)
 
 
-async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """
-    Универсальный обработчик callback_data для тех случаев,
-    которые не попадают в cabinet_callback_handler и т. д.
-    """
+# Общий CallbackQueryHandler для всех inline-кнопок: callback_data разбирает
+# callback_router, хендлеры ниже (и в cabinet.py) зарегистрированы по маршрутам
+button_handler = callback_router.dispatch
+
+
+def _back_to_menu_markup() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([[InlineKeyboardButton("🔙 В меню", callback_data=MENU.data())]])
+
+
+async def _no_db(query, action: str) -> None:
+    logger.error(f"No session_factory found. Can't {action}.")
+    await edit_cover(query, CHATS_COVER, caption="Ошибка: нет подключения к БД.")
+
+
+@callback_router.handler(MENU)
+async def back_to_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await menu_command(update, context)
+
+
+@callback_router.handler(ALL_CHATS)
+async def all_chats(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int):
+    await show_all_chats_list(update, context, page)
+
+
+@callback_router.handler(FAVORITE_CHATS)
+async def favorite_chats(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int):
+    await show_favorite_chats_list(update, context, page)
+
+
+@callback_router.handler(NEW_CHAT)
+async def new_chat(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    return await new_chat_entry(update, context)
+
+
+@callback_router.handler(CHANGE_MODEL)
+async def change_model(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Список моделей — из каталога в памяти (обновляется в фоне, см. model_catalog.py)."""
     query = update.callback_query
-    data = query.data
-    await query.answer()
+    keyboard = []
+    for model in model_catalog.picker():
+        try:
+            keyboard.append([InlineKeyboardButton(model.id, callback_data=SELECT_MODEL.data(model.id))])
+        except ValueError:
+            # id модели не помещается в 64 байта callback_data
+            logger.warning(f"Модель {model.id!r} пропущена в меню выбора")
+    keyboard.append([InlineKeyboardButton("🔙 В меню", callback_data=MENU.data())])
+
+    text = "Выберите модель:"
+    await edit_cover(
+        query,
+        CHATS_COVER,
+        caption=text,
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
 
-    if data == "back_to_menu":
-        await menu_command(update, context)
-        return
 
-    elif data == "all_chats":
-        await show_all_chats_list(update, context)
-        return
+@callback_router.handler(SELECT_MODEL)
+async def select_model(update: Update, context: ContextTypes.DEFAULT_TYPE, selected_model: str):
+    query = update.callback_query
+    session_factory = context.application.bot_data.get("session_factory")
+    if not session_factory:
+        return await _no_db(query, "set model")
 
-    elif data == "favorite_chats":
-        await show_favorite_chats_list(update, context)
+    chat_id = query.message.chat.id
+    if not model_catalog.is_available(selected_model):
+        # Кнопка из старого меню, модель уже пропала из /models
+        await edit_cover(query, CHATS_COVER, caption="Эта модель сейчас недоступна, выберите другую.")
         return
 
-    elif data == "new_chat":
-        return await new_chat_entry(update, context)
+    async with session_factory() as session:
+        await set_user_model(session, chat_id, selected_model)
+
+    # Возвращаемся в меню
+    await menu_command(update, context)
 
-    elif data == "change_model":
-        # Заранее заданный список моделей
-        predefined_models = ["gpt-4o", "o1", "o3-mini"]
-        keyboard = [[InlineKeyboardButton(model, callback_data=f"model_{model}")] for model in predefined_models]
-        keyboard.append([InlineKeyboardButton("🔙 В меню", callback_data="back_to_menu")])
 
-        text = "Выберите модель:"
-        media = InputMediaPhoto(open(CALLBACK_COVER, "rb"), caption=text)
-        await query.edit_message_media(
-            media=media,
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
-        return
+callback_router.handler(INSTRUCTIONS)(instructions_menu)
+callback_router.handler(INSTRUCTIONS_DELETE)(instructions_delete)
 
-    elif data.startswith("model_"):
-        session_factory = context.application.bot_data.get("session_factory")
-        if not session_factory:
-            logger.error("No session_factory found. Can't set model.")
-            text = "Ошибка: нет подключения к БД."
-            media = InputMediaPhoto(open(CALLBACK_COVER, "rb"), caption=text)
-            await query.edit_message_media(media=media)
-            return
 
-        selected_model = data.split("_", 1)[1]
-        chat_id = query.message.chat.id
+@callback_router.handler(INSTRUCTIONS_ADD)
+async def instructions_add(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    return await instructions_add_entry(update, context)
 
-        async with session_factory() as session:
-            await set_user_model(session, chat_id, selected_model)
 
-        # Возвращаемся в меню
-        await menu_command(update, context)
-        return
+@callback_router.handler(INSTRUCTIONS_EDIT)
+async def instructions_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    return await instructions_edit_entry(update, context)
 
-    elif data == "update_instructions":
-        return await instructions_menu(update, context)
 
-    elif data == "instructions_add":
-        return await instructions_add_entry(update, context)
+@callback_router.handler(HELP)
+async def help_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    text = (
+        "❓ Помощь:\n"
+        "1. Отправьте любое текстовое сообщение – бот ответит.\n"
+        "2. «Все чаты» – список всех ваших чатов.\n"
+        "3. «Избранные чаты» – только ⭐.\n"
+        "4. «Сменить модель» – переключение GPT-модели.\n"
+        "5. «Инструкции» – задать/редактировать/удалить общие инструкции.\n"
+        "6. «История» – просмотр истории активного чата.\n"
+    )
+    await edit_cover(
+        update.callback_query,
+        CHATS_COVER,
+        caption=text,
+        reply_markup=_back_to_menu_markup()
+    )
 
-    elif data == "instructions_edit":
-        return await instructions_edit_entry(update, context)
 
-    elif data == "instructions_delete":
-        return await instructions_delete(update, context)
+@callback_router.handler(CURRENT_CHAT_HISTORY)
+async def current_chat_history(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    session_factory = context.application.bot_data.get("session_factory")
+    if not session_factory:
+        return await _no_db(query, "get active chat")
 
-    elif data == "help":
-        text = (
-            "❓ Помощь:\n"
-            "1. Отправьте любое текстовое сообщение – бот ответит.\n"
-            "2. «Все чаты» – список всех ваших чатов.\n"
-            "3. «Избранные чаты» – только ⭐.\n"
-            "4. «Сменить модель» – переключение GPT-модели.\n"
-            "5. «Инструкции» – задать/редактировать/удалить общие инструкции.\n"
-            "6. «История» – просмотр истории активного чата.\n"
+    user_id = query.message.chat.id
+    async with session_factory() as session:
+        active_id = await get_active_chat_id(session, user_id)
+    if active_id:
+        await show_chat_history(update, context, active_id, page=0)
+    else:
+        text = "У вас нет активного чата. Создайте или выберите чат."
+        await edit_cover(
+            query,
+            CHATS_COVER,
+            caption=text,
+            reply_markup=_back_to_menu_markup()
         )
-        keyboard = [[InlineKeyboardButton("🔙 В меню", callback_data="back_to_menu")]]
-        media = InputMediaPhoto(open(CALLBACK_COVER, "rb"), caption=text)
-        await query.edit_message_media(media=media, reply_markup=InlineKeyboardMarkup(keyboard))
-        return
 
-    elif data == "history_current_chat":
-        session_factory = context.application.bot_data.get("session_factory")
-        if not session_factory:
-            logger.error("No session_factory found. Can't get active chat.")
-            text = "Ошибка: нет подключения к БД."
-            media = InputMediaPhoto(open(CALLBACK_COVER, "rb"), caption=text)
-            await query.edit_message_media(media=media)
-            return
-
-        user_id = query.message.chat.id
-        async with session_factory() as session:
-            active_id = await get_active_chat_id(session, user_id)
-        if active_id:
-            await show_chat_history(update, context, active_id, page=0)
-        else:
-            text = "У вас нет активного чата. Создайте или выберите чат."
-            keyboard = [[InlineKeyboardButton("🔙 В меню", callback_data="back_to_menu")]]
-            media = InputMediaPhoto(open(CALLBACK_COVER, "rb"), caption=text)
-            await query.edit_message_media(media=media, reply_markup=InlineKeyboardMarkup(keyboard))
-        return
 
-    elif data.startswith("open_chat_"):
-        chat_db_id = int(data.split("_")[-1])
-        await show_single_chat_menu(update, context, chat_db_id)
-        return
+@callback_router.handler(OPEN_CHAT)
+async def open_chat(update: Update, context: ContextTypes.DEFAULT_TYPE, chat_db_id: int):
+    await show_single_chat_menu(update, context, chat_db_id)
 
-    elif data.startswith("set_active_"):
-        session_factory = context.application.bot_data.get("session_factory")
-        if not session_factory:
-            logger.error("No session_factory found. Can't set active chat.")
-            text = "Ошибка: нет подключения к БД."
-            media = InputMediaPhoto(open(CALLBACK_COVER, "rb"), caption=text)
-            await query.edit_message_media(media=media)
-            return
-
-        chat_db_id = int(data.split("_")[-1])
-        user_id = query.message.chat.id
-        async with session_factory() as session:
-            await set_active_chat_id(session, user_id, chat_db_id)
-
-        text = f"Чат {chat_db_id} теперь активен."
-        keyboard = [[InlineKeyboardButton("🔙 В меню", callback_data="back_to_menu")]]
-        media = InputMediaPhoto(open(CALLBACK_COVER, "rb"), caption=text)
-        await query.edit_message_media(
-            media=media,
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
-        return
 
-    elif data.startswith("rename_"):
-        return await rename_chat_entry(update, context)
-
-    elif data.startswith("delete_chat_"):
-        session_factory = context.application.bot_data.get("session_factory")
-        if not session_factory:
-            logger.error("No session_factory found. Can't delete chat.")
-            text = "Ошибка: нет подключения к БД."
-            media = InputMediaPhoto(open(CALLBACK_COVER, "rb"), caption=text)
-            await query.edit_message_media(media=media)
-            return
-
-        chat_db_id = int(data.split("_")[-1])
-        user_id = query.message.chat.id
-        async with session_factory() as session:
-            active_id = await get_active_chat_id(session, user_id)
-            if active_id == chat_db_id:
-                await set_active_chat_id(session, user_id, None)
-            await delete_chat(session, chat_db_id)
-
-        text = f"Чат {chat_db_id} удалён."
-        keyboard = [[InlineKeyboardButton("🔙 В меню", callback_data="back_to_menu")]]
-        media = InputMediaPhoto(open(CALLBACK_COVER, "rb"), caption=text)
-        await query.edit_message_media(media=media, reply_markup=InlineKeyboardMarkup(keyboard))
-        return
+@callback_router.handler(SET_ACTIVE_CHAT)
+async def set_active_chat(update: Update, context: ContextTypes.DEFAULT_TYPE, chat_db_id: int):
+    query = update.callback_query
+    session_factory = context.application.bot_data.get("session_factory")
+    if not session_factory:
+        return await _no_db(query, "set active chat")
 
-    elif data.startswith("fav_"):
-        session_factory = context.application.bot_data.get("session_factory")
-        if not session_factory:
-            logger.error("No session_factory found. Can't favorite chat.")
-            text = "Ошибка: нет подключения к БД."
-            media = InputMediaPhoto(open(CALLBACK_COVER, "rb"), caption=text)
-            await query.edit_message_media(media=media)
-            return
+    user_id = query.message.chat.id
+    async with session_factory() as session:
+        await set_active_chat_id(session, user_id, chat_db_id)
+
+    text = f"Чат {chat_db_id} теперь активен."
+    await edit_cover(
+        query,
+        CHATS_COVER,
+        caption=text,
+        reply_markup=_back_to_menu_markup()
+    )
 
-        chat_db_id = int(data.split("_")[-1])
-        async with session_factory() as session:
-            await set_chat_favorite(session, chat_db_id, True)
 
-        await show_single_chat_menu(update, context, chat_db_id)
-        return
+@callback_router.handler(RENAME_CHAT)
+async def rename_chat(update: Update, context: ContextTypes.DEFAULT_TYPE, chat_db_id: int):
+    return await rename_chat_entry(update, context)
 
-    elif data.startswith("unfav_"):
-        session_factory = context.application.bot_data.get("session_factory")
-        if not session_factory:
-            logger.error("No session_factory found. Can't unfavorite chat.")
-            text = "Ошибка: нет подключения к БД."
-            media = InputMediaPhoto(open(CALLBACK_COVER, "rb"), caption=text)
-            await query.edit_message_media(media=media)
-            return
 
-        chat_db_id = int(data.split("_")[-1])
-        async with session_factory() as session:
-            await set_chat_favorite(session, chat_db_id, False)
+@callback_router.handler(DELETE_CHAT)
+async def delete_chat_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, chat_db_id: int):
+    query = update.callback_query
+    session_factory = context.application.bot_data.get("session_factory")
+    if not session_factory:
+        return await _no_db(query, "delete chat")
 
-        await show_single_chat_menu(update, context, chat_db_id)
-        return
+    user_id = query.message.chat.id
+    async with session_factory() as session:
+        active_id = await get_active_chat_id(session, user_id)
+        if active_id == chat_db_id:
+            await set_active_chat_id(session, user_id, None)
+        await delete_chat(session, chat_db_id)
+
+    text = f"Чат {chat_db_id} удалён."
+    await edit_cover(
+        query,
+        CHATS_COVER,
+        caption=text,
+        reply_markup=_back_to_menu_markup()
+    )
 
-    elif data.startswith("history_"):
-        # history_<chat_id>:page_<N>
-        parts = data.split(":")
-        chat_part = parts[0].split("_")[-1]
-        chat_db_id = int(chat_part)
-        page = 0
-        if len(parts) > 1 and parts[1].startswith("page_"):
-            page = int(parts[1].split("_")[-1])
-        await show_chat_history(update, context, chat_db_id, page)
-        return
 
+async def _set_favorite(update: Update, context: ContextTypes.DEFAULT_TYPE, chat_db_id: int, value: bool):
+    query = update.callback_query
+    session_factory = context.application.bot_data.get("session_factory")
+    if not session_factory:
+        return await _no_db(query, "favorite chat" if value else "unfavorite chat")
+
+    async with session_factory() as session:
+        await set_chat_favorite(session, chat_db_id, value)
+
+    await show_single_chat_menu(update, context, chat_db_id)
+
+
+@callback_router.handler(FAVORITE_CHAT)
+async def favorite_chat(update: Update, context: ContextTypes.DEFAULT_TYPE, chat_db_id: int):
+    await _set_favorite(update, context, chat_db_id, True)
+
+
+@callback_router.handler(UNFAVORITE_CHAT)
+async def unfavorite_chat(update: Update, context: ContextTypes.DEFAULT_TYPE, chat_db_id: int):
+    await _set_favorite(update, context, chat_db_id, False)
+
+
+@callback_router.handler(HISTORY)
+async def chat_history(update: Update, context: ContextTypes.DEFAULT_TYPE, chat_db_id: int):
+    await show_chat_history(update, context, chat_db_id, 0)
+
+
+@callback_router.handler(HISTORY_AFTER)
+async def chat_history_after(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, chat_db_id: int, after_id: int, page: int
+):
+    await show_chat_history(update, context, chat_db_id, page, after_id=after_id)
+
+
+@callback_router.handler(HISTORY_BEFORE)
+async def chat_history_before(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, chat_db_id: int, before_id: int, page: int
+):
+    await show_chat_history(update, context, chat_db_id, page, before_id=before_id)
+
+
+@callback_router.unknown_handler
+async def unknown_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Ничего не подошло — неизвестная команда
     text = "Неизвестная команда."
-    keyboard = [[InlineKeyboardButton("🔙 В меню", callback_data="back_to_menu")]]
-    media = InputMediaPhoto(open(CALLBACK_COVER, "rb"), caption=text)
-    await query.edit_message_media(
-        media=media,
-        reply_markup=InlineKeyboardMarkup(keyboard)
-    )
+    await edit_cover(update.callback_query, CHATS_COVER, caption=text, reply_markup=_back_to_menu_markup())
     return ConversationHandler.END
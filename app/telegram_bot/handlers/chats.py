@@ -4,23 +4,48 @@ import logging
 from telegram import (
     Update,
     InlineKeyboardButton,
-    InlineKeyboardMarkup,
-    InputMediaPhoto
+    InlineKeyboardMarkup
 )
 from telegram.ext import ContextTypes
 from app.config import PAGE_SIZE
 from app.telegram_bot.utils import truncate_if_too_long
 from app.services import chat_service
+from app.services.archive_service import ensure_chat_hot
+from app.telegram_bot.assets import edit_cover, CHATS_COVER
+from app.telegram_bot.callback_router import (
+    Route,
+    MENU,
+    NEW_CHAT,
+    ALL_CHATS,
+    FAVORITE_CHATS,
+    OPEN_CHAT,
+    SET_ACTIVE_CHAT,
+    RENAME_CHAT,
+    DELETE_CHAT,
+    FAVORITE_CHAT,
+    UNFAVORITE_CHAT,
+    HISTORY,
+    HISTORY_AFTER,
+    HISTORY_BEFORE,
+)
 
 logger = logging.getLogger(__name__)
 
-# Пусть у нас одна "обложка" для всех операций с чатами:
-CHATS_COVER = "app/telegram_bot/images/Chats.png"
+
+def _pagination_row(route: Route, page: int, total: int) -> list[InlineKeyboardButton]:
+    """Кнопки ◀️/▶️ для списка из total элементов по PAGE_SIZE на странице."""
+    buttons = []
+    if page > 0:
+        buttons.append(InlineKeyboardButton("◀️", callback_data=route.data(page - 1)))
+    if (page + 1) * PAGE_SIZE < total:
+        buttons.append(InlineKeyboardButton("▶️", callback_data=route.data(page + 1)))
+    return buttons
 
 
-async def show_all_chats_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def show_all_chats_list(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int = 0):
     """
-    Показ списка всех чатов пользователя (inline-кнопки) + обложка Chats.png.
+    Показ списка чатов пользователя (inline-кнопки, по PAGE_SIZE на странице,
+    свежие сверху) + обложка Chats.png.
     """
     query = update.callback_query
     user_id = query.message.chat.id
@@ -29,57 +54,68 @@ async def show_all_chats_list(update: Update, context: ContextTypes.DEFAULT_TYPE
     if not session_factory:
         logger.error("No session_factory found in bot_data.")
         # Меняем сообщение на картинку + текст ошибки
-        media = InputMediaPhoto(open(CHATS_COVER, "rb"), caption="Ошибка: нет подключения к БД.")
-        await query.edit_message_media(media=media)
+        await edit_cover(query, CHATS_COVER, caption="Ошибка: нет подключения к БД.")
         return
 
-    # Загружаем чаты
+    # Загружаем только нужную страницу чатов
     async with session_factory() as session:
-        all_chats = await chat_service.get_user_chats(session, user_id)
+        total_chats = await chat_service.count_user_chats(session, user_id)
+        page = max(0, min(page, (total_chats - 1) // PAGE_SIZE))
+        all_chats = await chat_service.list_user_chats(
+            session, user_id, limit=PAGE_SIZE, offset=page * PAGE_SIZE
+        )
 
     if not all_chats:
         text = "У вас пока нет ни одного чата."
         keyboard = [
             [
-                InlineKeyboardButton("Создать новый чат", callback_data="new_chat"),
-                InlineKeyboardButton("🔙 В меню", callback_data="back_to_menu"),
+                InlineKeyboardButton("Создать новый чат", callback_data=NEW_CHAT.data()),
+                InlineKeyboardButton("🔙 В меню", callback_data=MENU.data()),
             ],
         ]
-        media = InputMediaPhoto(open(CHATS_COVER, "rb"), caption=text)
-        await query.edit_message_media(media=media, reply_markup=InlineKeyboardMarkup(keyboard))
+        await edit_cover(
+            query,
+            CHATS_COVER,
+            caption=text,
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
         return
 
-    text_lines = ["Ваши чаты:\n"]
+    text_lines = [f"Ваши чаты ({total_chats}):\n"]
     keyboard = []
     for chat_data in all_chats:
         db_id = chat_data.id
         title = chat_data.title
         is_fav = chat_data.is_favorite
         prefix = "⭐ " if is_fav else ""
-        text_lines.append(f"• ID {db_id}: {prefix}{title}")
+        text_lines.append(f"• ID {db_id}: {prefix}{title} ({chat_data.message_count} сообщ.)")
         keyboard.append([
             InlineKeyboardButton(
                 f"{prefix}{title}",
-                callback_data=f"open_chat_{db_id}"
+                callback_data=OPEN_CHAT.data(db_id)
             )
         ])
 
     text_result = "\n".join(text_lines)
     # Добавляем кнопки
+    pagination = _pagination_row(ALL_CHATS, page, total_chats)
+    if pagination:
+        keyboard.append(pagination)
     keyboard.append([
-        InlineKeyboardButton("Создать новый чат", callback_data="new_chat"),
-        InlineKeyboardButton("🔙 В меню", callback_data="back_to_menu")
+        InlineKeyboardButton("Создать новый чат", callback_data=NEW_CHAT.data()),
+        InlineKeyboardButton("🔙 В меню", callback_data=MENU.data())
     ])
-    media = InputMediaPhoto(open(CHATS_COVER, "rb"), caption=text_result)
-    await query.edit_message_media(
-        media=media,
+    await edit_cover(
+        query,
+        CHATS_COVER,
+        caption=text_result,
         reply_markup=InlineKeyboardMarkup(keyboard)
     )
 
 
-async def show_favorite_chats_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def show_favorite_chats_list(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int = 0):
     """
-    Показ избранных чатов (⭐) + та же обложка (или сделайте свою).
+    Показ избранных чатов (⭐, по PAGE_SIZE на странице) + та же обложка (или сделайте свою).
     """
     query = update.callback_query
     user_id = query.message.chat.id
@@ -87,36 +123,47 @@ async def show_favorite_chats_list(update: Update, context: ContextTypes.DEFAULT
     session_factory = context.application.bot_data.get("session_factory")
     if not session_factory:
         logger.error("No session_factory found in bot_data.")
-        media = InputMediaPhoto(open(CHATS_COVER, "rb"), caption="Ошибка: нет подключения к БД.")
-        await query.edit_message_media(media=media)
+        await edit_cover(query, CHATS_COVER, caption="Ошибка: нет подключения к БД.")
         return
 
     async with session_factory() as session:
-        fav_chats = await chat_service.get_favorite_chats(session, user_id)
+        total_favorites = await chat_service.count_user_chats(session, user_id, favorites_only=True)
+        page = max(0, min(page, (total_favorites - 1) // PAGE_SIZE))
+        fav_chats = await chat_service.list_user_chats(
+            session, user_id, limit=PAGE_SIZE, offset=page * PAGE_SIZE, favorites_only=True
+        )
 
     if not fav_chats:
         text = "У вас нет избранных чатов."
-        keyboard = [[InlineKeyboardButton("🔙 В меню", callback_data="back_to_menu")]]
-        media = InputMediaPhoto(open(CHATS_COVER, "rb"), caption=text)
-        await query.edit_message_media(media=media, reply_markup=InlineKeyboardMarkup(keyboard))
+        keyboard = [[InlineKeyboardButton("🔙 В меню", callback_data=MENU.data())]]
+        await edit_cover(
+            query,
+            CHATS_COVER,
+            caption=text,
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
         return
 
-    text_lines = ["Избранные чаты:\n"]
+    text_lines = [f"Избранные чаты ({total_favorites}):\n"]
     keyboard = []
     for chat_data in fav_chats:
         db_id = chat_data.id
         title = chat_data.title
         prefix = "⭐ "
-        text_lines.append(f"• ID {db_id}: {prefix}{title}")
+        text_lines.append(f"• ID {db_id}: {prefix}{title} ({chat_data.message_count} сообщ.)")
         keyboard.append([
-            InlineKeyboardButton(f"{prefix}{title}", callback_data=f"open_chat_{db_id}")
+            InlineKeyboardButton(f"{prefix}{title}", callback_data=OPEN_CHAT.data(db_id))
         ])
 
     text_result = "\n".join(text_lines)
-    keyboard.append([InlineKeyboardButton("🔙 В меню", callback_data="back_to_menu")])
-    media = InputMediaPhoto(open(CHATS_COVER, "rb"), caption=text_result)
-    await query.edit_message_media(
-        media=media,
+    pagination = _pagination_row(FAVORITE_CHATS, page, total_favorites)
+    if pagination:
+        keyboard.append(pagination)
+    keyboard.append([InlineKeyboardButton("🔙 В меню", callback_data=MENU.data())])
+    await edit_cover(
+        query,
+        CHATS_COVER,
+        caption=text_result,
         reply_markup=InlineKeyboardMarkup(keyboard)
     )
 
@@ -130,71 +177,94 @@ async def show_single_chat_menu(update: Update, context: ContextTypes.DEFAULT_TY
     session_factory = context.application.bot_data.get("session_factory")
     if not session_factory:
         logger.error("No session_factory found in bot_data.")
-        media = InputMediaPhoto(open(CHATS_COVER, "rb"), caption="Ошибка: нет подключения к БД.")
-        await query.edit_message_media(media=media)
+        await edit_cover(query, CHATS_COVER, caption="Ошибка: нет подключения к БД.")
         return
 
     async with session_factory() as session:
         chat_title = await chat_service.get_chat_title(session, chat_db_id)
         if not chat_title:
-            media = InputMediaPhoto(open(CHATS_COVER, "rb"), caption="Чат не найден (возможно, удалён).")
-            keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="all_chats")]]
-            await query.edit_message_media(media=media, reply_markup=InlineKeyboardMarkup(keyboard))
+            keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data=ALL_CHATS.data(0))]]
+            await edit_cover(
+                query,
+                CHATS_COVER,
+                caption="Чат не найден (возможно, удалён).",
+                reply_markup=InlineKeyboardMarkup(keyboard)
+            )
             return
 
         is_fav = await chat_service.is_favorite_chat(session, chat_db_id)
 
     favorite_btn_text = "Убрать из избранного" if is_fav else "Добавить в избранное"
-    favorite_cb = f"unfav_{chat_db_id}" if is_fav else f"fav_{chat_db_id}"
+    favorite_cb = (UNFAVORITE_CHAT if is_fav else FAVORITE_CHAT).data(chat_db_id)
 
     text = f"Чат: {chat_title}\nID: {chat_db_id}\n\nВыберите действие:"
     keyboard = [
         [
-            InlineKeyboardButton("Назначить активным", callback_data=f"set_active_{chat_db_id}"),
-            InlineKeyboardButton("Переименовать", callback_data=f"rename_{chat_db_id}"),
+            InlineKeyboardButton("Назначить активным", callback_data=SET_ACTIVE_CHAT.data(chat_db_id)),
+            InlineKeyboardButton("Переименовать", callback_data=RENAME_CHAT.data(chat_db_id)),
         ],
         [
-            InlineKeyboardButton("История", callback_data=f"history_{chat_db_id}:page_0"),
+            InlineKeyboardButton("История", callback_data=HISTORY.data(chat_db_id)),
             InlineKeyboardButton(favorite_btn_text, callback_data=favorite_cb),
         ],
-        [InlineKeyboardButton("Удалить", callback_data=f"delete_chat_{chat_db_id}")],
-        [InlineKeyboardButton("🔙 Назад к списку", callback_data="all_chats")]
+        [InlineKeyboardButton("Удалить", callback_data=DELETE_CHAT.data(chat_db_id))],
+        [InlineKeyboardButton("🔙 Назад к списку", callback_data=ALL_CHATS.data(0))]
     ]
-    media = InputMediaPhoto(open(CHATS_COVER, "rb"), caption=text)
-    await query.edit_message_media(media=media, reply_markup=InlineKeyboardMarkup(keyboard))
+    await edit_cover(query, CHATS_COVER, caption=text, reply_markup=InlineKeyboardMarkup(keyboard))
 
 
-async def show_chat_history(update: Update, context: ContextTypes.DEFAULT_TYPE, chat_db_id: int, page: int):
+async def show_chat_history(
+    update: Update,
+    context: ContextTypes.DEFAULT_TYPE,
+    chat_db_id: int,
+    page: int = 0,
+    after_id: int | None = None,
+    before_id: int | None = None
+):
     """
     Показ истории сообщений (с пагинацией) + обложка Chats.png.
+    Страницы листаются по id сообщений (after_id/before_id в callback_data),
+    поэтому из БД читается только одна страница, а не весь чат.
+    page — номер страницы для подписи и нумерации сообщений.
     """
     query = update.callback_query
 
     session_factory = context.application.bot_data.get("session_factory")
     if not session_factory:
         logger.error("No session_factory found in bot_data.")
-        media = InputMediaPhoto(open(CHATS_COVER, "rb"), caption="Ошибка: нет подключения к БД.")
-        await query.edit_message_media(media=media)
+        await edit_cover(query, CHATS_COVER, caption="Ошибка: нет подключения к БД.")
         return
 
+    try:
+        await chat_service.message_buffer.flush(chat_db_id=chat_db_id)
+    except Exception:
+        # Показываем то, что уже есть в БД
+        logger.warning(f"Не удалось дописать буфер сообщений чата {chat_db_id} перед показом истории", exc_info=True)
     async with session_factory() as session:
-        messages = await chat_service.get_chat_messages(session, chat_db_id)
-
-    total_messages = len(messages)
-    start_index = page * PAGE_SIZE
-    end_index = start_index + PAGE_SIZE
-    page_messages = messages[start_index:end_index]
+        # Старый чат мог уйти в архив — возвращаем его сообщения в chat_messages
+        await ensure_chat_hot(session, chat_db_id)
+        page_messages, has_prev, has_next = await chat_service.get_chat_history_page(
+            session, chat_db_id, PAGE_SIZE, after_id=after_id, before_id=before_id
+        )
+        if not page_messages and (after_id is not None or before_id is not None):
+            # Сообщения по курсору пропали (например, чат очищен) — показываем начало
+            page = 0
+            page_messages, has_prev, has_next = await chat_service.get_chat_history_page(
+                session, chat_db_id, PAGE_SIZE
+            )
 
     if not page_messages:
-        if page > 0:
-            return await show_chat_history(update, context, chat_db_id, page - 1)
-        else:
-            caption_text = "В этом чате нет сообщений."
-            kb = [[InlineKeyboardButton("🔙 Назад", callback_data=f"open_chat_{chat_db_id}")]]
-            media = InputMediaPhoto(open(CHATS_COVER, "rb"), caption=caption_text)
-            await query.edit_message_media(media=media, reply_markup=InlineKeyboardMarkup(kb))
-            return
+        caption_text = "В этом чате нет сообщений."
+        kb = [[InlineKeyboardButton("🔙 Назад", callback_data=OPEN_CHAT.data(chat_db_id))]]
+        await edit_cover(
+            query,
+            CHATS_COVER,
+            caption=caption_text,
+            reply_markup=InlineKeyboardMarkup(kb)
+        )
+        return
 
+    start_index = page * PAGE_SIZE
     text_lines = [f"История чата {chat_db_id}, страница {page + 1}"]
     for i, msg in enumerate(page_messages, start=start_index + 1):
         role_emoji = "👤" if msg["role"] == "user" else "🤖"
@@ -202,16 +272,21 @@ async def show_chat_history(update: Update, context: ContextTypes.DEFAULT_TYPE,
 
     text_result = truncate_if_too_long("\n".join(text_lines))
 
-    # Кнопки пагинации
+    # Кнопки пагинации: курсор — id первого/последнего сообщения страницы
     buttons = []
-    if page > 0:
-        buttons.append(InlineKeyboardButton("◀️", callback_data=f"history_{chat_db_id}:page_{page-1}"))
-    if end_index < total_messages:
-        buttons.append(InlineKeyboardButton("▶️", callback_data=f"history_{chat_db_id}:page_{page+1}"))
+    if has_prev:
+        buttons.append(InlineKeyboardButton(
+            "◀️",
+            callback_data=HISTORY_BEFORE.data(chat_db_id, page_messages[0]["id"], max(0, page - 1))
+        ))
+    if has_next:
+        buttons.append(InlineKeyboardButton(
+            "▶️",
+            callback_data=HISTORY_AFTER.data(chat_db_id, page_messages[-1]["id"], page + 1)
+        ))
 
     # Кнопка "Назад" к меню чата
-    buttons.append(InlineKeyboardButton("🔙 Назад", callback_data=f"open_chat_{chat_db_id}"))
+    buttons.append(InlineKeyboardButton("🔙 Назад", callback_data=OPEN_CHAT.data(chat_db_id)))
     reply_markup = InlineKeyboardMarkup([buttons])
 
-    media = InputMediaPhoto(open(CHATS_COVER, "rb"), caption=text_result)
-    await query.edit_message_media(media=media, reply_markup=reply_markup)
+    await edit_cover(query, CHATS_COVER, caption=text_result, reply_markup=reply_markup)
@@ -1,7 +1,7 @@
 # app/telegram_bot/handlers/conversation.py
 
 import logging
-from telegram import Update, InputMediaPhoto
+from telegram import Update
 from telegram.ext import (
     ContextTypes,
     ConversationHandler,
@@ -20,12 +20,11 @@ from app.telegram_bot.handlers.menu import menu_command
 # Импортируем сервисы
 from app.services.chat_service import create_chat, rename_chat
 from app.services.user_service import set_active_chat_id, set_user_instructions
+from app.telegram_bot.assets import edit_cover, reply_cover, CHATS_COVER
+from app.telegram_bot.callback_router import callback_router
 
 logger = logging.getLogger(__name__)
 
-# Обложка (одна на все шаги). Можно сделать разные, если нужно.
-CONVERSATION_COVER = "app/telegram_bot/images/Chats.png"
-
 # --------------------------------------------------
 #  (B) СОЗДАНИЕ НОВОГО ЧАТА
 # --------------------------------------------------
@@ -39,9 +38,8 @@ async def new_chat_entry(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Текст запроса
     text = "Введите название нового чата (или /cancel для отмены):"
-    media = InputMediaPhoto(open(CONVERSATION_COVER, "rb"), caption=text)
 
-    await query.edit_message_media(media=media)
+    await edit_cover(query, CHATS_COVER, caption=text)
     return SET_NEW_CHAT_TITLE
 
 
@@ -54,8 +52,7 @@ async def set_new_chat_title(update: Update, context: ContextTypes.DEFAULT_TYPE)
     if user_text.lower() in ["/cancel", "отмена", "назад"]:
         # Отправим фото, что действие отменено
         cancel_text = "Создание чата отменено."
-        with open(CONVERSATION_COVER, "rb") as photo:
-            await update.message.reply_photo(photo=photo, caption=cancel_text)
+        await reply_cover(update.message, CHATS_COVER, caption=cancel_text)
         await menu_command(update, context)
         return ConversationHandler.END
 
@@ -63,8 +60,7 @@ async def set_new_chat_title(update: Update, context: ContextTypes.DEFAULT_TYPE)
     session_factory = context.application.bot_data.get("session_factory")
     if not session_factory:
         logger.error("No session_factory found in bot_data. Can't create chat.")
-        with open(CONVERSATION_COVER, "rb") as photo:
-            await update.message.reply_photo(photo=photo, caption="Ошибка: нет подключения к БД.")
+        await reply_cover(update.message, CHATS_COVER, caption="Ошибка: нет подключения к БД.")
         return ConversationHandler.END
 
     # Создаём чат
@@ -75,8 +71,7 @@ async def set_new_chat_title(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
     # Уведомляем, что чат создан
     confirm_text = f"Чат создан и выбран в качестве активного! (ID: {new_chat_obj.id})"
-    with open(CONVERSATION_COVER, "rb") as photo:
-        await update.message.reply_photo(photo=photo, caption=confirm_text)
+    await reply_cover(update.message, CHATS_COVER, caption=confirm_text)
 
     # Возвращаемся в меню
     await menu_command(update, context)
@@ -93,13 +88,11 @@ async def rename_chat_entry(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
 
-    data = query.data
-    chat_db_id = int(data.split("_")[-1])
+    _, (chat_db_id,) = callback_router.decode(query.data)
     context.user_data["rename_chat_id"] = chat_db_id
 
     text = "Введите новое название чата (или /cancel для отмены):"
-    media = InputMediaPhoto(open(CONVERSATION_COVER, "rb"), caption=text)
-    await query.edit_message_media(media=media)
+    await edit_cover(query, CHATS_COVER, caption=text)
 
     return SET_RENAME_CHAT
 
@@ -111,32 +104,32 @@ async def rename_chat_finish(update: Update, context: ContextTypes.DEFAULT_TYPE)
     user_text = update.message.text.strip()
     if user_text.lower() in ["/cancel", "отмена", "назад"]:
         cancel_text = "Переименование отменено."
-        with open(CONVERSATION_COVER, "rb") as photo:
-            await update.message.reply_photo(photo=photo, caption=cancel_text)
+        await reply_cover(update.message, CHATS_COVER, caption=cancel_text)
         await menu_command(update, context)
         return ConversationHandler.END
 
     chat_db_id = context.user_data.get("rename_chat_id")
     if not chat_db_id:
         # Не знаем, что переименовывать
-        with open(CONVERSATION_COVER, "rb") as photo:
-            await update.message.reply_photo(photo=photo, caption="Не удалось найти чат для переименования.")
+        await reply_cover(
+            update.message,
+            CHATS_COVER,
+            caption="Не удалось найти чат для переименования."
+        )
         await menu_command(update, context)
         return ConversationHandler.END
 
     session_factory = context.application.bot_data.get("session_factory")
     if not session_factory:
         logger.error("No session_factory found. Can't rename chat.")
-        with open(CONVERSATION_COVER, "rb") as photo:
-            await update.message.reply_photo(photo=photo, caption="Ошибка: нет подключения к БД.")
+        await reply_cover(update.message, CHATS_COVER, caption="Ошибка: нет подключения к БД.")
         return ConversationHandler.END
 
     async with session_factory() as session:
         await rename_chat(session, chat_db_id, user_text)
 
     result_text = f"Чат {chat_db_id} переименован!"
-    with open(CONVERSATION_COVER, "rb") as photo:
-        await update.message.reply_photo(photo=photo, caption=result_text)
+    await reply_cover(update.message, CHATS_COVER, caption=result_text)
 
     await menu_command(update, context)
     return ConversationHandler.END
@@ -155,8 +148,7 @@ async def instructions_add_entry(update: Update, context: ContextTypes.DEFAULT_T
     await query.answer()
 
     text = "Введите текст инструкций (или /cancel для отмены):"
-    media = InputMediaPhoto(open(CONVERSATION_COVER, "rb"), caption=text)
-    await query.edit_message_media(media=media)
+    await edit_cover(query, CHATS_COVER, caption=text)
 
     context.user_data["instructions_mode"] = "add"
     return INSTRUCTIONS_INPUT
@@ -170,8 +162,7 @@ async def instructions_edit_entry(update: Update, context: ContextTypes.DEFAULT_
     await query.answer()
 
     text = "Введите новые инструкции (или /cancel для отмены):"
-    media = InputMediaPhoto(open(CONVERSATION_COVER, "rb"), caption=text)
-    await query.edit_message_media(media=media)
+    await edit_cover(query, CHATS_COVER, caption=text)
 
     context.user_data["instructions_mode"] = "edit"
     return INSTRUCTIONS_INPUT
@@ -183,8 +174,7 @@ async def instructions_input_finish(update: Update, context: ContextTypes.DEFAUL
     """
     user_text = update.message.text.strip()
     if user_text.lower() in ["/cancel", "отмена", "назад"]:
-        with open(CONVERSATION_COVER, "rb") as photo:
-            await update.message.reply_photo(photo=photo, caption="Операция с инструкциями отменена.")
+        await reply_cover(update.message, CHATS_COVER, caption="Операция с инструкциями отменена.")
         await menu_command(update, context)
         return ConversationHandler.END
 
@@ -192,16 +182,14 @@ async def instructions_input_finish(update: Update, context: ContextTypes.DEFAUL
     session_factory = context.application.bot_data.get("session_factory")
     if not session_factory:
         logger.error("No session_factory found. Can't set instructions.")
-        with open(CONVERSATION_COVER, "rb") as photo:
-            await update.message.reply_photo(photo=photo, caption="Ошибка: нет подключения к БД.")
+        await reply_cover(update.message, CHATS_COVER, caption="Ошибка: нет подключения к БД.")
         return ConversationHandler.END
 
     async with session_factory() as session:
         await set_user_instructions(session, chat_id, user_text)
 
     # Инструкции сохранены
-    with open(CONVERSATION_COVER, "rb") as photo:
-        await update.message.reply_photo(photo=photo, caption="Инструкции успешно сохранены!")
+    await reply_cover(update.message, CHATS_COVER, caption="Инструкции успешно сохранены!")
 
     await menu_command(update, context)
     return ConversationHandler.END
@@ -4,13 +4,16 @@ import logging
 from telegram import (
     Update,
     InlineKeyboardButton,
-    InlineKeyboardMarkup,
-    InputMediaPhoto
+    InlineKeyboardMarkup
 )
 from telegram.ext import ContextTypes
 
 from app.services.user_service import get_active_chat_id, get_user_model
-from app.services.chat_service import get_user_chats, get_chat_title
+from app.services.chat_service import count_user_chats, get_chat_title
+from app.telegram_bot.assets import edit_cover, reply_cover, START_COVER, HELP_COVER, MENU_COVER
+from app.telegram_bot.callback_router import (
+    HELP, CABINET, ALL_CHATS, FAVORITE_CHATS, CHANGE_MODEL, CURRENT_CHAT_HISTORY, INSTRUCTIONS
+)
 
 logger = logging.getLogger(__name__)
 
@@ -18,7 +21,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     /start - Приветственное сообщение с обложкой Start_cover.png
     """
-    cover_path = "app/telegram_bot/images/Start_cover.png"
+    cover = START_COVER
     text = (
         "Привет! Я бот, использующий Proxy API для ChatGPT.\n"
         "Нажмите /menu, чтобы увидеть настройки и инструкции.\n"
@@ -27,24 +30,19 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Если это новое сообщение (пользователь набрал /start)
     if update.message:
-        with open(cover_path, "rb") as photo:
-            await update.message.reply_photo(
-                photo=photo,
-                caption=text
-            )
+        await reply_cover(update.message, cover, caption=text)
     else:
         # Если это callback_query (редко для /start)
         query = update.callback_query
         await query.answer()
-        media = InputMediaPhoto(open(cover_path, "rb"), caption=text)
-        await query.edit_message_media(media=media)
+        await edit_cover(query, cover, caption=text)
 
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     /help - Высылаем Help.png и текст справки.
     """
-    cover_path = "app/telegram_bot/images/Help.png"
+    cover = HELP_COVER
     text = (
         "❓ Помощь по боту:\n"
         "1. Отправьте любое текстовое сообщение – бот ответит.\n"
@@ -55,13 +53,11 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
     if update.message:
-        with open(cover_path, "rb") as photo:
-            await update.message.reply_photo(photo=photo, caption=text)
+        await reply_cover(update.message, cover, caption=text)
     else:
         query = update.callback_query
         await query.answer()
-        media = InputMediaPhoto(open(cover_path, "rb"), caption=text)
-        await query.edit_message_media(media=media)
+        await edit_cover(query, cover, caption=text)
 
 
 async def menu_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -69,7 +65,7 @@ async def menu_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     /menu – Главное меню (Menu.png + текст + инлайн-кнопки).
     При колбэке редактируем то же сообщение через edit_message_media.
     """
-    cover_path = "app/telegram_bot/images/Menu.png"
+    cover = MENU_COVER
 
     # Определяем chat_id
     if update.message:
@@ -85,8 +81,8 @@ async def menu_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "Выберите опцию:"
         )
         keyboard = [
-            [InlineKeyboardButton("❓ Помощь", callback_data="help")],
-            [InlineKeyboardButton("🏦 Личный кабинет", callback_data="show_cabinet")],
+            [InlineKeyboardButton("❓ Помощь", callback_data=HELP.data())],
+            [InlineKeyboardButton("🏦 Личный кабинет", callback_data=CABINET.data())],
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
     else:
@@ -94,8 +90,7 @@ async def menu_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         async with session_factory() as session:
             active_id = await get_active_chat_id(session, chat_id)
             model_name = await get_user_model(session, chat_id) or "—"
-            user_chats = await get_user_chats(session, chat_id)
-            total_chats = len(user_chats)
+            total_chats = await count_user_chats(session, chat_id)
 
             if active_id:
                 active_title = await get_chat_title(session, active_id) or f"(ID {active_id})"
@@ -110,19 +105,19 @@ async def menu_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         keyboard = [
             [
-                InlineKeyboardButton("📑 Все чаты", callback_data="all_chats"),
-                InlineKeyboardButton("⭐ Избранное", callback_data="favorite_chats"),
+                InlineKeyboardButton("📑 Все чаты", callback_data=ALL_CHATS.data(0)),
+                InlineKeyboardButton("⭐ Избранное", callback_data=FAVORITE_CHATS.data(0)),
             ],
             [
-                InlineKeyboardButton("🤖 Сменить модель", callback_data="change_model"),
-                InlineKeyboardButton("💬 История чата", callback_data="history_current_chat"),
+                InlineKeyboardButton("🤖 Сменить модель", callback_data=CHANGE_MODEL.data()),
+                InlineKeyboardButton("💬 История чата", callback_data=CURRENT_CHAT_HISTORY.data()),
             ],
             [
-                InlineKeyboardButton("📝 Инструкции", callback_data="update_instructions"),
-                InlineKeyboardButton("🏦 Личный кабинет", callback_data="show_cabinet"),
+                InlineKeyboardButton("📝 Инструкции", callback_data=INSTRUCTIONS.data()),
+                InlineKeyboardButton("🏦 Личный кабинет", callback_data=CABINET.data()),
             ],
             [
-                InlineKeyboardButton("❓ Помощь", callback_data="help")
+                InlineKeyboardButton("❓ Помощь", callback_data=HELP.data())
             ]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
@@ -132,18 +127,9 @@ async def menu_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     if update.message:
         # Новое сообщение (/menu)
-        with open(cover_path, "rb") as photo:
-            await update.message.reply_photo(
-                photo=photo,
-                caption=caption_text,
-                reply_markup=reply_markup
-            )
+        await reply_cover(update.message, cover, caption=caption_text, reply_markup=reply_markup)
     else:
         # Колбэк: редактируем фото + подпись
         query = update.callback_query
         await query.answer()
-        media = InputMediaPhoto(open(cover_path, "rb"), caption=caption_text)
-        await query.edit_message_media(
-            media=media,
-            reply_markup=reply_markup
-        )
+        await edit_cover(query, cover, caption=caption_text, reply_markup=reply_markup)
@@ -1,40 +1,39 @@
 # app/telegram_bot/handlers/message_handler.py
 
 import logging
+import time
 import httpx
-from telegram import Update, InputMediaPhoto
+from telegram import Update, Message
 from telegram.ext import ContextTypes
-from telegram.error import BadRequest
+from telegram.error import BadRequest, RetryAfter
 
-from app.services.subscription_service import (
-    can_use_free_request,
-    increment_free_requests,
-    has_active_subscription
-)
-from app.services.user_service import (
-    get_or_create_user,
-    get_active_chat_id,
-    set_active_chat_id,
-    get_user_model,
-    set_user_model,
-)
-from app.services.chat_service import (
-    create_chat,
-    add_message,
-    get_chat_messages,
-)
-from app.telegram_bot.proxyapi_client import create_chat_completion
+from app.services.chat_service import message_buffer
+from app.services.message_pipeline import prepare_turn
+from app.services.summary_service import schedule_summarization
+from app.telegram_bot.proxyapi_client import ServiceBusyError
+from app.telegram_bot.model_router import routed_chat_completion, routed_stream_chat_completion
+from app.telegram_bot.resilience import proxy_resilience
 from app.config import (
     TIMEOUT,
-    DEFAULT_INSTRUCTIONS,
-    PROXY_API_KEY
+    PROXY_API_KEY,
+    STREAM_RESPONSES,
+    STREAM_EDIT_INTERVAL,
+    STREAM_PLACEHOLDER,
+    MAX_TELEGRAM_TEXT,
+    MAX_CAPTION_TEXT,
+    LONG_ANSWER_CAPTION
 )
-from app.telegram_bot.utils import convert_to_telegram_markdown_v2
+from app.telegram_bot.utils import convert_to_telegram_markdown_v2, truncate_if_too_long
+from app.telegram_bot.markdown_v2 import MarkdownV2Stream
+from app.telegram_bot.assets import reply_cover, CABINET_COVER
+from app.telegram_bot.send_scheduler import STREAM_EDIT_LIMITS
 
 logger = logging.getLogger(__name__)
 
-# Обложка для ответов бота (можно заменить на свой путь/имя файла)
-MESSAGE_COVER_PATH = "app/telegram_bot/images/Cabinet.png"
+# Лимит токенов ответа (он же резервируется в контекстном окне)
+COMPLETION_MAX_TOKENS = 500
+
+SERVICE_BUSY_TEXT = "Сервис сейчас перегружен, пожалуйста, повторите запрос через минуту."
 
 async def handle_user_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
@@ -42,12 +41,35 @@ async def handle_user_message(update: Update, context: ContextTypes.DEFAULT_TYPE
     """
     user_text = update.message.text.strip()
 
+    coalescer = context.application.bot_data.get("message_coalescer")
+
     # Пример вызова "меню":
     if user_text.lower() == "меню":
         from app.telegram_bot.handlers.menu import menu_command
+        if coalescer:
+            # Сначала — сообщения, отправленные до "меню"
+            await coalescer.run_pending(update.effective_chat.id)
         await menu_command(update, context)
         return
 
+    # Сообщения, пришедшие подряд, склеиваются в один запрос (см. coalescer.py)
+    if coalescer:
+        coalescer.submit(update.effective_chat.id, update, context, user_text)
+        return
+
+    await process_user_message(update, context, user_text)
+
+
+async def process_user_message(update: Update, context: ContextTypes.DEFAULT_TYPE, user_text: str):
+    """
+    Обрабатывает текст пользователя (одно сообщение или склеенную пачку):
+    проверка лимитов, история, запрос к LLM, ответ.
+    """
+    # Proxy API заведомо недоступен — отвечаем сразу, ничего не списывая
+    if proxy_resilience.breaker.is_open():
+        await update.message.reply_text(SERVICE_BUSY_TEXT)
+        return
+
     chat_id = update.effective_chat.id
     session_factory = context.application.bot_data.get("session_factory")
     if not session_factory:
@@ -55,71 +77,48 @@ async def handle_user_message(update: Update, context: ContextTypes.DEFAULT_TYPE
         await update.message.reply_text("Ошибка: нет подключения к БД.")
         return
 
+    # Предыдущий ответ мог ещё лежать в буфере записи — история должна быть полной.
+    # При сбое пачка остаётся в очереди — отвечаем и без неё
+    try:
+        await message_buffer.flush(owner=chat_id)
+    except Exception:
+        logger.warning(f"Не удалось дописать буфер сообщений перед ответом чату {chat_id}", exc_info=True)
+
+    # 1-5. Списание/лимиты, активный чат, контекст и сообщение пользователя —
+    # одной транзакцией (см. message_pipeline.py)
     async with session_factory() as session:
-        # 1. Получаем/создаём User
-        user = await get_or_create_user(session, chat_id)
-        balance = user.balance_tokens or 0
-
-        # 2. Проверка баланса / подписки / бесплатных лимитов
-        if balance <= 0:
-            # Нет токенов, проверим подписку
-            if await has_active_subscription(user):
-                # У пользователя активная подписка - можно отвечать
-                pass
-            else:
-                # Проверяем бесплатный лимит
-                if not await can_use_free_request(session, user):
-                    await update.message.reply_text(
-                        "Ваш бесплатный лимит исчерпан. Пополните баланс через /cabinet."
-                    )
-                    return
-                else:
-                    await increment_free_requests(session, user)
-        else:
-            # У пользователя > 0 токенов, списываем 1 токен (пример)
-            cost = 1
-            user.balance_tokens = max(0, balance - cost)
-            await session.commit()
-
-        # 3. Узнаём / устанавливаем модель
-        selected_model = user.selected_model or "gpt-3.5-turbo"
-
-        # 4. Активный чат
-        active_chat_db_id = user.active_chat_id
-        if not active_chat_db_id:
-            # Создаём новый
-            new_chat_obj = await create_chat(session, user_id=chat_id, title="Новый чат")
-            user.active_chat_id = new_chat_obj.id
-            await session.commit()
-            active_chat_db_id = new_chat_obj.id
-
-        # 5. Получаем историю чата + инструкции
-        chat_messages_db = await get_chat_messages(session, active_chat_db_id)
-        user_instructions = user.instructions or DEFAULT_INSTRUCTIONS
-
-        # Формируем список для API
-        messages_for_api = []
-        if user_instructions.strip():
-            messages_for_api.append({"role": "system", "content": user_instructions})
-        for msg in chat_messages_db:
-            messages_for_api.append({"role": msg["role"], "content": msg["content"]})
-        messages_for_api.append({"role": "user", "content": user_text})
-
-        # Сохраняем сообщение пользователя
-        await add_message(session, active_chat_db_id, "user", user_text)
-
-    # 6. Запрос к Proxy API (create_chat_completion)
+        turn = await prepare_turn(session, chat_id, user_text, COMPLETION_MAX_TOKENS)
+    if turn is None:
+        await update.message.reply_text(
+            "Ваш бесплатный лимит исчерпан. Пополните баланс через /cabinet."
+        )
+        return
+    selected_model = turn.model
+    messages_for_api = turn.messages
+    active_chat_db_id = turn.chat_db_id
+
+    # 6. Потоковый режим: placeholder + постепенные правки подписи
+    if STREAM_RESPONSES:
+        answer = await _stream_answer(update, selected_model, messages_for_api)
+        await message_buffer.add(session_factory, active_chat_db_id, "assistant", answer, owner=chat_id)
+        schedule_summarization(session_factory, active_chat_db_id)
+        return
+
+    # 6. Запрос к Proxy API (с переключением на запасную модель, см. model_router.py)
     try:
-        response_data = create_chat_completion(
+        response_data = await routed_chat_completion(
             model=selected_model,
             messages=messages_for_api,
             temperature=0.2,
-            max_tokens=500,
+            max_tokens=COMPLETION_MAX_TOKENS,
             top_p=1.0,
             frequency_penalty=0,
             presence_penalty=0,
         )
         answer = response_data["choices"][0]["message"]["content"]
+    except ServiceBusyError as e:
+        logger.warning(f"Proxy API занят: {e}")
+        answer = SERVICE_BUSY_TEXT
     except httpx.ReadTimeout:
         logger.error("Время ожидания ответа от Proxy API истекло.", exc_info=True)
         answer = "Время ожидания ответа истекло, пожалуйста, повторите запрос позже."
@@ -128,25 +127,157 @@ async def handle_user_message(update: Update, context: ContextTypes.DEFAULT_TYPE
         answer = "Произошла ошибка при обработке запроса."
 
     # 7. Сохраняем ответ ассистента
-    async with session_factory() as session:
-        await add_message(session, active_chat_db_id, "assistant", answer)
+    # (при включённом буфере — отложенно, пачкой с ответами других чатов)
+    await message_buffer.add(session_factory, active_chat_db_id, "assistant", answer, owner=chat_id)
+    # Длинные чаты сворачиваются в фоне, ответ пользователю не ждёт
+    schedule_summarization(session_factory, active_chat_db_id)
 
-    # 8. Отправляем ответ пользователю (картинка + подпись)
+    # 8. Отправляем ответ пользователю: короткий — подписью к обложке,
+    # длинный (подпись ограничена MAX_CAPTION_TEXT) — текстовым сообщением
     formatted_answer = convert_to_telegram_markdown_v2(answer)
+    if len(formatted_answer) > MAX_CAPTION_TEXT:
+        await _reply_long_answer(update.message, answer, formatted_answer)
+        return
 
     # Пытаемся отправить в MarkdownV2
     try:
-        with open(MESSAGE_COVER_PATH, "rb") as photo:
-            await update.message.reply_photo(
-                photo=photo,
-                caption=formatted_answer,
-                parse_mode="MarkdownV2"
-            )
+        await reply_cover(
+            update.message,
+            CABINET_COVER,
+            caption=formatted_answer,
+            parse_mode="MarkdownV2"
+        )
     except BadRequest:
         # Если ошибка при парсинге, отправим без форматирования
         logger.error("Ошибка при отправке MarkdownV2, отправляем без форматирования", exc_info=True)
-        with open(MESSAGE_COVER_PATH, "rb") as photo:
-            await update.message.reply_photo(
-                photo=photo,
-                caption=answer
+        await reply_cover(update.message, CABINET_COVER, caption=truncate_if_too_long(answer, MAX_CAPTION_TEXT))
+
+
+async def _reply_long_answer(message: Message, answer: str, formatted_answer: str) -> None:
+    """
+    Ответ, не влезающий в подпись к фото, — отдельным текстовым сообщением
+    (MarkdownV2, если Telegram его примет, иначе простым текстом).
+    """
+    if len(formatted_answer) <= MAX_TELEGRAM_TEXT:
+        try:
+            await message.reply_text(formatted_answer, parse_mode="MarkdownV2")
+            return
+        except BadRequest:
+            logger.error("Ошибка при отправке MarkdownV2, отправляем без форматирования", exc_info=True)
+    await message.reply_text(truncate_if_too_long(answer))
+
+
+async def _edit_caption_quietly(
+    message: Message, caption: str, bulk: bool = False, parse_mode: str | None = None
+) -> bool:
+    """
+    Промежуточная правка подписи. "Message is not modified" и прочие
+    BadRequest не критичны — следующая правка (или финальная) всё исправит.
+    bulk=True — низкий приоритет в планировщике отправки и без повторов после RetryAfter.
+    Возвращает False, если Telegram правку отклонил.
+    """
+    bot = message.get_bot()
+    try:
+        if bulk and getattr(bot, "rate_limiter", None) is not None:
+            await bot.edit_message_caption(
+                chat_id=message.chat_id,
+                message_id=message.message_id,
+                caption=caption,
+                parse_mode=parse_mode,
+                rate_limit_args=STREAM_EDIT_LIMITS,
             )
+        else:
+            await message.edit_caption(caption=caption, parse_mode=parse_mode)
+    except BadRequest as e:
+        logger.debug(f"Промежуточная правка пропущена: {e}")
+        return False
+    return True
+
+
+async def _stream_answer(update: Update, selected_model: str, messages_for_api: list) -> str:
+    """
+    Отправляет placeholder (обложка + "Генерирую ответ...") и по мере
+    прихода токенов редактирует подпись, не чаще STREAM_EDIT_INTERVAL секунд.
+    Токены сразу идут в MarkdownV2Stream: промежуточные правки — его snapshot()
+    (открытый блок кода в нём уже закрыт), финальная — finish() без повторного
+    прохода по всему ответу. Если Telegram не принял промежуточную разметку
+    (например, непарная * от модели) или она длиннее лимита — дальше простым текстом.
+    Подпись к фото ограничена MAX_CAPTION_TEXT: ответ длиннее уходит в конце
+    отдельным текстовым сообщением, а на обложке остаётся пометка.
+    Возвращает полный текст ответа (для сохранения в БД).
+    """
+    placeholder = await reply_cover(update.message, CABINET_COVER, caption=STREAM_PLACEHOLDER)
+
+    answer = ""
+    renderer = MarkdownV2Stream()
+    streamed = False
+    markdown_edits = True
+    last_caption = STREAM_PLACEHOLDER
+    next_edit_at = time.monotonic() + STREAM_EDIT_INTERVAL
+    try:
+        async for delta in routed_stream_chat_completion(
+            model=selected_model,
+            messages=messages_for_api,
+            temperature=0.2,
+            max_tokens=COMPLETION_MAX_TOKENS,
+            top_p=1.0,
+            frequency_penalty=0,
+            presence_penalty=0,
+        ):
+            if not delta:
+                continue
+            answer += delta
+            renderer.feed(delta)
+            streamed = True
+            now = time.monotonic()
+            if now < next_edit_at or not answer.strip():
+                continue
+            parse_mode = None
+            caption = truncate_if_too_long(answer, MAX_CAPTION_TEXT)
+            if markdown_edits:
+                rendered = renderer.snapshot()
+                if len(rendered) <= MAX_CAPTION_TEXT:
+                    caption, parse_mode = rendered, "MarkdownV2"
+            if caption == last_caption:
+                continue
+            try:
+                edited = await _edit_caption_quietly(placeholder, caption, bulk=True, parse_mode=parse_mode)
+                if not edited and parse_mode:
+                    markdown_edits = False
+                last_caption = caption
+                next_edit_at = now + STREAM_EDIT_INTERVAL
+            except RetryAfter as e:
+                # Упёрлись во flood-limit: просто откладываем следующую правку
+                next_edit_at = now + float(e.retry_after)
+    except ServiceBusyError as e:
+        logger.warning(f"Proxy API занят: {e}")
+        if not answer:
+            answer = SERVICE_BUSY_TEXT
+    except httpx.ReadTimeout:
+        logger.error("Время ожидания ответа от Proxy API истекло.", exc_info=True)
+        if not answer:
+            answer = "Время ожидания ответа истекло, пожалуйста, повторите запрос позже."
+    except Exception as e:
+        logger.error(f"Ошибка при потоковом вызове Proxy API: {e}", exc_info=True)
+        if not answer:
+            answer = "Произошла ошибка при обработке запроса."
+
+    # Финальный рендер в MarkdownV2: текст-заглушка об ошибке в renderer ещё не попадал
+    if not streamed:
+        renderer.feed(answer)
+    formatted_answer = renderer.finish()
+    if len(formatted_answer) > MAX_CAPTION_TEXT:
+        # В подпись к фото не влезает: на обложке — пометка, ответ — сообщением ниже
+        await _edit_caption_quietly(placeholder, LONG_ANSWER_CAPTION)
+        await _reply_long_answer(update.message, answer, formatted_answer)
+        return answer
+    try:
+        await placeholder.edit_caption(
+            caption=formatted_answer,
+            parse_mode="MarkdownV2"
+        )
+    except BadRequest:
+        logger.error("Ошибка при отправке MarkdownV2, отправляем без форматирования", exc_info=True)
+        await _edit_caption_quietly(placeholder, truncate_if_too_long(answer, MAX_CAPTION_TEXT))
+
+    return answer
@@ -0,0 +1,113 @@
+# app/telegram_bot/markdown_benchmark.py
+"""
+Бенчмарк рендера MarkdownV2: прежняя реализация на re.split/re.sub
+против однопроходного MarkdownV2Stream на ответах 4–100 КБ.
+
+    python -m app.telegram_bot.markdown_benchmark
+    python -m app.telegram_bot.markdown_benchmark --repeats 50 --chunk 40
+"""
+
+import argparse
+import random
+import re
+import time
+
+from app.telegram_bot.markdown_v2 import MarkdownV2Stream, render_markdown_v2
+
+DEFAULT_SIZES = (4 * 1024, 16 * 1024, 64 * 1024, 100 * 1024)
+
+
+def legacy_partial_escape(text: str) -> str:
+    """Прежний partial_escape_markdown_v2 (для сравнения)."""
+    special_chars = "\\[\\]\\(\\)~`>#\\+\\-=\\|{}\\.!"
+    pattern = f"([{re.escape(special_chars)}])"
+    return re.sub(pattern, r'\\\1', text)
+
+
+def legacy_convert(text: str) -> str:
+    """Прежний convert_to_telegram_markdown_v2 (для сравнения)."""
+    pattern = r"(```[\s\S]+?```|`[^`]+`)"
+    segments = re.split(pattern, text)
+    for i, segment in enumerate(segments):
+        if not (segment.startswith("```") or (segment.startswith("`") and segment.endswith("`"))):
+            segments[i] = legacy_partial_escape(segment)
+    return "".join(segments)
+
+
+_WORDS = (
+    "функция", "возвращает", "значение", "список", "например", "ответ", "запрос",
+    "модель", "токен", "данные", "result", "value", "config", "1.5", "(см. выше)",
+    "a+b=c", "#1", "[ссылка]", "{ключ}", "!", "x|y", "~", "->",
+)
+
+
+def sample_answer(size: int, seed: int = 0) -> str:
+    """Ответ «как от модели»: абзацы, списки, `inline code` и блоки ```кода```."""
+    rng = random.Random(seed)
+    parts: list[str] = []
+    length = 0
+    while length < size:
+        kind = rng.random()
+        if kind < 0.15:
+            body = "\n".join(
+                f"    x_{i} = compute(`{i}`) + {i}.0  # шаг {i}" for i in range(rng.randint(3, 12))
+            )
+            block = f"```python\n{body}\n```\n"
+        elif kind < 0.35:
+            block = "".join(f"- **{rng.choice(_WORDS)}**: `{rng.choice(_WORDS)}`\n" for _ in range(4))
+        else:
+            block = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(20, 60))) + ".\n\n"
+        parts.append(block)
+        length += len(block)
+    return "".join(parts)[:size]
+
+
+def _best_of(repeats: int, fn, *args) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def _streamed(text: str, chunk: int) -> str:
+    stream = MarkdownV2Stream()
+    for i in range(0, len(text), chunk):
+        stream.feed(text[i:i + chunk])
+    return stream.finish()
+
+
+def benchmark(sizes=DEFAULT_SIZES, repeats: int = 20, chunk: int = 40) -> list[dict]:
+    """
+    Лучшее из repeats время рендера одного ответа каждого размера:
+    legacy — прежний вариант, single_pass — render_markdown_v2,
+    streamed — тот же ответ кусками по chunk символов (как из стриминга).
+    """
+    results = []
+    for size in sizes:
+        text = sample_answer(size, seed=size)
+        legacy = _best_of(repeats, legacy_convert, text)
+        single = _best_of(repeats, render_markdown_v2, text)
+        streamed = _best_of(repeats, _streamed, text, chunk)
+        results.append({
+            "size": size,
+            "legacy_ms": round(legacy * 1000, 3),
+            "single_pass_ms": round(single * 1000, 3),
+            "streamed_ms": round(streamed * 1000, 3),
+            "speedup": round(legacy / single, 2) if single else 0.0,
+        })
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Бенчмарк рендера MarkdownV2")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--chunk", type=int, default=40, help="размер куска для streamed")
+    args = parser.parse_args()
+    for row in benchmark(repeats=args.repeats, chunk=args.chunk):
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+# app/telegram_bot/markdown_v2.py
+"""
+Однопроходный рендер ответа модели в Telegram MarkdownV2.
+
+Текст режется на три вида участков:
+- обычный текст — спецсимволы экранируются (кроме * и _, ими модель размечает жирный/курсив);
+- `inline code` — до следующего бэктика в пределах строки;
+- ```pre``` — до первых ``` после хотя бы одного символа содержимого.
+Внутри code/pre экранируются только \\ и ` (как требует Bot API).
+
+MarkdownV2Stream принимает ответ кусками (feed) по мере стриминга:
+на стыке кусков держит только то, что ещё нельзя решить (хвост из бэктиков,
+незакрытый inline code), а snapshot() в любой момент отдаёт валидный
+MarkdownV2 с закрытым незавершённым блоком кода.
+"""
+
+import re
+
+# Спецсимволы вне кода; * и _ оставляем — это разметка самой модели
+TEXT_SPECIAL_CHARS = "\\[]()~`>#+-=|{}.!"
+_BACKTICKS = re.compile(r"`+")
+_INLINE_END = re.compile(r"[`\n]")
+
+_TEXT, _INLINE, _PRE = 0, 1, 2
+_FENCE = "```"
+_ESCAPED_FENCE = "\\`\\`\\`"
+
+
+# Цепочка str.replace (\\ первым) в разы быстрее str.translate и re.sub
+# на кириллице: спецсимволов в ответе мало, а каждый replace — проход на C
+_TEXT_PAIRS = tuple((c, "\\" + c) for c in TEXT_SPECIAL_CHARS)
+_CODE_PAIRS = (("\\", "\\\\"), ("`", "\\`"))
+
+
+def escape_text(text: str) -> str:
+    """Экранирует спецсимволы MarkdownV2 вне кода (кроме * и _)."""
+    for char, escaped in _TEXT_PAIRS:
+        if char in text:
+            text = text.replace(char, escaped)
+    return text
+
+
+def escape_code(text: str) -> str:
+    """Экранирование внутри `code` и ```pre```: только \\ и `."""
+    for char, escaped in _CODE_PAIRS:
+        if char in text:
+            text = text.replace(char, escaped)
+    return text
+
+
+class MarkdownV2Stream:
+    """
+    Инкрементальный рендер: feed(chunk) по мере прихода текста,
+    snapshot() — промежуточный результат, finish() — итоговый.
+    Результат не зависит от того, как текст был разбит на куски.
+    """
+
+    __slots__ = ("_out", "_pending", "_state", "_inline", "_pre_empty")
+
+    def __init__(self):
+        self._out: list[str] = []
+        self._pending = ""       # ещё не разобранный хвост
+        self._state = _TEXT
+        self._inline: list[str] = []  # содержимое незакрытого `inline code`
+        self._pre_empty = False  # ``` открыт, но содержимого ещё нет
+
+    def feed(self, chunk: str) -> None:
+        if chunk:
+            self._pending += chunk
+            self._drain(final=False)
+
+    def snapshot(self) -> str:
+        """Отрендеренный на данный момент текст; открытый блок кода закрыт."""
+        tail = MarkdownV2Stream()
+        tail._pending = self._pending
+        tail._state = self._state
+        tail._inline = list(self._inline)
+        tail._pre_empty = self._pre_empty
+        return self._joined() + tail.finish()
+
+    def finish(self) -> str:
+        self._drain(final=True)
+        if self._state == _PRE:
+            # Незакрытый блок кода закрываем; пустой ``` в конце — просто текст
+            self._out.append(_ESCAPED_FENCE if self._pre_empty else _FENCE)
+        elif self._state == _INLINE:
+            # Бэктик без пары — обычный символ
+            self._out.append("\\`" + escape_text("".join(self._inline)))
+        self._state = _TEXT
+        self._pre_empty = False
+        self._inline.clear()
+        return self._joined()
+
+    def _joined(self) -> str:
+        if len(self._out) > 1:
+            self._out[:] = ["".join(self._out)]
+        return self._out[0] if self._out else ""
+
+    def _drain(self, final: bool) -> None:
+        buf = self._pending
+        n = len(buf)
+        pos = 0
+        out = self._out.append
+        while pos < n:
+            if self._state == _TEXT:
+                tick = buf.find("`", pos)
+                if tick < 0:
+                    out(escape_text(buf[pos:]))
+                    pos = n
+                    break
+                if tick > pos:
+                    out(escape_text(buf[pos:tick]))
+                run_end = _BACKTICKS.match(buf, tick).end()
+                if run_end == n and not final:
+                    # Серия бэктиков может продолжиться в следующем куске
+                    pos = tick
+                    break
+                if run_end - tick >= 3:
+                    # Лишние бэктики серии станут содержимым блока
+                    self._state = _PRE
+                    self._pre_empty = True
+                    pos = tick + 3
+                else:
+                    if run_end - tick == 2:
+                        out("\\`")
+                    self._state = _INLINE
+                    pos = run_end
+            elif self._state == _INLINE:
+                m = _INLINE_END.search(buf, pos)
+                if m is None:
+                    self._inline.append(buf[pos:])
+                    pos = n
+                    break
+                self._inline.append(buf[pos:m.start()])
+                content = "".join(self._inline)
+                self._inline.clear()
+                self._state = _TEXT
+                if m.group() == "`":
+                    out("`" + escape_code(content) + "`")
+                    pos = m.end()
+                else:
+                    # Перевод строки раньше закрывающего бэктика — это не код
+                    out("\\`" + escape_text(content))
+                    pos = m.start()
+            else:  # _PRE
+                if self._pre_empty:
+                    # Первый символ содержимого — любой, даже бэктик
+                    out(_FENCE + escape_code(buf[pos]))
+                    self._pre_empty = False
+                    pos += 1
+                    continue
+                close = buf.find(_FENCE, pos)
+                if close < 0:
+                    end = n
+                    if not final:
+                        # До двух бэктиков в конце могут оказаться началом ```
+                        while end > pos and n - end < 2 and buf[end - 1] == "`":
+                            end -= 1
+                    out(escape_code(buf[pos:end]))
+                    pos = end
+                    break
+                out(escape_code(buf[pos:close]) + _FENCE)
+                self._state = _TEXT
+                pos = close + 3
+        self._pending = buf[pos:]
+
+
+def render_markdown_v2(text: str) -> str:
+    """Весь текст за один проход."""
+    stream = MarkdownV2Stream()
+    stream.feed(text)
+    return stream.finish()
@@ -0,0 +1,143 @@
+# app/telegram_bot/model_catalog.py
+
+import asyncio
+import logging
+import time
+
+from app.config import (
+    CONTEXT_DEFAULT_WINDOW,
+    MODEL_CATALOG_TTL,
+    MODEL_PICKER_MODELS,
+)
+from app.telegram_bot import proxyapi_client
+
+logger = logging.getLogger(__name__)
+
+# Известные заранее характеристики моделей: (контекстное окно в токенах, ценовая категория).
+# /models у OpenAI-совместимых API обычно их не отдаёт; если отдаёт — берём оттуда.
+KNOWN_MODELS = {
+    "gpt-3.5-turbo": (16385, "economy"),
+    "gpt-4": (8192, "premium"),
+    "gpt-4-turbo": (128000, "premium"),
+    "gpt-4o": (128000, "standard"),
+    "gpt-4o-mini": (128000, "economy"),
+    "o1": (200000, "premium"),
+    "o1-mini": (128000, "standard"),
+    "o3-mini": (200000, "standard"),
+}
+
+# Поля ответа /models, в которых разные прокси отдают размер контекста
+_CONTEXT_FIELDS = ("context_window", "context_length", "max_context_length")
+
+
+class ModelInfo:
+    """Метаданные одной модели из каталога."""
+
+    __slots__ = ("id", "context_window", "price_tier", "owned_by")
+
+    def __init__(self, id: str, context_window: int, price_tier: str, owned_by: str | None = None):
+        self.id = id
+        self.context_window = context_window
+        self.price_tier = price_tier
+        self.owned_by = owned_by
+
+    @classmethod
+    def from_api(cls, raw: dict) -> "ModelInfo":
+        model_id = raw["id"]
+        context_window, price_tier = KNOWN_MODELS.get(model_id, (CONTEXT_DEFAULT_WINDOW, "unknown"))
+        for field in _CONTEXT_FIELDS:
+            if isinstance(raw.get(field), int) and raw[field] > 0:
+                context_window = raw[field]
+                break
+        return cls(model_id, context_window, price_tier, raw.get("owned_by"))
+
+
+class ModelCatalog:
+    """
+    Каталог моделей Proxy API в памяти.
+    - Список /models подтягивается в фоне раз в ttl секунд (start()/stop()).
+    - Хендлеры и сборка контекста читают только память: ни одного
+      сетевого запроса на пути обработки сообщения.
+    - Если обновление не удалось, остаётся последний удачный список;
+      пока его нет — используются KNOWN_MODELS.
+    """
+
+    def __init__(self, ttl: float, picker_models: list[str]):
+        self.ttl = ttl
+        self.picker_models = picker_models
+        self._models: dict[str, ModelInfo] = {}
+        self.refreshed_at: float | None = None
+        self.stats = {"refreshes": 0, "failures": 0}
+        self._task: asyncio.Task | None = None
+
+    def _fallback_info(self, model: str) -> ModelInfo:
+        context_window, price_tier = KNOWN_MODELS.get(model, (CONTEXT_DEFAULT_WINDOW, "unknown"))
+        return ModelInfo(model, context_window, price_tier)
+
+    def get(self, model: str) -> ModelInfo:
+        return self._models.get(model) or self._fallback_info(model)
+
+    def context_window(self, model: str) -> int:
+        return self.get(model).context_window
+
+    def is_available(self, model: str) -> bool:
+        """Модель есть в последнем списке /models (пока списка нет — считаем, что есть)."""
+        return not self._models or model in self._models
+
+    def picker(self) -> list[ModelInfo]:
+        """Модели для меню выбора: настроенный список, отфильтрованный по доступным."""
+        return [self.get(model) for model in self.picker_models if self.is_available(model)]
+
+    async def refresh(self) -> bool:
+        """Один запрос к /models. Возвращает True, если список обновлён."""
+        try:
+            raw_models = await proxyapi_client.fetch_models()
+        except Exception as e:
+            self.stats["failures"] += 1
+            logger.warning(f"Не удалось обновить список моделей: {e}")
+            return False
+        models = {}
+        for raw in raw_models:
+            if "id" in raw:
+                info = ModelInfo.from_api(raw)
+                models[info.id] = info
+        if not models:
+            self.stats["failures"] += 1
+            logger.warning("Proxy API вернул пустой список моделей, оставляем прежний.")
+            return False
+        self._models = models
+        self.refreshed_at = time.monotonic()
+        self.stats["refreshes"] += 1
+        logger.info(f"Список моделей обновлён: {len(models)} шт.")
+        return True
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.ttl)
+            await self.refresh()
+
+    async def start(self) -> None:
+        """Первое обновление при старте и фоновое обновление раз в ttl."""
+        await self.refresh()
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> dict:
+        return {
+            "models": len(self._models),
+            "age_seconds": round(time.monotonic() - self.refreshed_at, 1) if self.refreshed_at else None,
+            **self.stats,
+        }
+
+
+# Общий каталог процесса
+model_catalog = ModelCatalog(ttl=MODEL_CATALOG_TTL, picker_models=MODEL_PICKER_MODELS)
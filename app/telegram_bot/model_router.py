@@ -0,0 +1,226 @@
+# app/telegram_bot/model_router.py
+
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+from typing import AsyncIterator
+
+import httpx
+
+from app.config import (
+    MODEL_FALLBACKS,
+    MODEL_LATENCY_SLO_P95,
+    MODEL_ERROR_RATE_THRESHOLD,
+    MODEL_MIN_SAMPLES,
+    MODEL_STATS_WINDOW,
+    MODEL_REQUEST_DEADLINE,
+)
+from app.telegram_bot import proxyapi_client
+from app.telegram_bot.resilience import ServiceBusyError
+
+logger = logging.getLogger(__name__)
+
+
+def _percentile(sorted_values: list[float], q: float) -> float | None:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class ModelStats:
+    """
+    Скользящее окно (window секунд) результатов запросов к одной модели:
+    латентность успешных ответов (p50/p95) и доля ошибок.
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+        self._samples: deque[tuple[float, float, bool]] = deque()
+
+    def _expire(self, now: float) -> None:
+        while self._samples and now - self._samples[0][0] > self.window:
+            self._samples.popleft()
+
+    def record(self, latency: float, ok: bool, now: float | None = None) -> None:
+        now = time.monotonic() if now is None else now
+        self._samples.append((now, latency, ok))
+        self._expire(now)
+
+    def summary(self, now: float | None = None) -> dict:
+        now = time.monotonic() if now is None else now
+        self._expire(now)
+        latencies = sorted(lat for _, lat, ok in self._samples if ok)
+        total = len(self._samples)
+        errors = sum(1 for _, _, ok in self._samples if not ok)
+        return {
+            "samples": total,
+            "p50": _percentile(latencies, 0.5),
+            "p95": _percentile(latencies, 0.95),
+            "error_rate": errors / total if total else 0.0,
+        }
+
+
+class ModelRouter:
+    """
+    Выбирает модель для запроса: если у выбранной пользователем модели
+    за последние MODEL_STATS_WINDOW секунд p95 выше SLO или много ошибок,
+    запрос уходит на эквивалент из MODEL_FALLBACKS (если тот здоров).
+    Старые замеры выпадают из окна, поэтому основная модель со временем
+    снова получает трафик. Решения считаются в decisions (для метрик).
+    """
+
+    def __init__(
+        self,
+        fallbacks: dict[str, str],
+        latency_slo_p95: float,
+        error_rate_threshold: float,
+        min_samples: int,
+        window: float,
+    ):
+        self.fallbacks = fallbacks
+        self.latency_slo_p95 = latency_slo_p95
+        self.error_rate_threshold = error_rate_threshold
+        self.min_samples = min_samples
+        self.window = window
+        self._stats: dict[str, ModelStats] = {}
+        self.decisions: Counter = Counter()
+
+    def health(self, model: str) -> tuple[bool, str]:
+        """(здорова ли модель, причина)."""
+        stats = self._stats.get(model)
+        summary = stats.summary() if stats else None
+        if summary is None or summary["samples"] < self.min_samples:
+            return True, "insufficient_data"
+        if summary["error_rate"] >= self.error_rate_threshold:
+            return False, "error_rate"
+        if summary["p95"] is not None and summary["p95"] > self.latency_slo_p95:
+            return False, "latency_slo"
+        return True, "healthy"
+
+    def choose(self, model: str) -> str:
+        healthy, reason = self.health(model)
+        fallback = self.fallbacks.get(model)
+        chosen = model
+        if not healthy and fallback and self.health(fallback)[0]:
+            chosen = fallback
+            logger.info(f"Модель {model} нездорова ({reason}), используем {fallback}.")
+        self.decisions[(model, chosen, reason)] += 1
+        return chosen
+
+    def candidates(self, model: str) -> list[str]:
+        """
+        Порядок попыток для запроса: выбранная choose() модель, затем
+        (если выбрана основная) её запасная — на случай ошибки прямо сейчас.
+        """
+        chosen = self.choose(model)
+        fallback = self.fallbacks.get(model)
+        if fallback and fallback != chosen:
+            return [chosen, fallback]
+        return [chosen]
+
+    def record(self, model: str, latency: float, ok: bool) -> None:
+        stats = self._stats.get(model)
+        if stats is None:
+            stats = self._stats[model] = ModelStats(self.window)
+        stats.record(latency, ok)
+
+    def snapshot(self) -> dict:
+        return {
+            "models": {model: stats.summary() for model, stats in self._stats.items()},
+            "decisions": [
+                {"requested": requested, "chosen": chosen, "reason": reason, "count": count}
+                for (requested, chosen, reason), count in self.decisions.items()
+            ],
+        }
+
+
+model_router = ModelRouter(
+    fallbacks=MODEL_FALLBACKS,
+    latency_slo_p95=MODEL_LATENCY_SLO_P95,
+    error_rate_threshold=MODEL_ERROR_RATE_THRESHOLD,
+    min_samples=MODEL_MIN_SAMPLES,
+    window=MODEL_STATS_WINDOW,
+)
+
+
+async def _within(deadline: float, awaitable, model: str):
+    """Ждёт awaitable не дольше оставшегося до deadline (time.monotonic) времени."""
+    try:
+        return await asyncio.wait_for(awaitable, max(0.0, deadline - time.monotonic()))
+    except asyncio.TimeoutError:
+        raise httpx.ReadTimeout(f"{model}: истёк общий срок запроса ({MODEL_REQUEST_DEADLINE} с)") from None
+
+
+async def routed_chat_completion(model: str, messages: list, **kwargs) -> dict:
+    """
+    create_chat_completion с выбором модели через model_router.
+    Если выбранная модель ответила ошибкой, один раз пробуем её fallback —
+    в пределах общего срока MODEL_REQUEST_DEADLINE (истёк — httpx.ReadTimeout).
+    ServiceBusyError (Proxy API целиком недоступен) пробрасывается как есть.
+    """
+    candidates = model_router.candidates(model)
+    deadline = time.monotonic() + MODEL_REQUEST_DEADLINE
+
+    for i, candidate in enumerate(candidates):
+        started = time.monotonic()
+        try:
+            result = await _within(
+                deadline, proxyapi_client.create_chat_completion(candidate, messages, **kwargs), candidate
+            )
+        except ServiceBusyError:
+            raise
+        except Exception:
+            model_router.record(candidate, time.monotonic() - started, ok=False)
+            if i == len(candidates) - 1 or time.monotonic() >= deadline:
+                raise
+            logger.warning(f"Модель {candidate} ответила ошибкой, пробуем {candidates[i + 1]}.", exc_info=True)
+            continue
+        model_router.record(candidate, time.monotonic() - started, ok=True)
+        return result
+
+
+async def routed_stream_chat_completion(model: str, messages: list, **kwargs) -> AsyncIterator[str]:
+    """
+    stream_chat_completion с выбором модели через model_router.
+    Латентность для стрима — время до первого токена. Переключение на
+    fallback при ошибке возможно, только пока пользователю ничего не отдано.
+    Первый токен (с учётом попытки на fallback) ждём не дольше
+    MODEL_REQUEST_DEADLINE, дальше поток читается с обычными таймаутами.
+    """
+    candidates = model_router.candidates(model)
+    deadline = time.monotonic() + MODEL_REQUEST_DEADLINE
+
+    for i, candidate in enumerate(candidates):
+        started = time.monotonic()
+        first_token = False
+        stream = proxyapi_client.stream_chat_completion(candidate, messages, **kwargs)
+        try:
+            while True:
+                try:
+                    if first_token:
+                        delta = await stream.__anext__()
+                    else:
+                        delta = await _within(deadline, stream.__anext__(), candidate)
+                except StopAsyncIteration:
+                    break
+                if not first_token:
+                    first_token = True
+                    model_router.record(candidate, time.monotonic() - started, ok=True)
+                yield delta
+            if not first_token:
+                model_router.record(candidate, time.monotonic() - started, ok=True)
+            return
+        except ServiceBusyError:
+            raise
+        except Exception:
+            if first_token:
+                raise
+            model_router.record(candidate, time.monotonic() - started, ok=False)
+            if i == len(candidates) - 1 or time.monotonic() >= deadline:
+                raise
+            logger.warning(f"Модель {candidate} ответила ошибкой, пробуем {candidates[i + 1]}.", exc_info=True)
+        finally:
+            # Поток, прерванный по сроку, закрываем сразу (соединение вернётся в пул)
+            await stream.aclose()
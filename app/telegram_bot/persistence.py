@@ -0,0 +1,259 @@
+# app/telegram_bot/persistence.py
+
+import asyncio
+import datetime
+import json
+import logging
+
+from sqlalchemy import delete, insert, select
+from telegram.ext import BasePersistence, PersistenceInput
+
+from app.config import (
+    BOT_PERSISTENCE_INTERVAL,
+    BOT_PERSISTENCE_FLUSH_DELAY,
+    BOT_PERSISTENCE_MAX_BATCH,
+)
+from app.database.models import BotState
+
+logger = logging.getLogger(__name__)
+
+USER_NAMESPACE = "user"
+CHAT_NAMESPACE = "chat"
+CONVERSATION_PREFIX = "conversation:"
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, sort_keys=True)
+
+
+class DatabasePersistence(BasePersistence):
+    """
+    PTB-persistence поверх нашей БД (таблица bot_state, JSON):
+    user_data, chat_data и состояния ConversationHandler (persistent=True)
+    переживают перезапуск бота.
+
+    - чтение ленивое: user_data/chat_data пользователя читаются одним SELECT
+      при первом его апдейте (refresh_*), состояния диалогов — при старте;
+    - запись пачками: PTB раз в update_interval отдаёт изменения (update_*),
+      здесь они только помечаются грязными (неизменившиеся отбрасываются),
+      а через flush_delay одной транзакцией уходят в БД;
+    - Application.shutdown() дописывает всё через flush().
+
+    bot_data не сохраняется: там session_factory и прочие живые объекты.
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        update_interval: float = BOT_PERSISTENCE_INTERVAL,
+        flush_delay: float = BOT_PERSISTENCE_FLUSH_DELAY,
+        max_batch: int = BOT_PERSISTENCE_MAX_BATCH,
+    ):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=True, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.session_factory = session_factory
+        self.flush_delay = flush_delay
+        self.max_batch = max_batch
+        # Что сейчас лежит в БД (JSON) — чтобы не переписывать неизменившееся
+        self._stored: dict[tuple[str, str], str] = {}
+        # Ждут записи: JSON или None (удалить строку)
+        self._dirty: dict[tuple[str, str], str | None] = {}
+        self._loaded: set[tuple[str, str]] = set()
+        self._loading: dict[tuple[str, str], asyncio.Task] = {}
+        self._flush_task: asyncio.Task | None = None
+        self._flush_waiting = False  # _flush_task ещё спит, а не пишет — его можно отменить
+        self._flush_lock = asyncio.Lock()
+        self.stats = {"loads": 0, "flushes": 0, "written": 0, "deleted": 0, "unchanged": 0, "errors": 0}
+
+    # ---------- загрузка ----------
+
+    async def get_user_data(self) -> dict:
+        return {}  # читаем лениво в refresh_user_data
+
+    async def get_chat_data(self) -> dict:
+        return {}  # читаем лениво в refresh_chat_data
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        namespace = CONVERSATION_PREFIX + name
+        async with self.session_factory() as session:
+            rows = (await session.execute(
+                select(BotState.key, BotState.data).where(BotState.namespace == namespace)
+            )).all()
+        conversations = {}
+        for key, data in rows:
+            self._stored[(namespace, key)] = data
+            conversations[tuple(json.loads(key))] = json.loads(data)
+        return conversations
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        await self._load_into(USER_NAMESPACE, str(user_id), user_data)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        await self._load_into(CHAT_NAMESPACE, str(chat_id), chat_data)
+
+    async def refresh_bot_data(self, bot_data) -> None:
+        pass
+
+    async def _load_into(self, namespace: str, key: str, target: dict) -> None:
+        """Один раз за время жизни процесса дополняет target сохранённым в БД."""
+        item = (namespace, key)
+        if item in self._loaded:
+            return
+        task = self._loading.get(item)
+        if task is None:
+            # Параллельные апдейты одного пользователя ждут один и тот же SELECT
+            task = self._loading[item] = asyncio.ensure_future(self._fetch(namespace, key))
+        try:
+            data = await asyncio.shield(task)
+        finally:
+            if task.done():
+                self._loading.pop(item, None)
+        if item in self._loaded:
+            return
+        self._loaded.add(item)
+        for name, value in data.items():
+            target.setdefault(name, value)
+
+    async def _fetch(self, namespace: str, key: str) -> dict:
+        async with self.session_factory() as session:
+            data = (await session.execute(
+                select(BotState.data).where(BotState.namespace == namespace, BotState.key == key)
+            )).scalar_one_or_none()
+        self.stats["loads"] += 1
+        if data is None:
+            return {}
+        self._stored.setdefault((namespace, key), data)
+        return json.loads(data)
+
+    # ---------- изменения ----------
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._mark(USER_NAMESPACE, str(user_id), data)
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        self._mark(CHAT_NAMESPACE, str(chat_id), data)
+
+    async def update_conversation(self, name: str, key: tuple, new_state) -> None:
+        self._mark(CONVERSATION_PREFIX + name, _dumps(list(key)), new_state)
+
+    async def update_bot_data(self, data) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._mark(USER_NAMESPACE, str(user_id), None)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._mark(CHAT_NAMESPACE, str(chat_id), None)
+
+    def _mark(self, namespace: str, key: str, value) -> None:
+        """Помечает запись грязной; пустые данные и None — удалить строку."""
+        try:
+            data = _dumps(value) if value not in (None, {}) else None
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Persistence: {namespace}/{key} не сериализуется в JSON, пропускаем: {e}")
+            return
+        item = (namespace, key)
+        if item not in self._dirty and self._stored.get(item) == data:
+            self.stats["unchanged"] += 1
+            return
+        self._dirty[item] = data
+        self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        task = self._flush_task
+        if task is not None and not task.done():
+            if len(self._dirty) < self.max_batch or not self._flush_waiting:
+                # Таймер уже заведён или запись идёт (набравшееся она допишет следом)
+                return
+            # Таймер ещё спит — будим сразу. Идущую запись не отменяем никогда:
+            # _write уже забрал _dirty
+            task.cancel()
+        delay = 0 if len(self._dirty) >= self.max_batch else self.flush_delay
+        self._flush_waiting = True
+        self._flush_task = asyncio.ensure_future(self._delayed_flush(delay))
+
+    async def _delayed_flush(self, delay: float) -> None:
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            if self._flush_task is asyncio.current_task():
+                self._flush_waiting = False
+        try:
+            await self._write()
+        except Exception as e:
+            logger.error(f"Persistence: не удалось записать состояние бота: {e}", exc_info=True)
+        if self._dirty and self._flush_task is asyncio.current_task():
+            # Изменения, пришедшие во время записи, — следующей пачкой
+            self._flush_task = None
+            self._schedule_flush()
+
+    async def flush(self) -> None:
+        """
+        Вызывается Application.shutdown(): дописывает всё, что не успело уйти в БД.
+        Ошибка только логируется, чтобы не сорвать остальную остановку приложения.
+        """
+        while (task := self._flush_task) is not None and not task.done():
+            if self._flush_waiting:
+                task.cancel()
+                break
+            # Идущую запись не прерываем — дожидаемся
+            await asyncio.gather(task, return_exceptions=True)
+        try:
+            await self._write()
+        except Exception as e:
+            logger.error(f"Persistence: не удалось дописать состояние бота: {e}", exc_info=True)
+
+    async def _write(self) -> None:
+        async with self._flush_lock:
+            batch, self._dirty = self._dirty, {}
+            if not batch:
+                return
+            now = datetime.datetime.utcnow()
+            rows = [
+                {"namespace": namespace, "key": key, "data": data, "updated_at": now}
+                for (namespace, key), data in batch.items()
+                if data is not None
+            ]
+            by_namespace: dict[str, list[str]] = {}
+            for namespace, key in batch:
+                by_namespace.setdefault(namespace, []).append(key)
+            try:
+                async with self.session_factory() as session:
+                    # Переносимый upsert: удалить все ключи пачки и вставить живые
+                    for namespace, keys in by_namespace.items():
+                        await session.execute(
+                            delete(BotState).where(BotState.namespace == namespace, BotState.key.in_(keys))
+                        )
+                    if rows:
+                        await session.execute(insert(BotState), rows)
+                    await session.commit()
+            except BaseException as e:
+                # Вернём в очередь (и при отмене); более свежие пометки не перетираем
+                if isinstance(e, Exception):
+                    self.stats["errors"] += 1
+                for item, data in batch.items():
+                    self._dirty.setdefault(item, data)
+                raise
+
+            for item, data in batch.items():
+                if data is None:
+                    self._stored.pop(item, None)
+                else:
+                    self._stored[item] = data
+            self.stats["flushes"] += 1
+            self.stats["written"] += len(rows)
+            self.stats["deleted"] += len(batch) - len(rows)
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "pending": len(self._dirty), "loaded": len(self._loaded)}
@@ -1,13 +1,32 @@
 # proxyapi_client.py
 
+import asyncio
+import importlib.util
+import json
+import logging
+from typing import AsyncIterator
+
 import httpx
-from app.config import PROXY_API_KEY, TIMEOUT
+from app.config import (
+    PROXY_API_KEY,
+    TIMEOUT,
+    PROXY_API_HTTP2,
+    PROXY_API_MAX_CONNECTIONS,
+    PROXY_API_MAX_KEEPALIVE,
+    PROXY_API_KEEPALIVE_EXPIRY,
+    PROXY_API_WARMUP_CONNECTIONS,
+)
+from app.telegram_bot.completion_cache import completion_cache, make_cache_key
+from app.telegram_bot.resilience import proxy_resilience, ServiceBusyError
+
+logger = logging.getLogger(__name__)
 
 # Базовый URL к proxyapi (если у вас OpenAI-совместимые методы)
 BASE_URL = "https://api.proxyapi.ru/openai/v1"
 
-# Глобальный список моделей (заполняется при init_available_models())
-AVAILABLE_MODELS = []
+# Один долгоживущий AsyncClient на процесс (keep-alive пул соединений).
+# Создаётся в init_client() (lifespan) или лениво при первом запросе.
+_client: httpx.AsyncClient | None = None
 
 def _make_headers() -> dict:
     """Возвращает заголовки для запросов к proxyapi."""
@@ -16,34 +35,129 @@ def _make_headers() -> dict:
         "Content-Type": "application/json",
     }
 
-def init_available_models():
+def _http2_available() -> bool:
+    """
+    HTTP/2 в httpx требует пакет h2 (pip install httpx[http2]).
+    Если его нет — работаем по HTTP/1.1.
+    """
+    if not PROXY_API_HTTP2:
+        return False
+    if importlib.util.find_spec("h2") is None:
+        logger.warning("PROXY_API_HTTP2 включён, но пакет h2 не установлен — используем HTTP/1.1.")
+        return False
+    return True
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Возвращает общий httpx.AsyncClient (создаёт его при первом обращении).
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=TIMEOUT,
+            http2=_http2_available(),
+            limits=httpx.Limits(
+                max_connections=PROXY_API_MAX_CONNECTIONS,
+                max_keepalive_connections=PROXY_API_MAX_KEEPALIVE,
+                keepalive_expiry=PROXY_API_KEEPALIVE_EXPIRY,
+            ),
+        )
+    return _client
+
+async def init_client(warmup: bool = True) -> httpx.AsyncClient:
     """
-    Один раз вызывается при старте бота, чтобы заполнить AVAILABLE_MODELS.
-    Если что-то пошло не так, список остаётся пустым.
+    Вызывается при старте приложения (lifespan): создаёт клиент и
+    заранее открывает несколько соединений (TCP + TLS), чтобы первый
+    пользовательский запрос не платил за рукопожатие.
+    Ошибки прогрева не критичны — только логируются.
     """
-    global AVAILABLE_MODELS
-    try:
-        models = fetch_available_models()
-        AVAILABLE_MODELS = models
-        print(f"[INFO] Список доступных моделей: {AVAILABLE_MODELS}")
-    except Exception as e:
-        print(f"[ERROR] Не удалось получить список моделей: {e}")
-        AVAILABLE_MODELS = []
+    client = get_client()
+    if warmup and PROXY_API_WARMUP_CONNECTIONS > 0:
+        results = await asyncio.gather(
+            *(client.get(f"{BASE_URL}/models", headers=_make_headers())
+              for _ in range(PROXY_API_WARMUP_CONNECTIONS)),
+            return_exceptions=True
+        )
+        errors = [r for r in results if isinstance(r, Exception)]
+        if errors:
+            logger.warning(f"Прогрев соединений к Proxy API: {len(errors)} ошибок, последняя: {errors[-1]!r}")
+        else:
+            logger.info(f"Прогрето соединений к Proxy API: {len(results)}")
+    return client
+
+async def close_client() -> None:
+    """
+    Закрывает общий клиент (вызывается при остановке приложения).
+    """
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+async def _request(method: str, url: str, **kwargs) -> httpx.Response:
+    """
+    Запрос к Proxy API через proxy_resilience: адаптивный лимит одновременных
+    запросов, повторы на 429/5xx и circuit breaker. Ошибочный статус ->
+    httpx.HTTPStatusError, перегрузка/недоступность -> ServiceBusyError.
+    """
+    async with proxy_resilience.slot():
+        return await proxy_resilience.send(lambda: get_client().request(method, url, **kwargs))
+
+def _read_file(file_path: str) -> bytes:
+    with open(file_path, "rb") as f:
+        return f.read()
 
-def fetch_available_models() -> list:
+async def fetch_models() -> list[dict]:
     """
-    Делает запрос к /v1/models и возвращает список идентификаторов (id) доступных моделей.
+    Делает запрос к /v1/models и возвращает описания моделей как есть
+    (каталог с TTL — см. model_catalog.py).
     """
     url = f"{BASE_URL}/models"
-    with httpx.Client(timeout=TIMEOUT) as client:
-        resp = client.get(url, headers=_make_headers())
-        resp.raise_for_status()
-        data = resp.json()
-        # Предположим, data = { "object": "list", "data": [ ... ] }
-        models = [m["id"] for m in data.get("data", []) if "id" in m]
-        return models
-
-def create_chat_completion(
+    resp = await _request("GET", url, headers=_make_headers())
+    data = resp.json()
+    # Предположим, data = { "object": "list", "data": [ ... ] }
+    return data.get("data", [])
+
+async def fetch_available_models() -> list:
+    """
+    Список идентификаторов (id) доступных моделей.
+    """
+    models = await fetch_models()
+    return [m["id"] for m in models if "id" in m]
+
+def _chat_payload(
+    model: str,
+    messages: list,
+    temperature: float,
+    max_tokens: int,
+    top_p: float,
+    frequency_penalty: float,
+    presence_penalty: float,
+) -> dict:
+    """Тело запроса к /v1/chat/completions."""
+    return {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "top_p": top_p,
+        "frequency_penalty": frequency_penalty,
+        "presence_penalty": presence_penalty
+    }
+
+def _cache_key_for(payload: dict, cache: bool) -> str | None:
+    """
+    Ключ кэша ответа, если запрос можно кэшировать, иначе None.
+    """
+    if not cache:
+        completion_cache.stats["bypassed"] += 1
+        return None
+    if not completion_cache.is_cacheable(payload["temperature"]):
+        return None
+    params = {k: v for k, v in payload.items() if k not in ("model", "messages")}
+    return make_cache_key(payload["model"], payload["messages"], params)
+
+async def create_chat_completion(
     model: str,
     messages: list,
     temperature: float = 1.0,
@@ -51,6 +165,7 @@ def create_chat_completion(
     top_p: float = 1.0,
     frequency_penalty: float = 0.0,
     presence_penalty: float = 0.0,
+    cache: bool = True,
     # Доп. параметры, если нужно
 ) -> dict:
     """
@@ -63,24 +178,97 @@ def create_chat_completion(
       "choices": [...],
       ...
     }
+    Для потоковой выдачи см. stream_chat_completion().
+    Детерминированные запросы (низкая temperature) обслуживаются из
+    completion_cache; cache=False — обойти кэш для конкретного запроса.
     """
     url = f"{BASE_URL}/chat/completions"
-    payload = {
-        "model": model,
-        "messages": messages,
-        "temperature": temperature,
-        "max_tokens": max_tokens,
-        "top_p": top_p,
-        "frequency_penalty": frequency_penalty,
-        "presence_penalty": presence_penalty
-    }
+    payload = _chat_payload(
+        model, messages, temperature, max_tokens, top_p, frequency_penalty, presence_penalty
+    )
+
+    cache_key = _cache_key_for(payload, cache)
+    if cache_key:
+        cached = await completion_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    resp = await _request("POST", url, headers=_make_headers(), json=payload)
+    data = resp.json()
+    if cache_key:
+        await completion_cache.put(cache_key, data)
+    return data
+
+async def stream_chat_completion(
+    model: str,
+    messages: list,
+    temperature: float = 1.0,
+    max_tokens: int = 2048,
+    top_p: float = 1.0,
+    frequency_penalty: float = 0.0,
+    presence_penalty: float = 0.0,
+    cache: bool = True,
+) -> AsyncIterator[str]:
+    """
+    Потоковый режим /v1/chat/completions (stream=True, Server-Sent Events).
+    Асинхронный генератор: отдаёт фрагменты текста (choices[0].delta.content)
+    по мере их генерации моделью.
+    Пример SSE-строки:
+      data: {"choices": [{"delta": {"content": "При"}, "index": 0}]}
+      data: [DONE]
+    Кэш общий с create_chat_completion: при попадании весь ответ отдаётся
+    одним фрагментом, при промахе — сохраняется после полного ответа.
+    """
+    url = f"{BASE_URL}/chat/completions"
+    payload = _chat_payload(
+        model, messages, temperature, max_tokens, top_p, frequency_penalty, presence_penalty
+    )
+
+    cache_key = _cache_key_for(payload, cache)
+    if cache_key:
+        cached = await completion_cache.get(cache_key)
+        if cached is not None:
+            yield cached["choices"][0]["message"]["content"]
+            return
 
-    with httpx.Client(timeout=TIMEOUT) as client:
-        resp = client.post(url, headers=_make_headers(), json=payload)
-        resp.raise_for_status()
-        return resp.json()
+    payload["stream"] = True
+    parts = []
+    # Слот лимита держим всё время чтения потока; повторы возможны только
+    # до получения заголовков ответа (пока пользователю ничего не отдано).
+    async with proxy_resilience.slot():
+        client = get_client()
+        resp = await proxy_resilience.send(lambda: client.send(
+            client.build_request("POST", url, headers=_make_headers(), json=payload),
+            stream=True
+        ))
+        try:
+            async for line in resp.aiter_lines():
+                if not line.startswith("data:"):
+                    # Пустые строки-разделители и комментарии SSE (": ping")
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    if cache_key and parts:
+                        await completion_cache.put(cache_key, {
+                            "object": "chat.completion",
+                            "choices": [{
+                                "index": 0,
+                                "message": {"role": "assistant", "content": "".join(parts)},
+                            }],
+                        })
+                    break
+                chunk = json.loads(data)
+                choices = chunk.get("choices") or []
+                if not choices:
+                    continue
+                delta = (choices[0].get("delta") or {}).get("content")
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        finally:
+            await resp.aclose()
 
-def create_embedding(model: str, input_data: str | list) -> dict:
+async def create_embedding(model: str, input_data: str | list) -> dict:
     """
     Запрос к /v1/embeddings. Возвращает JSON, содержащий эмбеддинги.
     Пример ответа:
@@ -97,25 +285,24 @@ def create_embedding(model: str, input_data: str | list) -> dict:
         "model": model,
         "input": input_data
     }
-    with httpx.Client(timeout=TIMEOUT) as client:
-        resp = client.post(url, headers=_make_headers(), json=payload)
-        resp.raise_for_status()
-        return resp.json()
+    resp = await _request("POST", url, headers=_make_headers(), json=payload)
+    return resp.json()
 
-def upload_file(file_path: str, purpose: str = "fine-tune") -> dict:
+async def upload_file(file_path: str, purpose: str = "fine-tune") -> dict:
     """
     Запрос к /v1/files (загрузка файла).
+    Файл читается в отдельном потоке, чтобы не блокировать event loop.
     """
     url = f"{BASE_URL}/files"
-    with httpx.Client(timeout=TIMEOUT) as client:
-        with open(file_path, "rb") as f:
-            files = {"file": (file_path, f, "application/octet-stream")}
-            data = {"purpose": purpose}
-            resp = client.post(url, headers=_make_headers(), data=data, files=files)
-            resp.raise_for_status()
-            return resp.json()
+    content = await asyncio.to_thread(_read_file, file_path)
+    files = {"file": (file_path, content, "application/octet-stream")}
+    data = {"purpose": purpose}
+    # Content-Type для multipart httpx выставит сам
+    headers = {"Authorization": _make_headers()["Authorization"]}
+    resp = await _request("POST", url, headers=headers, data=data, files=files)
+    return resp.json()
 
-def generate_image(prompt: str, n: int = 1, size: str = "1024x1024") -> dict:
+async def generate_image(prompt: str, n: int = 1, size: str = "1024x1024") -> dict:
     """
     Пример для генерации изображений /v1/images/generations.
     """
@@ -128,20 +315,17 @@ def generate_image(prompt: str, n: int = 1, size: str = "1024x1024") -> dict:
         "n": n,
         "size": size
     }
-    with httpx.Client(timeout=TIMEOUT) as client:
-        resp = client.post(image_url, headers=_make_headers(), json=payload)
-        resp.raise_for_status()
-        return resp.json()
+    resp = await _request("POST", image_url, headers=_make_headers(), json=payload)
+    return resp.json()
 
-def transcribe_audio(file_path: str, model: str = "whisper-1") -> dict:
+async def transcribe_audio(file_path: str, model: str = "whisper-1") -> dict:
     """
     Пример для расшифровки аудио (/v1/audio/transcriptions).
     """
     url = f"{BASE_URL}/audio/transcriptions"
-    with httpx.Client(timeout=TIMEOUT) as client:
-        with open(file_path, "rb") as f:
-            files = {"file": (file_path, f, "audio/mpeg")}
-            data = {"model": model}
-            resp = client.post(url, headers=_make_headers(), data=data, files=files)
-            resp.raise_for_status()
-            return resp.json()
+    content = await asyncio.to_thread(_read_file, file_path)
+    files = {"file": (file_path, content, "audio/mpeg")}
+    data = {"model": model}
+    headers = {"Authorization": _make_headers()["Authorization"]}
+    resp = await _request("POST", url, headers=headers, data=data, files=files)
+    return resp.json()
@@ -0,0 +1,299 @@
+# app/telegram_bot/resilience.py
+
+import asyncio
+import datetime
+import email.utils
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable
+
+import httpx
+
+from app.config import (
+    PROXY_API_CONCURRENCY_INITIAL,
+    PROXY_API_CONCURRENCY_MIN,
+    PROXY_API_CONCURRENCY_MAX,
+    PROXY_API_ACQUIRE_TIMEOUT,
+    PROXY_API_MAX_RETRIES,
+    PROXY_API_RETRY_BASE_DELAY,
+    PROXY_API_RETRY_MAX_DELAY,
+    PROXY_API_BREAKER_THRESHOLD,
+    PROXY_API_BREAKER_RESET,
+)
+
+logger = logging.getLogger(__name__)
+
+# Статусы, при которых запрос имеет смысл повторить (перегрузка/сбой на стороне API)
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+# Ошибки, при которых запрос точно не дошёл до модели — повтор безопасен.
+# ReadTimeout не повторяем: ответ мог генерироваться, а пользователь уже ждал весь таймаут.
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout, httpx.RemoteProtocolError)
+
+
+class ServiceBusyError(Exception):
+    """
+    Proxy API сейчас недоступен или перегружен (открыт circuit breaker
+    или не удалось дождаться свободного слота). Хендлеры отвечают
+    пользователю «сервис занят» сразу, без ожидания таймаута.
+    """
+
+
+class AdaptiveLimiter:
+    """
+    Ограничение числа одновременных запросов по схеме AIMD:
+    каждый успешный ответ плавно поднимает лимит (+1/limit),
+    перегрузка (429/5xx/таймаут) уменьшает его вдвое.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self.waiting = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self, timeout: float) -> None:
+        async with self._cond:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(
+                    self._cond.wait_for(lambda: self.in_flight < int(self.limit)),
+                    timeout
+                )
+            except asyncio.TimeoutError:
+                raise ServiceBusyError("Нет свободных слотов для запроса к Proxy API")
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+
+    async def release(self) -> None:
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self) -> None:
+        self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+    def on_overload(self) -> None:
+        self.limit = max(self.minimum, self.limit / 2)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker: после threshold ошибок подряд «размыкается» на
+    reset_timeout секунд — все вызовы сразу получают ServiceBusyError.
+    Затем пропускает один пробный запрос (half-open): успех замыкает цепь,
+    ошибка снова размыкает.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def is_open(self) -> bool:
+        return self.state == self.OPEN and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def before_call(self) -> None:
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                raise ServiceBusyError("Proxy API временно недоступен (circuit open)")
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            if self._probe_in_flight:
+                raise ServiceBusyError("Proxy API проверяется после сбоя (circuit half-open)")
+            self._probe_in_flight = True
+
+    def record_success(self) -> None:
+        self._probe_in_flight = False
+        self.consecutive_failures = 0
+        if self.state != self.CLOSED:
+            logger.info("Circuit breaker Proxy API замкнут: сервис снова отвечает.")
+        self.state = self.CLOSED
+
+    def record_failure(self) -> None:
+        self._probe_in_flight = False
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.threshold:
+            if self.state != self.OPEN:
+                logger.warning(
+                    f"Circuit breaker Proxy API разомкнут на {self.reset_timeout} с "
+                    f"({self.consecutive_failures} ошибок подряд)."
+                )
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def release_probe(self) -> None:
+        """Пробный вызов завершился без вердикта (например, 4xx от клиента)."""
+        self._probe_in_flight = False
+
+
+def parse_retry_after(response: httpx.Response) -> float | None:
+    """
+    Retry-After: либо число секунд, либо HTTP-дата.
+    """
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+        return max(0.0, (when - datetime.datetime.now(when.tzinfo)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class Resilience:
+    """
+    Всё вместе: адаптивный лимит, повторы с jitter (с учётом Retry-After)
+    и circuit breaker. Счётчики доступны через snapshot().
+    """
+
+    def __init__(
+        self,
+        limiter: AdaptiveLimiter,
+        breaker: CircuitBreaker,
+        max_retries: int,
+        base_delay: float,
+        max_delay: float,
+        acquire_timeout: float,
+    ):
+        self.limiter = limiter
+        self.breaker = breaker
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.acquire_timeout = acquire_timeout
+        self.stats = {"calls": 0, "successes": 0, "failures": 0, "retries": 0, "rejected": 0}
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Занимает слот адаптивного лимита на время запроса (для стрима —
+        на всё время чтения ответа). Сразу отказывает, если breaker разомкнут.
+        """
+        if self.breaker.is_open():
+            self.stats["rejected"] += 1
+            raise ServiceBusyError("Proxy API временно недоступен (circuit open)")
+        try:
+            await self.limiter.acquire(self.acquire_timeout)
+        except ServiceBusyError:
+            self.stats["rejected"] += 1
+            raise
+        try:
+            yield
+        finally:
+            await self.limiter.release()
+
+    def _backoff(self, attempt: int, retry_after: float | None) -> float:
+        # Full jitter: случайная задержка в [0, base * 2^attempt]
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            delay = retry_after + delay / 2
+        return min(delay, self.max_delay)
+
+    async def send(self, request: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        """
+        Выполняет request() с повторами. Ответ с ошибочным статусом
+        превращается в httpx.HTTPStatusError (как raise_for_status).
+        Вызывать внутри slot().
+        """
+        attempt = 0
+        while True:
+            try:
+                self.breaker.before_call()
+            except ServiceBusyError:
+                self.stats["rejected"] += 1
+                raise
+            self.stats["calls"] += 1
+
+            retry_after = None
+            try:
+                response = await request()
+            except RETRYABLE_ERRORS as e:
+                error = e
+            except httpx.TimeoutException:
+                self._record_failure(overload=True)
+                raise
+            except BaseException:
+                # В том числе отмена (CancelledError): иначе half-open проба
+                # остаётся «в полёте» навсегда и breaker больше никого не пускает
+                self.breaker.release_probe()
+                raise
+            else:
+                if response.status_code < 400:
+                    self.breaker.record_success()
+                    self.limiter.on_success()
+                    self.stats["successes"] += 1
+                    return response
+                if response.status_code not in RETRYABLE_STATUSES:
+                    # Ошибка запроса (400/401/404...) — не проблема сервиса
+                    self.breaker.release_probe()
+                    await response.aclose()
+                    response.raise_for_status()
+                retry_after = parse_retry_after(response)
+                error = httpx.HTTPStatusError(
+                    f"Proxy API ответил {response.status_code}",
+                    request=response.request,
+                    response=response
+                )
+
+            # Вердикт — до первого await, чтобы отмена не оставила пробу незавершённой
+            self._record_failure(overload=True)
+            if isinstance(error, httpx.HTTPStatusError):
+                await error.response.aclose()
+            if attempt >= self.max_retries or self.breaker.is_open():
+                raise error
+            if retry_after is not None and retry_after > self.max_delay:
+                # Сервер просит ждать дольше, чем мы готовы держать пользователя
+                raise error
+            delay = self._backoff(attempt, retry_after)
+            attempt += 1
+            self.stats["retries"] += 1
+            logger.warning(f"Повтор запроса к Proxy API #{attempt} через {delay:.2f} с: {error!r}")
+            await asyncio.sleep(delay)
+
+    def _record_failure(self, overload: bool) -> None:
+        self.stats["failures"] += 1
+        self.breaker.record_failure()
+        if overload:
+            self.limiter.on_overload()
+
+    def snapshot(self) -> dict:
+        """Текущее состояние для метрик/healthcheck."""
+        return {
+            "circuit_state": self.breaker.state,
+            "consecutive_failures": self.breaker.consecutive_failures,
+            "concurrency_limit": round(self.limiter.limit, 2),
+            "in_flight": self.limiter.in_flight,
+            "waiting": self.limiter.waiting,
+            **self.stats,
+        }
+
+
+# Общий экземпляр для всех запросов к Proxy API
+proxy_resilience = Resilience(
+    limiter=AdaptiveLimiter(
+        PROXY_API_CONCURRENCY_INITIAL,
+        PROXY_API_CONCURRENCY_MIN,
+        PROXY_API_CONCURRENCY_MAX,
+    ),
+    breaker=CircuitBreaker(PROXY_API_BREAKER_THRESHOLD, PROXY_API_BREAKER_RESET),
+    max_retries=PROXY_API_MAX_RETRIES,
+    base_delay=PROXY_API_RETRY_BASE_DELAY,
+    max_delay=PROXY_API_RETRY_MAX_DELAY,
+    acquire_timeout=PROXY_API_ACQUIRE_TIMEOUT,
+)
@@ -0,0 +1,294 @@
+# app/telegram_bot/send_scheduler.py
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Callable, Coroutine
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from app.config import (
+    TELEGRAM_GLOBAL_RATE,
+    TELEGRAM_CHAT_RATE,
+    TELEGRAM_CHAT_BURST,
+    TELEGRAM_GROUP_RATE,
+    TELEGRAM_SEND_MAX_RETRIES,
+)
+
+logger = logging.getLogger(__name__)
+
+# Полосы приоритета: меньше — раньше
+INTERACTIVE, NORMAL, BULK = 0, 1, 2
+LANES = {"interactive": INTERACTIVE, "normal": NORMAL, "bulk": BULK}
+LANE_NAMES = {value: name for name, value in LANES.items()}
+
+# Ответы на нажатия кнопок: пользователь ждёт их прямо сейчас
+_INTERACTIVE_ENDPOINTS = frozenset({
+    "answerCallbackQuery",
+    "editMessageMedia",
+    "editMessageText",
+    "editMessageReplyMarkup",
+})
+# Методы, которые Telegram ограничивает лимитами на сообщения
+_LIMITED_PREFIXES = ("send", "edit", "copyMessage", "forwardMessage", "answerCallbackQuery")
+_UNLIMITED_ENDPOINTS = frozenset({"sendChatAction"})
+
+# Правки промежуточных подписей при стриминге: уступают место кнопкам
+# и не повторяются после RetryAfter — следующая правка всё равно придёт
+STREAM_EDIT_LIMITS = {"priority": "bulk", "max_retries": 0}
+
+
+def is_limited(endpoint: str) -> bool:
+    """Отправка/правка сообщений — через планировщик; getUpdates, setWebhook и т.п. — напрямую."""
+    return endpoint not in _UNLIMITED_ENDPOINTS and endpoint.startswith(_LIMITED_PREFIXES)
+
+
+class TokenBucket:
+    """
+    Token bucket: rate токенов в секунду, не больше capacity про запас.
+    Токены могут уходить в минус — так reserve() выдаёт очередному
+    запросу его слот во времени, не держа блокировок.
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated", "paused_until")
+
+    def __init__(self, rate: float, capacity: float, now: float | None = None):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic() if now is None else now
+        self.paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Сколько ждать до свободного токена (с учётом паузы после RetryAfter)."""
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.paused_until - now)
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def reserve(self, now: float) -> float:
+        """Забирает токен в долг и возвращает, сколько ждать своего слота."""
+        self._refill(now)
+        self.tokens -= 1
+        wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+        return max(wait, self.paused_until - now)
+
+    def pause(self, now: float, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, now + seconds)
+
+    def is_idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity and self.paused_until <= now
+
+
+class _LaneStats:
+    __slots__ = ("queued", "sent", "wait_total", "wait_max")
+
+    def __init__(self):
+        self.queued = 0
+        self.sent = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, wait: float) -> None:
+        self.sent += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+
+    def snapshot(self) -> dict:
+        return {
+            "queued": self.queued,
+            "sent": self.sent,
+            "wait_avg_ms": round(self.wait_total / self.sent * 1000, 1) if self.sent else 0.0,
+            "wait_max_ms": round(self.wait_max * 1000, 1),
+        }
+
+
+class SendScheduler(BaseRateLimiter):
+    """
+    Единый планировщик исходящих запросов к Bot API (подключается
+    через ApplicationBuilder.rate_limiter, поэтому через него идут все
+    reply_photo/edit_message_media и прочие отправки бота).
+
+    - лимит на чат: TokenBucket(chat_rate, chat_burst), для групп — group_rate;
+      запросы одного чата получают слоты по порядку вызова;
+    - общий лимит бота: TokenBucket(global_rate), из очереди с приоритетами
+      его токены раздаёт один диспетчер — interactive (ответы на кнопки)
+      обгоняют normal и bulk (промежуточные правки стриминга);
+    - RetryAfter: чат (или весь бот, если чата нет) ставится на паузу
+      на указанное время, запрос повторяется до max_retries раз.
+
+    rate_limit_args вызова: {"priority": "interactive"|"normal"|"bulk", "max_retries": n}.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = TELEGRAM_GLOBAL_RATE,
+        chat_rate: float = TELEGRAM_CHAT_RATE,
+        chat_burst: float = TELEGRAM_CHAT_BURST,
+        group_rate: float = TELEGRAM_GROUP_RATE,
+        max_retries: int = TELEGRAM_SEND_MAX_RETRIES,
+        max_chats: int = 10000,
+    ):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats: dict[int | str, TokenBucket] = {}
+        self._heap: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._lanes = {lane: _LaneStats() for lane in LANE_NAMES}
+        self.stats = {"retry_after": 0, "retried": 0, "gave_up": 0}
+
+    # ---------- BaseRateLimiter ----------
+
+    async def initialize(self) -> None:
+        self._ensure_dispatcher()
+
+    async def shutdown(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._heap:
+            _, _, waiter = heapq.heappop(self._heap)
+            waiter.cancel()
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Any]],
+        args: Any,
+        kwargs: dict[str, Any],
+        endpoint: str,
+        data: dict[str, Any],
+        rate_limit_args: dict | None,
+    ):
+        if not is_limited(endpoint):
+            return await callback(*args, **kwargs)
+
+        options = rate_limit_args or {}
+        lane = LANES.get(options.get("priority"), self.default_lane(endpoint))
+        max_retries = options.get("max_retries", self.max_retries)
+        chat_id = data.get("chat_id")
+
+        attempt = 0
+        while True:
+            await self._acquire(lane, chat_id)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                self.stats["retry_after"] += 1
+                self._pause(chat_id, float(e.retry_after))
+                if attempt >= max_retries:
+                    self.stats["gave_up"] += 1
+                    raise
+                attempt += 1
+                self.stats["retried"] += 1
+                logger.info(
+                    f"{endpoint}: RetryAfter {e.retry_after} с (chat={chat_id}), "
+                    f"повтор {attempt}/{max_retries}"
+                )
+
+    # ---------- планирование ----------
+
+    @staticmethod
+    def default_lane(endpoint: str) -> int:
+        return INTERACTIVE if endpoint in _INTERACTIVE_ENDPOINTS else NORMAL
+
+    def _chat_bucket(self, chat_id: int | str, now: float) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self.max_chats:
+                self._prune(now)
+            # Отрицательный id или @username — группа/канал, там лимит строже
+            private = isinstance(chat_id, int) and chat_id > 0
+            rate = self.chat_rate if private else self.group_rate
+            bucket = self._chats[chat_id] = TokenBucket(rate, self.chat_burst, now)
+        return bucket
+
+    def _prune(self, now: float) -> None:
+        for chat_id in [c for c, b in self._chats.items() if b.is_idle(now)]:
+            del self._chats[chat_id]
+
+    def _pause(self, chat_id: int | str | None, seconds: float) -> None:
+        now = time.monotonic()
+        if chat_id is None:
+            self._global.pause(now, seconds)
+        else:
+            self._chat_bucket(chat_id, now).pause(now, seconds)
+
+    async def _acquire(self, lane: int, chat_id: int | str | None) -> None:
+        stats = self._lanes[lane]
+        started = time.monotonic()
+        stats.queued += 1
+        try:
+            if chat_id is not None:
+                delay = self._chat_bucket(chat_id, started).reserve(started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await self._global_slot(lane)
+        finally:
+            stats.queued -= 1
+        stats.record(time.monotonic() - started)
+
+    async def _global_slot(self, lane: int) -> None:
+        self._ensure_dispatcher()
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (lane, next(self._seq), waiter))
+        self._wakeup.set()
+        await waiter
+
+    def _ensure_dispatcher(self) -> None:
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._dispatch())
+
+    async def _dispatch(self) -> None:
+        """Раздаёт токены общего лимита: сначала interactive, внутри полосы — FIFO."""
+        while True:
+            while self._heap and self._heap[0][2].done():
+                heapq.heappop(self._heap)  # ожидающий отменён
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            now = time.monotonic()
+            delay = self._global.delay(now)
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            _, _, waiter = heapq.heappop(self._heap)
+            if not waiter.done():
+                self._global.take(now)
+                waiter.set_result(None)
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        return {
+            **self.stats,
+            "lanes": {LANE_NAMES[lane]: s.snapshot() for lane, s in self._lanes.items()},
+            "queue_depth": sum(s.queued for s in self._lanes.values()),
+            "chats_tracked": len(self._chats),
+            "global_paused_s": round(max(0.0, self._global.paused_until - now), 1),
+        }
+
+
+send_scheduler = SendScheduler()
@@ -0,0 +1,104 @@
+# app/telegram_bot/update_ordering.py
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+from telegram import Update
+from telegram.ext import Application
+
+from app.config import UPDATE_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+
+def chat_key(update: object) -> int | None:
+    """Ключ сериализации: чат апдейта, иначе пользователь; None — без порядка."""
+    if not isinstance(update, Update):
+        return None
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    if update.effective_user is not None:
+        return update.effective_user.id
+    return None
+
+
+def _is_text_message(update: Update) -> bool:
+    """Обычный текст (не команда) — его склеит coalescer, а не обгонит."""
+    message = update.message
+    return message is not None and bool(message.text) and not message.text.startswith("/")
+
+
+class _ChatLock:
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class ChatOrderedApplication(Application):
+    """
+    Application, который обрабатывает апдейты разных чатов параллельно
+    (не больше update_concurrency одновременно), а апдейты одного чата —
+    строго в порядке поступления. Так медленный ответ LLM одному пользователю
+    не задерживает кнопки остальных, а состояния ConversationHandler
+    и active_chat_id одного чата не гоняются между собой.
+
+    PTB создаёт задачу на каждый апдейт (concurrent_updates = UPDATE_MAX_PENDING);
+    здесь задача сначала встаёт в очередь своего чата (asyncio.Lock — FIFO)
+    и только потом занимает общий слот, поэтому апдейты, ждущие свой чат,
+    не занимают слоты других чатов. Склеенные сообщения (coalescer.py)
+    обрабатываются в той же очереди через chat_turn.
+    """
+
+    __slots__ = ("_chat_locks", "_update_slots", "update_concurrency")
+
+    def __init__(self, *, update_concurrency: int = UPDATE_CONCURRENCY, **kwargs):
+        super().__init__(**kwargs)
+        self.update_concurrency = max(1, update_concurrency)
+        self._update_slots = asyncio.Semaphore(self.update_concurrency)
+        self._chat_locks: dict[int, _ChatLock] = {}
+
+    async def process_update(self, update: object) -> None:
+        key = chat_key(update)
+        if key is None:
+            async with self._update_slots:
+                await super().process_update(update)
+            return
+
+        async with self.chat_turn(key):
+            coalescer = self.bot_data.get("message_coalescer")
+            if coalescer is not None and coalescer.has_pending(key) and not _is_text_message(update):
+                # Сообщения, пришедшие раньше (их окно склейки ещё открыто),
+                # обрабатываем до кнопки/команды — порядок чата сохраняется
+                await coalescer.run_pending(key)
+            await super().process_update(update)
+
+    @asynccontextmanager
+    async def chat_turn(self, key: int):
+        """
+        Очередь чата key и общий слот update_concurrency. Через неё идёт
+        любая работа, меняющая состояние чата, в том числе фоновая
+        (склеенные сообщения, см. coalescer.py).
+        """
+        entry = self._chat_locks.get(key)
+        if entry is None:
+            entry = self._chat_locks[key] = _ChatLock()
+        entry.users += 1
+        try:
+            async with entry.lock:
+                async with self._update_slots:
+                    yield
+        finally:
+            entry.users -= 1
+            if entry.users == 0:
+                self._chat_locks.pop(key, None)
+
+    def snapshot(self) -> dict:
+        return {
+            "concurrency": self.update_concurrency,
+            "busy_slots": self.update_concurrency - self._update_slots._value,
+            "chats_in_progress": len(self._chat_locks),
+            "queued_updates": sum(max(0, e.users - 1) for e in self._chat_locks.values()),
+        }
@@ -1,37 +1,23 @@
 # app/telegram_bot/utils.py
 
-import re
 from app.config import MAX_TELEGRAM_TEXT, TRUNCATE_SUFFIX
+from app.telegram_bot.markdown_v2 import escape_text, render_markdown_v2
 
 def partial_escape_markdown_v2(text: str) -> str:
     """
-    Экранирует специальные символы MarkdownV2 в тексте,
-    кроме тех, что уже находятся в кодовых блоках (обрабатываются в convert_to_telegram_markdown_v2).
+    Экранирует специальные символы MarkdownV2 в тексте (кроме * и _),
+    не разбирая кодовые блоки — их обрабатывает convert_to_telegram_markdown_v2.
     """
-    # Спецсимволы экранируем двойными обратными слэшами.
-    # Обратите внимание на включённый бэктик (`) и обратные слэши (\\).
-    special_chars = "\\[\\]\\(\\)~`>#\\+\\-=\\|{}\\.!"
-    # При помощи re.escape() дополнительно экранируем спецсимволы для шаблона.
-    pattern = f"([{re.escape(special_chars)}])"
-    return re.sub(pattern, r'\\\1', text)
+    return escape_text(text)
 
 def convert_to_telegram_markdown_v2(text: str) -> str:
     """
-    Разбивает текст на сегменты, чтобы отдельно обрабатывать кодовые блоки (```...``` или `...`).
-    Вне кодовых блоков экранирует спецсимволы через partial_escape_markdown_v2.
+    Готовит ответ модели к отправке с parse_mode="MarkdownV2": кодовые блоки
+    (```...``` или `...`) остаются кодом, вне них спецсимволы экранируются.
+    Один проход по тексту, см. app/telegram_bot/markdown_v2.py
+    (там же MarkdownV2Stream — тот же рендер для ответа, приходящего кусками).
     """
-    # Шаблон ищет либо тройные бэктики (с любым содержимым),
-    # либо одиночные бэктики вокруг слов/фраз.
-    pattern = r"(```[\s\S]+?```|`[^`]+`)"
-    segments = re.split(pattern, text)
-
-    for i, segment in enumerate(segments):
-        # Если сегмент НЕ начинается с ``` и НЕ является одинарным `...`,
-        # то экранируем спецсимволы в этом сегменте
-        if not (segment.startswith("```") or (segment.startswith("`") and segment.endswith("`"))):
-            segments[i] = partial_escape_markdown_v2(segment)
-
-    return "".join(segments)
+    return render_markdown_v2(text)
 
 def truncate_if_too_long(text: str, limit: int = MAX_TELEGRAM_TEXT) -> str:
     """
@@ -0,0 +1,110 @@
+import hashlib
+import hmac
+import logging
+
+from fastapi import APIRouter, Request, Response
+from telegram import Update
+from telegram.ext import Application
+
+from app.config import (
+    TELEGRAM_WEBHOOK_URL,
+    TELEGRAM_WEBHOOK_PATH,
+    TELEGRAM_WEBHOOK_SECRET,
+    TELEGRAM_WEBHOOK_MAX_CONNECTIONS,
+    TELEGRAM_WEBHOOK_DROP_PENDING,
+    TELEGRAM_WEBHOOK_DELETE_ON_SHUTDOWN,
+)
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+@router.post(TELEGRAM_WEBHOOK_PATH)
+async def telegram_webhook(request: Request):
+    """
+    Апдейты от Telegram в режиме webhook: проверяем секрет из заголовка
+    и кладём Update в очередь PTB — обработка идёт уже в Application.
+    """
+    application: Application | None = getattr(request.app.state, "telegram_application", None)
+    secret: str | None = getattr(request.app.state, "telegram_webhook_secret", None)
+    if application is None or not secret:
+        return Response(status_code=404)
+
+    received = request.headers.get(SECRET_HEADER, "")
+    if not hmac.compare_digest(received.encode(), secret.encode()):
+        logger.warning("Telegram webhook: неверный secret token")
+        return Response(status_code=403)
+
+    try:
+        data = await request.json()
+        update = Update.de_json(data, application.bot)
+    except Exception as e:
+        logger.warning(f"Telegram webhook: не удалось разобрать апдейт: {e}")
+        return Response(status_code=400)
+
+    await application.update_queue.put(update)
+    return {"ok": True}
+
+
+def webhook_secret(token: str) -> str:
+    """
+    Секрет webhook: TELEGRAM_WEBHOOK_SECRET или HMAC от токена бота.
+    Детерминированный: после перезапуска уже зарегистрированный webhook остаётся рабочим.
+    """
+    if TELEGRAM_WEBHOOK_SECRET:
+        return TELEGRAM_WEBHOOK_SECRET
+    return hmac.new(token.encode(), b"telegram-webhook-secret", hashlib.sha256).hexdigest()
+
+
+def webhook_url(secret: str) -> str:
+    """
+    Адрес webhook с отпечатком секрета в query: по getWebhookInfo видно,
+    зарегистрирован ли webhook уже с текущим секретом.
+    """
+    fingerprint = hashlib.sha256(secret.encode()).hexdigest()[:8]
+    return f"{TELEGRAM_WEBHOOK_URL.rstrip('/')}{TELEGRAM_WEBHOOK_PATH}?v={fingerprint}"
+
+
+async def register_webhook(application: Application, state) -> None:
+    """
+    Регистрирует webhook в Telegram и сохраняет application/секрет в app.state,
+    откуда их берёт telegram_webhook. Если webhook с тем же адресом и секретом
+    уже стоит (после прошлого запуска), set_webhook не вызывается.
+    """
+    if not TELEGRAM_WEBHOOK_URL:
+        raise RuntimeError("TELEGRAM_MODE=webhook, но TELEGRAM_WEBHOOK_URL не задан")
+    secret = webhook_secret(application.bot.token)
+    url = webhook_url(secret)
+    state.telegram_application = application
+    state.telegram_webhook_secret = secret
+
+    info = await application.bot.get_webhook_info()
+    if info.url == url:
+        logger.info(f"Telegram webhook уже зарегистрирован: {TELEGRAM_WEBHOOK_URL}{TELEGRAM_WEBHOOK_PATH}")
+        return
+    await application.bot.set_webhook(
+        url=url,
+        secret_token=secret,
+        max_connections=TELEGRAM_WEBHOOK_MAX_CONNECTIONS,
+        allowed_updates=Update.ALL_TYPES,
+        drop_pending_updates=TELEGRAM_WEBHOOK_DROP_PENDING,
+    )
+    logger.info(f"Telegram webhook зарегистрирован: {TELEGRAM_WEBHOOK_URL}{TELEGRAM_WEBHOOK_PATH}")
+
+
+async def unregister_webhook(application: Application, state) -> None:
+    """
+    Route больше не принимает апдейты. Сам webhook снимается только при
+    TELEGRAM_WEBHOOK_DELETE_ON_SHUTDOWN: иначе Telegram копит апдейты до
+    следующего запуска (или их принимает другой процесс за тем же адресом).
+    """
+    state.telegram_application = None
+    if not TELEGRAM_WEBHOOK_DELETE_ON_SHUTDOWN:
+        return
+    try:
+        await application.bot.delete_webhook()
+        logger.info("Telegram webhook снят.")
+    except Exception as e:
+        logger.warning(f"Не удалось снять Telegram webhook: {e}")
@@ -0,0 +1,60 @@
+# tests/conftest.py
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.database.models import Base
+
+
+@pytest_asyncio.fixture
+async def async_session_factory():
+    """
+    Фабрика сессий поверх временной in-memory SQLite БД (схема из моделей).
+    """
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
+    yield factory
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def async_session(async_session_factory):
+    async with async_session_factory() as session:
+        yield session
+
+
+@pytest.fixture(autouse=True)
+def fresh_proxy_resilience(monkeypatch):
+    """
+    Отдельный экземпляр Resilience на каждый тест (без повторов и пауз),
+    чтобы состояние breaker/лимита не переходило между тестами.
+    """
+    from app.telegram_bot import proxyapi_client
+    from app.telegram_bot.resilience import Resilience, AdaptiveLimiter, CircuitBreaker
+
+    resilience = Resilience(
+        limiter=AdaptiveLimiter(8, 1, 16),
+        breaker=CircuitBreaker(threshold=3, reset_timeout=30),
+        max_retries=0,
+        base_delay=0,
+        max_delay=0,
+        acquire_timeout=1,
+    )
+    monkeypatch.setattr(proxyapi_client, "proxy_resilience", resilience)
+    return resilience
+
+
+@pytest.fixture(autouse=True)
+def fresh_profile_cache(monkeypatch):
+    """
+    Пустой кэш профилей на каждый тест: у каждого теста своя БД,
+    а chat_id пользователей в тестах повторяются.
+    """
+    from app.services import user_service
+
+    cache = user_service.ProfileCache(max_entries=100)
+    monkeypatch.setattr(user_service, "profile_cache", cache)
+    return cache
@@ -0,0 +1,111 @@
+# tests/test_archive_service.py
+import datetime
+
+import pytest
+from sqlalchemy import select, func, update
+
+from app.database.models import Chat, ChatMessage, ChatArchive, User
+from app.services import archive_service, chat_service
+from app.services.message_pipeline import prepare_turn
+
+
+async def _chat(session, title: str, count: int, days_idle: int) -> int:
+    chat = await chat_service.create_chat(session, user_id=1, title=title)
+    for i in range(count):
+        await chat_service.add_message(session, chat.id, "user" if i % 2 == 0 else "assistant", f"{title} {i}")
+    await session.execute(
+        update(Chat)
+        .where(Chat.id == chat.id)
+        .values(last_message_at=datetime.datetime.utcnow() - datetime.timedelta(days=days_idle))
+    )
+    await session.commit()
+    return chat.id
+
+
+async def _hot_count(session, chat_db_id: int) -> int:
+    return await session.scalar(
+        select(func.count()).select_from(ChatMessage).where(ChatMessage.chat_id == chat_db_id)
+    )
+
+
+@pytest.mark.asyncio
+async def test_archives_only_inactive_chats(async_session_factory):
+    async with async_session_factory() as session:
+        old_id = await _chat(session, "старый", 4, days_idle=60)
+        fresh_id = await _chat(session, "свежий", 3, days_idle=1)
+
+    assert await archive_service.archive_inactive_chats(async_session_factory, older_than_days=30) == 1
+    # Повторный проход ничего не находит
+    assert await archive_service.archive_inactive_chats(async_session_factory, older_than_days=30) == 0
+
+    async with async_session_factory() as session:
+        assert await _hot_count(session, old_id) == 0
+        assert await _hot_count(session, fresh_id) == 3
+        archive = await session.get(ChatArchive, old_id)
+        assert archive.message_count == 4
+        # Счётчик чата не меняется — сообщения никуда не пропали
+        assert (await session.get(Chat, old_id)).message_count == 4
+
+
+@pytest.mark.asyncio
+async def test_history_rehydrates_with_original_ids(async_session_factory):
+    async with async_session_factory() as session:
+        chat_id = await _chat(session, "история", 5, days_idle=90)
+        before, _, _ = await chat_service.get_chat_history_page(session, chat_id, 10)
+
+    await archive_service.archive_inactive_chats(async_session_factory, older_than_days=30)
+
+    async with async_session_factory() as session:
+        assert await archive_service.ensure_chat_hot(session, chat_id) is True
+        assert await archive_service.ensure_chat_hot(session, chat_id) is False
+        after, _, _ = await chat_service.get_chat_history_page(session, chat_id, 10)
+        assert after == before
+        assert await session.get(ChatArchive, chat_id) is None
+
+
+@pytest.mark.asyncio
+async def test_rehydrate_after_new_messages_keeps_ids(async_session_factory):
+    async with async_session_factory() as session:
+        chat_id = await _chat(session, "архив", 3, days_idle=90)
+        before, _, _ = await chat_service.get_chat_history_page(session, chat_id, 10)
+
+    await archive_service.archive_inactive_chats(async_session_factory, older_than_days=30)
+
+    # Заархивированные сообщения были последними: их id не должны достаться новым
+    async with async_session_factory() as session:
+        other_id = await _chat(session, "новый", 2, days_idle=0)
+        new_ids = (await session.execute(
+            select(ChatMessage.id).where(ChatMessage.chat_id == other_id)
+        )).scalars().all()
+        assert min(new_ids) > max(m["id"] for m in before)
+
+        assert await archive_service.ensure_chat_hot(session, chat_id) is True
+        after, _, _ = await chat_service.get_chat_history_page(session, chat_id, 10)
+        assert after == before
+        assert await _hot_count(session, other_id) == 2
+
+
+@pytest.mark.asyncio
+async def test_prepare_turn_rehydrates_active_chat(async_session_factory):
+    async with async_session_factory() as session:
+        chat_id = await _chat(session, "активный", 2, days_idle=45)
+        session.add(User(chat_id=1, balance_tokens=5.0, active_chat_id=chat_id))
+        await session.commit()
+
+    await archive_service.archive_inactive_chats(async_session_factory, older_than_days=30)
+
+    async with async_session_factory() as session:
+        turn = await prepare_turn(session, 1, "продолжим", max_tokens=100)
+        assert [m["content"] for m in turn.messages] == ["активный 0", "активный 1", "продолжим"]
+        assert await _hot_count(session, chat_id) == 3
+
+
+@pytest.mark.asyncio
+async def test_delete_chat_drops_archive(async_session_factory):
+    async with async_session_factory() as session:
+        chat_id = await _chat(session, "удалить", 2, days_idle=40)
+    await archive_service.archive_inactive_chats(async_session_factory, older_than_days=30)
+
+    async with async_session_factory() as session:
+        await chat_service.delete_chat(session, chat_id)
+        assert await session.scalar(select(func.count()).select_from(ChatArchive)) == 0
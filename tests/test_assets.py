@@ -0,0 +1,56 @@
+# tests/test_assets.py
+import datetime
+from types import SimpleNamespace
+
+import pytest
+from telegram import Chat, Message, PhotoSize
+
+from app.telegram_bot.assets import AssetRegistry
+
+
+def _photo_message(file_id: str) -> Message:
+    return Message(
+        message_id=1,
+        date=datetime.datetime.now(),
+        chat=Chat(id=1, type="private"),
+        photo=[PhotoSize(file_id=file_id, file_unique_id="u", width=10, height=10)],
+    )
+
+
+@pytest.fixture
+def images_dir(tmp_path):
+    (tmp_path / "Cover.png").write_bytes(b"\x89PNG fake image")
+    (tmp_path / "notes.txt").write_text("not an image")
+    return tmp_path
+
+
+@pytest.mark.asyncio
+async def test_file_id_is_reused_and_persisted(images_dir, async_session_factory):
+    bot = SimpleNamespace(token="123:secret")
+    registry = AssetRegistry(str(images_dir))
+    await registry.load(bot, async_session_factory)
+
+    assert registry.media("Cover.png") == b"\x89PNG fake image"
+    await registry.remember("Cover.png", _photo_message("file-id-1"))
+    assert registry.media("Cover.png") == "file-id-1"
+
+    # После «рестарта» file_id поднимается из БД
+    restarted = AssetRegistry(str(images_dir))
+    await restarted.load(bot, async_session_factory)
+    assert restarted.media("Cover.png") == "file-id-1"
+
+
+@pytest.mark.asyncio
+async def test_stored_file_id_ignored_for_other_bot_or_changed_image(images_dir, async_session_factory):
+    registry = AssetRegistry(str(images_dir))
+    await registry.load(SimpleNamespace(token="123:secret"), async_session_factory)
+    await registry.remember("Cover.png", _photo_message("file-id-1"))
+
+    other_bot = AssetRegistry(str(images_dir))
+    await other_bot.load(SimpleNamespace(token="999:secret"), async_session_factory)
+    assert other_bot.media("Cover.png") == b"\x89PNG fake image"
+
+    (images_dir / "Cover.png").write_bytes(b"\x89PNG new image")
+    changed = AssetRegistry(str(images_dir))
+    await changed.load(SimpleNamespace(token="123:secret"), async_session_factory)
+    assert changed.media("Cover.png") == b"\x89PNG new image"
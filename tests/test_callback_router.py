@@ -0,0 +1,127 @@
+# tests/test_callback_router.py
+import types
+
+import pytest
+
+from app.telegram_bot import callback_router as router_module
+from app.telegram_bot.callback_router import (
+    CallbackRouter,
+    MAX_CALLBACK_DATA_BYTES,
+    callback_router,
+    encode_int,
+    ALL_CHATS,
+    CABINET_TOPUP,
+    HISTORY,
+    HISTORY_AFTER,
+    MENU,
+    OPEN_CHAT,
+    RENAME_CHAT,
+    SELECT_MODEL,
+)
+
+
+def test_encode_int_is_base36():
+    for value in (0, 7, 35, 36, 1234, -99, 2 ** 63 - 1):
+        assert int(encode_int(value), 36) == value
+    assert encode_int(1234) == "ya"
+
+
+def test_roundtrip_and_size():
+    assert OPEN_CHAT.data(1234) == "oc.ya"
+    assert callback_router.decode("oc.ya") == (OPEN_CHAT, (1234,))
+    assert callback_router.decode(MENU.data()) == (MENU, ())
+    assert callback_router.decode(SELECT_MODEL.data("gpt-4.1-mini")) == (SELECT_MODEL, ("gpt-4.1-mini",))
+
+    # Даже с тремя 64-битными id помещаемся в лимит Telegram
+    data = HISTORY_AFTER.data(2 ** 63 - 1, 2 ** 63 - 1, 10 ** 6)
+    assert len(data.encode()) <= MAX_CALLBACK_DATA_BYTES
+    assert callback_router.decode(data) == (HISTORY_AFTER, (2 ** 63 - 1, 2 ** 63 - 1, 10 ** 6))
+
+
+def test_route_validation():
+    with pytest.raises(TypeError):
+        OPEN_CHAT.data()
+    with pytest.raises(TypeError):
+        OPEN_CHAT.data("12")
+    with pytest.raises(ValueError):
+        SELECT_MODEL.data("x" * 80)
+    router = CallbackRouter()
+    router.route("a", "a", int)
+    with pytest.raises(ValueError):
+        router.route("b", "a")
+    with pytest.raises(ValueError):
+        router.route("c", "c", str, int)
+
+
+@pytest.mark.parametrize("data, expected", [
+    ("back_to_menu", (MENU, ())),
+    ("all_chats", (ALL_CHATS, (0,))),
+    ("open_chat_12", (OPEN_CHAT, (12,))),
+    ("rename_5", (RENAME_CHAT, (5,))),
+    ("cabinet_topup", (CABINET_TOPUP, ())),
+    ("model_gpt-4o", (SELECT_MODEL, ("gpt-4o",))),
+    ("history_7:page_2", (HISTORY, (7,))),
+    # Форматы, которых в выпущенных кнопках не было
+    ("history_7:after_40:page_1", None),
+    ("all_chats:page_3", None),
+    ("no_such_button", None),
+    ("open_chat_x", None),
+    ("oc.not-base36!", None),
+    # int(..., 36) принял бы "1_0", " 5" и "+5"
+    ("oc.1_0", None),
+    ("oc. 5", None),
+    ("oc.+5", None),
+])
+def test_legacy_callback_data_still_decodes(data, expected):
+    assert callback_router.decode(data) == expected
+
+
+def test_every_route_has_handler():
+    # Хендлеры регистрируются при импорте модулей
+    import app.telegram_bot.handlers.callback_general  # noqa: F401
+    import app.telegram_bot.handlers.cabinet  # noqa: F401
+
+    routes = [value for value in vars(router_module).values() if isinstance(value, router_module.Route)]
+    missing = [route.name for route in routes if route not in callback_router._handlers]
+    assert not missing
+
+
+class FakeQuery:
+    def __init__(self, data):
+        self.data = data
+        self.answered = 0
+
+    async def answer(self, *args, **kwargs):
+        self.answered += 1
+
+
+@pytest.mark.asyncio
+async def test_dispatch_passes_typed_args():
+    router = CallbackRouter()
+    route = router.route("open", "o", int)
+    calls = []
+
+    @router.handler(route)
+    async def open_handler(update, context, chat_db_id):
+        calls.append(chat_db_id)
+        return "done"
+
+    @router.unknown_handler
+    async def unknown(update, context):
+        calls.append("unknown")
+
+    query = FakeQuery(route.data(42))
+    result = await router.dispatch(types.SimpleNamespace(callback_query=query), None)
+    assert result == "done" and calls == [42] and query.answered == 1
+
+    await router.dispatch(types.SimpleNamespace(callback_query=FakeQuery("zz.1")), None)
+    assert calls == [42, "unknown"]
+    assert router.stats == {"dispatched": 1, "legacy": 0, "unknown": 1}
+
+
+def test_pattern_for_conversation_entry_points():
+    matches = callback_router.pattern(RENAME_CHAT)
+    assert matches(RENAME_CHAT.data(5))
+    assert matches("rename_5")
+    assert not matches(OPEN_CHAT.data(5))
+    assert not matches(None)
@@ -0,0 +1,86 @@
+# tests/test_chat_service.py
+import pytest
+
+from app.services import chat_service
+
+
+async def _chat_with_messages(session, count: int) -> int:
+    chat = await chat_service.create_chat(session, user_id=1, title="Чат")
+    for i in range(count):
+        await chat_service.add_message(session, chat.id, "user", f"m{i}")
+    return chat.id
+
+
+def _texts(messages) -> list[str]:
+    return [m["content"] for m in messages]
+
+
+@pytest.mark.asyncio
+async def test_history_pages_forward_and_back(async_session):
+    chat_id = await _chat_with_messages(async_session, 7)
+
+    first, has_prev, has_next = await chat_service.get_chat_history_page(async_session, chat_id, 3)
+    assert _texts(first) == ["m0", "m1", "m2"]
+    assert (has_prev, has_next) == (False, True)
+
+    second, has_prev, has_next = await chat_service.get_chat_history_page(
+        async_session, chat_id, 3, after_id=first[-1]["id"]
+    )
+    assert _texts(second) == ["m3", "m4", "m5"]
+    assert (has_prev, has_next) == (True, True)
+
+    last, has_prev, has_next = await chat_service.get_chat_history_page(
+        async_session, chat_id, 3, after_id=second[-1]["id"]
+    )
+    assert _texts(last) == ["m6"]
+    assert (has_prev, has_next) == (True, False)
+
+    back, has_prev, has_next = await chat_service.get_chat_history_page(
+        async_session, chat_id, 3, before_id=last[0]["id"]
+    )
+    assert back == second
+    assert (has_prev, has_next) == (True, True)
+
+    start, has_prev, has_next = await chat_service.get_chat_history_page(
+        async_session, chat_id, 3, before_id=back[0]["id"]
+    )
+    assert start == first
+    assert (has_prev, has_next) == (False, True)
+
+
+@pytest.mark.asyncio
+async def test_history_page_exact_fit_and_empty_chat(async_session):
+    chat_id = await _chat_with_messages(async_session, 3)
+    page, has_prev, has_next = await chat_service.get_chat_history_page(async_session, chat_id, 3)
+    assert len(page) == 3 and not has_prev and not has_next
+
+    empty_id = await _chat_with_messages(async_session, 0)
+    assert await chat_service.get_chat_history_page(async_session, empty_id, 3) == ([], False, False)
+
+
+@pytest.mark.asyncio
+async def test_add_message_maintains_chat_counters(async_session):
+    await _chat_with_messages(async_session, 3)
+    chat = (await chat_service.list_user_chats(async_session, 1, limit=10))[0]
+    await async_session.refresh(chat)
+    assert chat.message_count == 3
+    assert chat.last_message_at is not None
+
+
+@pytest.mark.asyncio
+async def test_chat_list_is_counted_paged_and_recency_ordered(async_session):
+    ids = [await _chat_with_messages(async_session, 0) for _ in range(4)]
+    # Свежее сообщение поднимает самый старый чат наверх
+    await chat_service.add_message(async_session, ids[0], "user", "ping")
+    await chat_service.set_chat_favorite(async_session, ids[2], True)
+
+    assert await chat_service.count_user_chats(async_session, 1) == 4
+    assert await chat_service.count_user_chats(async_session, 1, favorites_only=True) == 1
+    assert await chat_service.count_user_chats(async_session, 2) == 0
+
+    first = await chat_service.list_user_chats(async_session, 1, limit=2)
+    second = await chat_service.list_user_chats(async_session, 1, limit=2, offset=2)
+    assert [c.id for c in first + second] == [ids[0], ids[3], ids[2], ids[1]]
+
+    favorites = await chat_service.list_user_chats(async_session, 1, limit=5, favorites_only=True)
+    assert [c.id for c in favorites] == [ids[2]]
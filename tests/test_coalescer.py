@@ -0,0 +1,63 @@
+# tests/test_coalescer.py
+import asyncio
+
+import pytest
+
+from app.telegram_bot.coalescer import MessageCoalescer
+
+
+class Recorder:
+    def __init__(self, delay: float = 0.0):
+        self.calls = []
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+
+    async def __call__(self, update, context, text):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(self.delay)
+        self.calls.append((update, text))
+        self.active -= 1
+
+
+@pytest.mark.asyncio
+async def test_messages_within_window_are_merged():
+    handler = Recorder()
+    coalescer = MessageCoalescer(handler, window=0.05, max_wait=1.0)
+
+    coalescer.submit(1, "u1", None, "первое")
+    coalescer.submit(1, "u2", None, "второе")
+    coalescer.submit(1, "u3", None, "второе")  # дубль
+    await asyncio.sleep(0.15)
+
+    assert handler.calls == [("u3", "первое\n\nвторое")]
+    assert coalescer.stats["duplicates"] == 1
+
+
+@pytest.mark.asyncio
+async def test_same_chat_batches_run_one_at_a_time_in_order():
+    handler = Recorder(delay=0.05)
+    coalescer = MessageCoalescer(handler, window=0.01, max_wait=0.01)
+
+    coalescer.submit(1, "u1", None, "a")
+    await asyncio.sleep(0.02)  # первая пачка уже в обработке
+    coalescer.submit(1, "u2", None, "b")
+    coalescer.submit(2, "other", None, "x")
+    await coalescer.drain()
+
+    chat1 = [text for update, text in handler.calls if update != "other"]
+    assert chat1 == ["a", "b"]
+    assert ("other", "x") in handler.calls
+    assert handler.max_active == 2  # параллельно только разные чаты
+
+
+@pytest.mark.asyncio
+async def test_drain_flushes_pending_messages_immediately():
+    handler = Recorder()
+    coalescer = MessageCoalescer(handler, window=10.0, max_wait=10.0)
+
+    coalescer.submit(1, "u1", None, "hello")
+    await coalescer.drain()
+
+    assert handler.calls == [("u1", "hello")]
@@ -0,0 +1,124 @@
+# tests/test_completion_cache.py
+import httpx
+import pytest
+
+from app.telegram_bot import proxyapi_client
+from app.telegram_bot.completion_cache import CompletionCache, make_cache_key
+
+
+@pytest.fixture
+def fresh_cache(monkeypatch):
+    cache = CompletionCache(max_entries=2, ttl=60, max_temperature=0.3, sqlite_path="", enabled=True)
+    monkeypatch.setattr(proxyapi_client, "completion_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def counting_api(monkeypatch):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, json={"choices": [{"message": {"content": f"answer {len(calls)}"}}]})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(proxyapi_client, "_client", client)
+    return calls
+
+
+def test_cache_key_ignores_only_surrounding_whitespace():
+    a = make_cache_key("gpt-4o", [{"role": "user", "content": " Привет, мир!\n"}], {"temperature": 0})
+    b = make_cache_key("gpt-4o", [{"role": "user", "content": "Привет, мир!"}], {"temperature": 0})
+    c = make_cache_key("o1", [{"role": "user", "content": "Привет, мир!"}], {"temperature": 0})
+    assert a == b
+    assert a != c
+    # Отступы внутри (например, в коде) — другой запрос
+    flat = make_cache_key("gpt-4o", [{"role": "user", "content": "if x:\n  y()"}], {"temperature": 0})
+    nested = make_cache_key("gpt-4o", [{"role": "user", "content": "if x:\ny()"}], {"temperature": 0})
+    assert flat != nested
+
+
+@pytest.mark.asyncio
+async def test_low_temperature_requests_are_served_from_cache(fresh_cache, counting_api):
+    messages = [{"role": "user", "content": "Что такое Python?"}]
+
+    first = await proxyapi_client.create_chat_completion("gpt-4o", messages, temperature=0.2)
+    second = await proxyapi_client.create_chat_completion("gpt-4o", messages, temperature=0.2)
+
+    assert first == second
+    assert len(counting_api) == 1
+    assert fresh_cache.stats["memory_hits"] == 1
+    assert fresh_cache.stats["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_high_temperature_and_bypass_skip_cache(fresh_cache, counting_api):
+    messages = [{"role": "user", "content": "Сочини стих"}]
+
+    await proxyapi_client.create_chat_completion("gpt-4o", messages, temperature=1.0)
+    await proxyapi_client.create_chat_completion("gpt-4o", messages, temperature=1.0)
+    await proxyapi_client.create_chat_completion("gpt-4o", messages, temperature=0.0, cache=False)
+
+    assert len(counting_api) == 3
+    assert fresh_cache.stats["bypassed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_lru_evicts_oldest_entry():
+    cache = CompletionCache(max_entries=2, ttl=60, sqlite_path="", enabled=True)
+    await cache.put("a", {"v": 1})
+    await cache.put("b", {"v": 2})
+    await cache.get("a")
+    await cache.put("c", {"v": 3})
+
+    assert await cache.get("b") is None
+    assert await cache.get("a") == {"v": 1}
+
+
+@pytest.mark.asyncio
+async def test_sqlite_tier_survives_new_cache_instance(tmp_path):
+    path = str(tmp_path / "cache.db")
+    first = CompletionCache(sqlite_path=path, enabled=True)
+    await first.put("key", {"choices": []})
+    await first.close()
+
+    second = CompletionCache(sqlite_path=path, enabled=True)
+    assert await second.get("key") == {"choices": []}
+    assert second.stats["sqlite_hits"] == 1
+    await second.close()
+
+
+@pytest.mark.asyncio
+async def test_cached_value_cannot_be_mutated_by_caller():
+    cache = CompletionCache(max_entries=2, ttl=60, sqlite_path="", enabled=True)
+    value = {"choices": [{"message": {"content": "ответ"}}]}
+    await cache.put("key", value)
+    value["choices"].clear()
+
+    first = await cache.get("key")
+    first["choices"][0]["message"]["content"] = "испорчено"
+    assert await cache.get("key") == {"choices": [{"message": {"content": "ответ"}}]}
+
+
+@pytest.mark.asyncio
+async def test_sqlite_tier_prunes_expired_and_caps_rows(tmp_path, monkeypatch):
+    import aiosqlite
+
+    from app.telegram_bot import completion_cache as cache_module
+
+    monkeypatch.setattr(cache_module, "_PRUNE_EVERY", 2)
+    path = str(tmp_path / "cache.db")
+    expired = CompletionCache(ttl=-1, sqlite_path=path, enabled=True)
+    await expired.put("old", {"v": 0})
+    await expired.close()
+
+    cache = CompletionCache(ttl=60, sqlite_path=path, enabled=True, sqlite_max_entries=3)
+    for i in range(4):
+        await cache.put(f"k{i}", {"v": i})
+    await cache.close()
+
+    async with aiosqlite.connect(path) as db:
+        async with db.execute("SELECT key FROM completion_cache ORDER BY key") as cursor:
+            keys = [row[0] for row in await cursor.fetchall()]
+    # Просроченная строка удалена при открытии, лишняя (ближайшая к истечению) — при чистке
+    assert keys == ["k1", "k2", "k3"]
@@ -0,0 +1,80 @@
+# tests/test_compression.py
+import pytest
+from sqlalchemy import select, func, text
+
+from app.database import compression
+from app.database.compress_messages import compress_existing_messages, benchmark
+from app.database.models import ChatMessage
+from app.services import chat_service
+
+LONG_TEXT = "def handler(update, context):\n    return await reply(update)\n" * 60
+
+
+async def _storage_types(session) -> list[str]:
+    result = await session.execute(select(func.typeof(ChatMessage.content)).order_by(ChatMessage.id))
+    return result.scalars().all()
+
+
+def test_round_trip_and_threshold():
+    packed = compression.compress_text(LONG_TEXT, codec="zlib", min_bytes=100)
+    assert isinstance(packed, bytes) and packed[0] == compression.MARKER_ZLIB
+    assert len(packed) < len(LONG_TEXT)
+    assert compression.decompress_text(packed) == LONG_TEXT
+
+    assert compression.compress_text("коротко", min_bytes=100) == "коротко"
+    assert compression.decompress_text("коротко") == "коротко"
+
+    with pytest.raises(ValueError):
+        compression.decompress_text(b"\x7fxx")
+
+
+@pytest.mark.asyncio
+async def test_compression_is_transparent_to_chat_service(async_session, monkeypatch):
+    monkeypatch.setattr(compression, "CHAT_COMPRESSION_ENABLED", True)
+    monkeypatch.setattr(compression, "CHAT_COMPRESSION_MIN_BYTES", 100)
+
+    chat = await chat_service.create_chat(async_session, user_id=1, title="Код")
+    await chat_service.add_message(async_session, chat.id, "user", "покажи пример")
+    await chat_service.add_message(async_session, chat.id, "assistant", LONG_TEXT)
+
+    assert await _storage_types(async_session) == ["text", "blob"]
+    expected = [
+        {"role": "user", "content": "покажи пример"},
+        {"role": "assistant", "content": LONG_TEXT},
+    ]
+    assert await chat_service.get_chat_messages(async_session, chat.id) == expected
+    assert await chat_service.get_chat_tail(async_session, chat.id, token_budget=100_000) == expected
+    page, _, _ = await chat_service.get_chat_history_page(async_session, chat.id, 10)
+    assert [m["content"] for m in page] == ["покажи пример", LONG_TEXT]
+
+
+@pytest.mark.asyncio
+async def test_background_migration_compresses_old_rows(async_session_factory):
+    async with async_session_factory() as session:
+        chat = await chat_service.create_chat(session, user_id=1, title="Старый чат")
+        for i in range(5):
+            await chat_service.add_message(session, chat.id, "assistant", LONG_TEXT + str(i))
+        await chat_service.add_message(session, chat.id, "user", "ок")
+        # Строка, записанная до появления token_count
+        await session.execute(text("UPDATE chat_messages SET token_count = NULL WHERE id = 1"))
+        await session.commit()
+        assert await _storage_types(session) == ["text"] * 6
+
+    stats = await compress_existing_messages(async_session_factory, batch_size=2, pause=0, min_bytes=100)
+    assert stats["scanned"] == 6 and stats["compressed"] == 5
+    assert stats["bytes_after"] < stats["bytes_before"] / 5
+
+    async with async_session_factory() as session:
+        assert await _storage_types(session) == ["blob"] * 5 + ["text"]
+        messages = await chat_service.get_chat_messages(session, chat.id)
+        assert [m["content"] for m in messages] == [LONG_TEXT + str(i) for i in range(5)] + ["ок"]
+        assert await session.scalar(select(ChatMessage.token_count).where(ChatMessage.id == 1))
+
+    # Повторный запуск ничего не трогает
+    again = await compress_existing_messages(async_session_factory, batch_size=2, pause=0, min_bytes=100)
+    assert again["compressed"] == 0
+
+    report = await benchmark(async_session_factory, sample_size=10, min_bytes=100)
+    assert report["messages"] == 6 and report["compressible"] == 5
+    assert report["stored_bytes"] < report["plain_bytes"]
+    assert report["savings"] > 0.8
@@ -0,0 +1,41 @@
+# tests/test_connection.py
+import pytest
+from sqlalchemy import text
+
+from app.database import connection
+from app.database.connection import create_db_engine, pool_metrics, MeteredQueuePool
+
+
+@pytest.mark.asyncio
+async def test_sqlite_file_engine_applies_pragmas_and_meters_pool(tmp_path):
+    engine = create_db_engine(f"sqlite+aiosqlite:///{tmp_path / 'bot.db'}", echo=False)
+    pool_metrics.reset()
+    try:
+        assert isinstance(engine.pool, MeteredQueuePool)
+        async with engine.connect() as conn:
+            assert (await conn.execute(text("PRAGMA journal_mode"))).scalar() == "wal"
+            assert (await conn.execute(text("PRAGMA synchronous"))).scalar() == 1  # NORMAL
+            assert (await conn.execute(text("PRAGMA busy_timeout"))).scalar() == connection.SQLITE_BUSY_TIMEOUT_MS
+
+            snapshot = pool_metrics.snapshot(engine.pool)
+            assert snapshot["checkouts"] == 1
+            assert snapshot["checked_out"] == 1
+            assert snapshot["saturation"] == round(
+                1 / (connection.DB_POOL_SIZE + connection.DB_MAX_OVERFLOW), 4
+            )
+
+        assert pool_metrics.snapshot(engine.pool)["checked_out"] == 0
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_memory_engine_keeps_single_connection():
+    engine = create_db_engine("sqlite+aiosqlite:///:memory:", echo=False)
+    try:
+        assert not isinstance(engine.pool, MeteredQueuePool)
+        async with engine.connect() as conn:
+            assert (await conn.execute(text("SELECT 1"))).scalar() == 1
+        assert "saturation" not in pool_metrics.snapshot(engine.pool)
+    finally:
+        await engine.dispose()
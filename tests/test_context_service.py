@@ -0,0 +1,79 @@
+# tests/test_context_service.py
+import pytest
+
+from app.database.models import Chat, ChatMessage
+from app.services.chat_service import add_message, get_chat_tail
+from app.services.context_service import build_context
+from app.services.token_counter import count_tokens, MESSAGE_OVERHEAD_TOKENS
+
+
+async def _make_chat(session) -> int:
+    chat = Chat(user_id=1, title="test")
+    session.add(chat)
+    await session.commit()
+    return chat.id
+
+
+@pytest.mark.asyncio
+async def test_add_message_stores_token_count(async_session):
+    chat_id = await _make_chat(async_session)
+    await add_message(async_session, chat_id, "user", "Привет, как дела?")
+
+    msg = (await async_session.get(ChatMessage, 1))
+    assert msg.token_count == count_tokens("Привет, как дела?")
+
+
+@pytest.mark.asyncio
+async def test_get_chat_tail_returns_newest_messages_within_budget(async_session):
+    chat_id = await _make_chat(async_session)
+    for i in range(10):
+        await add_message(async_session, chat_id, "user", f"message {i} " + "x" * 30)
+    per_message = count_tokens("message 0 " + "x" * 30) + MESSAGE_OVERHEAD_TOKENS
+
+    tail = await get_chat_tail(async_session, chat_id, per_message * 3)
+
+    assert [m["content"][:9] for m in tail] == ["message 7", "message 8", "message 9"]
+
+
+@pytest.mark.asyncio
+async def test_get_chat_tail_estimates_rows_without_token_count(async_session):
+    chat_id = await _make_chat(async_session)
+    async_session.add(ChatMessage(chat_id=chat_id, role="user", content="a" * 30, token_count=None))
+    await async_session.commit()
+
+    assert await get_chat_tail(async_session, chat_id, 10 + MESSAGE_OVERHEAD_TOKENS) != []
+    assert await get_chat_tail(async_session, chat_id, 9 + MESSAGE_OVERHEAD_TOKENS) == []
+
+
+@pytest.mark.asyncio
+async def test_build_context_wraps_history_with_system_and_user(async_session):
+    chat_id = await _make_chat(async_session)
+    await add_message(async_session, chat_id, "user", "q1")
+    await add_message(async_session, chat_id, "assistant", "a1")
+
+    messages = await build_context(
+        async_session, chat_id, model="gpt-4o", instructions="Будь краток",
+        user_text="q2", max_tokens=500
+    )
+
+    assert messages == [
+        {"role": "system", "content": "Будь краток"},
+        {"role": "user", "content": "q1"},
+        {"role": "assistant", "content": "a1"},
+        {"role": "user", "content": "q2"},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_count_tokens_is_approximate_until_encoding_loaded(monkeypatch):
+    from app.services import token_counter
+
+    monkeypatch.setattr(token_counter, "_encoding", None)
+    monkeypatch.setattr(token_counter, "_encoding_loaded", False)
+    text = "Привет, как дела?"
+    assert count_tokens(text) == token_counter.estimate_tokens(text)
+
+    loaded = []
+    monkeypatch.setattr(token_counter, "load_encoding", lambda: loaded.append(True))
+    await token_counter.load_encoding_in_background()
+    assert loaded == [True]
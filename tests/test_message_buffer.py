@@ -0,0 +1,195 @@
+# tests/test_message_buffer.py
+import asyncio
+
+import pytest
+from sqlalchemy import event
+
+from app.database.models import Chat
+from app.services import chat_service
+from app.services.chat_service import MessageWriteBuffer
+
+
+async def _new_chat(session_factory, title: str = "Чат") -> int:
+    async with session_factory() as session:
+        chat = await chat_service.create_chat(session, user_id=1, title=title)
+        return chat.id
+
+
+@pytest.mark.asyncio
+async def test_not_started_buffer_writes_immediately(async_session_factory):
+    buffer = MessageWriteBuffer()
+    chat_id = await _new_chat(async_session_factory)
+
+    await buffer.add(async_session_factory, chat_id, "assistant", "сразу")
+
+    assert buffer.pending_count() == 0
+    async with async_session_factory() as session:
+        assert await chat_service.get_chat_messages(session, chat_id) == [
+            {"role": "assistant", "content": "сразу"}
+        ]
+
+
+@pytest.mark.asyncio
+async def test_flush_writes_batch_in_one_commit(async_session_factory):
+    buffer = MessageWriteBuffer(max_batch=100, interval=60)
+    first = await _new_chat(async_session_factory, "первый")
+    second = await _new_chat(async_session_factory, "второй")
+    buffer.start(async_session_factory)
+    try:
+        for i in range(3):
+            await buffer.add(async_session_factory, first, "assistant", f"a{i}", owner=10)
+        await buffer.add(async_session_factory, second, "assistant", "b0", owner=20)
+        assert buffer.pending_count() == 4
+
+        async with async_session_factory() as session:
+            # До flush сообщений в БД нет
+            assert await chat_service.get_chat_messages(session, first) == []
+
+        engine = async_session_factory.kw["bind"].sync_engine
+        commits = []
+
+        def on_commit(conn):
+            commits.append(conn)
+
+        event.listen(engine, "commit", on_commit)
+        try:
+            assert await buffer.flush() == 4
+        finally:
+            event.remove(engine, "commit", on_commit)
+        assert len(commits) == 1
+
+        async with async_session_factory() as session:
+            messages = await chat_service.get_chat_messages(session, first)
+            assert [m["content"] for m in messages] == ["a0", "a1", "a2"]
+            assert (await session.get(Chat, first)).message_count == 3
+            assert (await session.get(Chat, second)).message_count == 1
+    finally:
+        await buffer.stop()
+
+
+@pytest.mark.asyncio
+async def test_flush_by_owner_keeps_order_before_next_turn(async_session_factory):
+    buffer = MessageWriteBuffer(max_batch=100, interval=60)
+    mine = await _new_chat(async_session_factory, "мой")
+    other = await _new_chat(async_session_factory, "чужой")
+    buffer.start(async_session_factory)
+    try:
+        await buffer.add(async_session_factory, mine, "assistant", "ответ", owner=10)
+        await buffer.add(async_session_factory, other, "assistant", "чужой ответ", owner=20)
+
+        assert await buffer.flush(owner=10) == 1
+        async with async_session_factory() as session:
+            await chat_service.add_message(session, mine, "user", "следующий вопрос")
+            messages = await chat_service.get_chat_messages(session, mine)
+        assert [m["content"] for m in messages] == ["ответ", "следующий вопрос"]
+        assert buffer.pending_count() == 1
+    finally:
+        await buffer.stop()
+
+    # stop() дописывает остаток очереди
+    assert buffer.pending_count() == 0
+    async with async_session_factory() as session:
+        assert await chat_service.get_chat_messages(session, other) == [
+            {"role": "assistant", "content": "чужой ответ"}
+        ]
+
+
+@pytest.mark.asyncio
+async def test_size_trigger_flushes_in_background(async_session_factory):
+    buffer = MessageWriteBuffer(max_batch=2, interval=60)
+    chat_id = await _new_chat(async_session_factory)
+    buffer.start(async_session_factory)
+    try:
+        await buffer.add(async_session_factory, chat_id, "assistant", "раз")
+        await buffer.add(async_session_factory, chat_id, "assistant", "два")
+        for _ in range(50):
+            if buffer.stats["written"] == 2:
+                break
+            await asyncio.sleep(0.01)
+        assert buffer.stats["written"] == 2 and buffer.pending_count() == 0
+    finally:
+        await buffer.stop()
+
+
+@pytest.mark.asyncio
+async def test_delete_chat_discards_pending(async_session_factory, monkeypatch):
+    buffer = MessageWriteBuffer(max_batch=100, interval=60)
+    monkeypatch.setattr(chat_service, "message_buffer", buffer)
+    chat_id = await _new_chat(async_session_factory)
+    buffer.start(async_session_factory)
+    try:
+        await buffer.add(async_session_factory, chat_id, "assistant", "в никуда")
+        async with async_session_factory() as session:
+            await chat_service.delete_chat(session, chat_id)
+        assert buffer.pending_count() == 0
+    finally:
+        await buffer.stop()
+
+
+@pytest.mark.asyncio
+async def test_stop_during_background_write_keeps_batch(async_session_factory, monkeypatch):
+    buffer = MessageWriteBuffer(max_batch=1, interval=60)
+    chat_id = await _new_chat(async_session_factory)
+    write = buffer._write
+    started = asyncio.Event()
+
+    async def slow_write(batch):
+        started.set()
+        await asyncio.sleep(0.05)
+        await write(batch)
+
+    monkeypatch.setattr(buffer, "_write", slow_write)
+    buffer.start(async_session_factory)
+    await buffer.add(async_session_factory, chat_id, "assistant", "в процессе")
+    await started.wait()
+    await buffer.stop()
+
+    assert buffer.pending_count() == 0
+    assert buffer.stats["written"] == 1
+    async with async_session_factory() as session:
+        assert await chat_service.get_chat_messages(session, chat_id) == [
+            {"role": "assistant", "content": "в процессе"}
+        ]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_flush_requeues_batch(async_session_factory, monkeypatch):
+    buffer = MessageWriteBuffer(max_batch=100, interval=60)
+    chat_id = await _new_chat(async_session_factory)
+    buffer.start(async_session_factory)
+    await buffer.add(async_session_factory, chat_id, "assistant", "a")
+
+    async def hanging_write(batch):
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(buffer, "_write", hanging_write)
+    task = asyncio.create_task(buffer.flush(chat_db_id=chat_id))
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert buffer.pending_count() == 1
+    monkeypatch.undo()
+    await buffer.stop()
+    assert buffer.stats["written"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failing_batch_is_dropped_after_max_attempts(async_session_factory, monkeypatch):
+    buffer = MessageWriteBuffer(max_batch=100, interval=60, max_attempts=2)
+    chat_id = await _new_chat(async_session_factory)
+    buffer.start(async_session_factory)
+    await buffer.add(async_session_factory, chat_id, "assistant", "битое", owner=7)
+
+    async def broken_write(batch):
+        raise RuntimeError("disk I/O error")
+
+    monkeypatch.setattr(buffer, "_write", broken_write)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            await buffer.flush(owner=7)
+    assert buffer.pending_count() == 0
+    assert buffer.stats["dropped"] == 1
+    # Следующий запрос пользователя больше не упирается в сбойную пачку
+    assert await buffer.flush(owner=7) == 0
+    await buffer.stop()
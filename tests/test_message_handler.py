@@ -0,0 +1,69 @@
+# tests/test_message_handler.py
+import types
+
+import pytest
+
+from app.config import MAX_CAPTION_TEXT, LONG_ANSWER_CAPTION
+from app.telegram_bot.handlers import message_handler
+
+
+class FakeMessage:
+    """Сообщение с обложкой: подпись длиннее MAX_CAPTION_TEXT Telegram не принимает."""
+
+    def __init__(self):
+        self.caption = None
+        self.replies = []
+
+    def get_bot(self):
+        return types.SimpleNamespace(rate_limiter=None)
+
+    async def edit_caption(self, caption, parse_mode=None):
+        assert len(caption) <= MAX_CAPTION_TEXT, "caption is too long"
+        self.caption = caption
+
+    async def reply_text(self, text, parse_mode=None):
+        self.replies.append((text, parse_mode))
+
+
+@pytest.fixture
+def streamed(monkeypatch):
+    user_message = FakeMessage()
+    placeholder = FakeMessage()
+
+    async def fake_reply_cover(message, name, caption=None, **kwargs):
+        placeholder.caption = caption
+        return placeholder
+
+    monkeypatch.setattr(message_handler, "reply_cover", fake_reply_cover)
+    monkeypatch.setattr(message_handler, "STREAM_EDIT_INTERVAL", 0)
+
+    def run(chunks):
+        async def fake_stream(*args, **kwargs):
+            for chunk in chunks:
+                yield chunk
+
+        monkeypatch.setattr(message_handler, "routed_stream_chat_completion", fake_stream)
+        update = types.SimpleNamespace(message=user_message)
+        return message_handler._stream_answer(update, "gpt-4o", [])
+
+    return run, user_message, placeholder
+
+
+@pytest.mark.asyncio
+async def test_short_answer_stays_in_caption(streamed):
+    run, user_message, placeholder = streamed
+    answer = await run(["Привет", ", мир."])
+
+    assert answer == "Привет, мир."
+    assert placeholder.caption == "Привет, мир\\."
+    assert user_message.replies == []
+
+
+@pytest.mark.asyncio
+async def test_long_answer_goes_to_text_message(streamed):
+    run, user_message, placeholder = streamed
+    chunks = ["слово " * 50] * 6  # ~1800 символов — больше лимита подписи
+    answer = await run(chunks)
+
+    assert placeholder.caption == LONG_ANSWER_CAPTION
+    assert user_message.replies == [(answer, "MarkdownV2")]
@@ -0,0 +1,88 @@
+# tests/test_message_pipeline.py
+import asyncio
+import datetime
+
+import pytest
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.database.models import Base, User, Chat, ChatMessage
+from app.services.message_pipeline import prepare_turn
+from app.services.user_service import debit_balance
+
+
+async def _user(session, **kwargs) -> User:
+    user = User(chat_id=777, **kwargs)
+    session.add(user)
+    await session.commit()
+    return user
+
+
+@pytest.mark.asyncio
+async def test_prepare_turn_debits_balance_and_creates_chat(async_session):
+    await _user(async_session, balance_tokens=3.0, selected_model="gpt-4o")
+
+    turn = await prepare_turn(async_session, 777, "Привет", max_tokens=100)
+
+    assert turn is not None and turn.model == "gpt-4o"
+    assert turn.messages[-1] == {"role": "user", "content": "Привет"}
+    user = (await async_session.execute(select(User))).scalar_one()
+    assert user.balance_tokens == 2.0
+    assert user.active_chat_id == turn.chat_db_id
+    chat = await async_session.get(Chat, turn.chat_db_id)
+    assert chat.message_count == 1
+    assert (await async_session.execute(select(ChatMessage.content))).scalars().all() == ["Привет"]
+
+
+@pytest.mark.asyncio
+async def test_prepare_turn_uses_free_limit_then_refuses(async_session):
+    await _user(
+        async_session,
+        free_requests_used=49,
+        free_period_start=datetime.datetime.now(),
+    )
+
+    assert await prepare_turn(async_session, 777, "раз", max_tokens=100) is not None
+    assert await prepare_turn(async_session, 777, "два", max_tokens=100) is None
+
+    user = (await async_session.execute(select(User))).scalar_one()
+    assert user.free_requests_used == 50
+    count = await async_session.scalar(select(func.count()).select_from(ChatMessage))
+    assert count == 1
+
+
+@pytest.mark.asyncio
+async def test_prepare_turn_resets_free_period_of_previous_month(async_session):
+    await _user(
+        async_session,
+        free_requests_used=50,
+        free_period_start=datetime.datetime.now() - datetime.timedelta(days=40),
+    )
+
+    assert await prepare_turn(async_session, 777, "снова", max_tokens=100) is not None
+    user = (await async_session.execute(select(User))).scalar_one()
+    assert user.free_requests_used == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_debits_are_not_lost(tmp_path):
+    # Файловая БД: у каждой сессии своё соединение (in-memory делит одно)
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'bot.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
+    async with factory() as session:
+        user = await _user(session, balance_tokens=5.0)
+
+    async def debit():
+        async with factory() as session:
+            result = await debit_balance(session, user.id, 1)
+            await session.commit()
+            return result
+
+    results = await asyncio.gather(*(debit() for _ in range(7)))
+    await engine.dispose()
+
+    assert sorted(r for r in results if r is not None) == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert results.count(None) == 2
@@ -0,0 +1,77 @@
+# tests/test_model_catalog.py
+import pytest
+
+from app.config import CONTEXT_DEFAULT_WINDOW
+from app.services import context_service
+from app.telegram_bot import model_catalog as catalog_module
+from app.telegram_bot import proxyapi_client
+from app.telegram_bot.model_catalog import ModelCatalog
+
+
+def _fake_models(monkeypatch, models=None, error=None):
+    calls = []
+
+    async def fetch_models():
+        calls.append(1)
+        if error:
+            raise error
+        return models
+
+    monkeypatch.setattr(proxyapi_client, "fetch_models", fetch_models)
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_refresh_stores_metadata_and_filters_picker(monkeypatch):
+    _fake_models(monkeypatch, [
+        {"id": "gpt-4o", "owned_by": "openai"},
+        {"id": "o1"},
+        {"id": "custom-model", "context_length": 32000},
+    ])
+    catalog = ModelCatalog(ttl=3600, picker_models=["gpt-4o", "gpt-4o-mini", "o1"])
+
+    assert await catalog.refresh() is True
+    assert [m.id for m in catalog.picker()] == ["gpt-4o", "o1"]
+    assert catalog.get("gpt-4o").price_tier == "standard"
+    assert catalog.context_window("custom-model") == 32000
+    assert not catalog.is_available("gpt-4o-mini")
+
+
+@pytest.mark.asyncio
+async def test_failed_refresh_keeps_previous_catalog(monkeypatch):
+    catalog = ModelCatalog(ttl=3600, picker_models=["gpt-4o", "o1"])
+    # До первой загрузки меню строится по настройкам
+    assert [m.id for m in catalog.picker()] == ["gpt-4o", "o1"]
+
+    _fake_models(monkeypatch, [{"id": "gpt-4o"}])
+    await catalog.refresh()
+
+    _fake_models(monkeypatch, error=RuntimeError("down"))
+    assert await catalog.refresh() is False
+    assert [m.id for m in catalog.picker()] == ["gpt-4o"]
+    assert catalog.stats == {"refreshes": 1, "failures": 1}
+
+
+@pytest.mark.asyncio
+async def test_context_window_is_served_from_memory(monkeypatch):
+    catalog = ModelCatalog(ttl=3600, picker_models=[])
+    monkeypatch.setattr(context_service, "model_catalog", catalog)
+    calls = _fake_models(monkeypatch, [{"id": "big", "context_window": 1_000_000}])
+
+    assert context_service.get_context_window("big") == CONTEXT_DEFAULT_WINDOW
+    await catalog.refresh()
+    assert context_service.get_context_window("big") == 1_000_000
+    assert context_service.get_context_window("gpt-3.5-turbo") == 16385
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_start_and_stop_background_refresh(monkeypatch):
+    calls = _fake_models(monkeypatch, [{"id": "gpt-4o"}])
+    catalog = catalog_module.ModelCatalog(ttl=3600, picker_models=["gpt-4o"])
+
+    await catalog.start()
+    assert len(calls) == 1
+    assert catalog._task is not None
+    await catalog.stop()
+    assert catalog._task is None
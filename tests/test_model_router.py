@@ -0,0 +1,162 @@
+# tests/test_model_router.py
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.telegram_bot import model_router as router_module
+from app.telegram_bot import proxyapi_client
+from app.telegram_bot.model_router import ModelRouter, ModelStats
+from app.telegram_bot.resilience import ServiceBusyError
+
+
+def _router(**overrides) -> ModelRouter:
+    params = dict(
+        fallbacks={"gpt-4o": "gpt-4o-mini"},
+        latency_slo_p95=2.0,
+        error_rate_threshold=0.5,
+        min_samples=3,
+        window=60,
+    )
+    params.update(overrides)
+    return ModelRouter(**params)
+
+
+def test_model_stats_percentiles_and_expiry():
+    stats = ModelStats(window=10)
+    for i, latency in enumerate([1.0, 2.0, 3.0, 4.0]):
+        stats.record(latency, ok=True, now=100 + i)
+    stats.record(0.5, ok=False, now=104)
+
+    summary = stats.summary(now=105)
+    assert summary["samples"] == 5
+    assert summary["p50"] == 3.0
+    assert summary["p95"] == 4.0
+    assert summary["error_rate"] == pytest.approx(0.2)
+
+    # Через окно старые замеры выпадают
+    assert stats.summary(now=200)["samples"] == 0
+
+
+def test_router_falls_back_when_over_latency_slo():
+    router = _router()
+    assert router.choose("gpt-4o") == "gpt-4o"  # данных мало — не переключаем
+
+    for _ in range(3):
+        router.record("gpt-4o", 5.0, ok=True)
+    assert router.choose("gpt-4o") == "gpt-4o-mini"
+    assert router.decisions[("gpt-4o", "gpt-4o-mini", "latency_slo")] == 1
+
+
+def test_router_keeps_primary_when_fallback_is_unhealthy_too():
+    router = _router()
+    for _ in range(3):
+        router.record("gpt-4o", 1.0, ok=False)
+        router.record("gpt-4o-mini", 1.0, ok=False)
+    assert router.choose("gpt-4o") == "gpt-4o"
+    assert router.health("gpt-4o") == (False, "error_rate")
+
+
+@pytest.mark.asyncio
+async def test_routed_completion_retries_on_fallback_after_error(monkeypatch):
+    router = _router()
+    monkeypatch.setattr(router_module, "model_router", router)
+    calls = []
+
+    async def fake_completion(model, messages, **kwargs):
+        calls.append(model)
+        if model == "gpt-4o":
+            raise RuntimeError("model overloaded")
+        return {"model": model}
+
+    monkeypatch.setattr(proxyapi_client, "create_chat_completion", fake_completion)
+
+    result = await router_module.routed_chat_completion("gpt-4o", [])
+    assert result == {"model": "gpt-4o-mini"}
+    assert calls == ["gpt-4o", "gpt-4o-mini"]
+    snapshot = router.snapshot()
+    assert snapshot["models"]["gpt-4o"]["error_rate"] == 1.0
+    assert snapshot["models"]["gpt-4o-mini"]["samples"] == 1
+
+
+@pytest.mark.asyncio
+async def test_routed_completion_does_not_hide_service_busy(monkeypatch):
+    router = _router()
+    monkeypatch.setattr(router_module, "model_router", router)
+
+    async def busy(model, messages, **kwargs):
+        raise ServiceBusyError("circuit open")
+
+    monkeypatch.setattr(proxyapi_client, "create_chat_completion", busy)
+
+    with pytest.raises(ServiceBusyError):
+        await router_module.routed_chat_completion("gpt-4o", [])
+    assert router.snapshot()["models"] == {}
+
+
+@pytest.mark.asyncio
+async def test_routed_stream_switches_only_before_first_token(monkeypatch):
+    router = _router()
+    monkeypatch.setattr(router_module, "model_router", router)
+
+    async def fake_stream(model, messages, **kwargs):
+        if model == "gpt-4o":
+            raise RuntimeError("boom")
+        yield "Hel"
+        yield "lo"
+
+    monkeypatch.setattr(proxyapi_client, "stream_chat_completion", fake_stream)
+
+    deltas = [d async for d in router_module.routed_stream_chat_completion("gpt-4o", [])]
+    assert deltas == ["Hel", "lo"]
+    assert router.snapshot()["models"]["gpt-4o"]["error_rate"] == 1.0
+
+
+@pytest.mark.asyncio
+async def test_fallback_gets_only_time_left_in_shared_deadline(monkeypatch):
+    router = _router()
+    monkeypatch.setattr(router_module, "model_router", router)
+    monkeypatch.setattr(router_module, "MODEL_REQUEST_DEADLINE", 0.2)
+    calls = []
+
+    async def slow_completion(model, messages, **kwargs):
+        calls.append(model)
+        if model == "gpt-4o":
+            await asyncio.sleep(0.15)
+            raise httpx.ReadTimeout("read timeout")
+        await asyncio.sleep(1)
+        return {"model": model}
+
+    monkeypatch.setattr(proxyapi_client, "create_chat_completion", slow_completion)
+
+    started = time.monotonic()
+    with pytest.raises(httpx.ReadTimeout):
+        await router_module.routed_chat_completion("gpt-4o", [])
+    assert time.monotonic() - started < 0.5
+    assert calls == ["gpt-4o", "gpt-4o-mini"]
+    assert router.snapshot()["models"]["gpt-4o-mini"]["error_rate"] == 1.0
+
+
+@pytest.mark.asyncio
+async def test_stream_first_token_waits_within_deadline(monkeypatch):
+    router = _router()
+    monkeypatch.setattr(router_module, "model_router", router)
+    monkeypatch.setattr(router_module, "MODEL_REQUEST_DEADLINE", 0.1)
+    closed = []
+
+    async def hanging_stream(model, messages, **kwargs):
+        try:
+            await asyncio.sleep(1)
+            yield "late"
+        finally:
+            closed.append(model)
+
+    monkeypatch.setattr(proxyapi_client, "stream_chat_completion", hanging_stream)
+
+    started = time.monotonic()
+    with pytest.raises(httpx.ReadTimeout):
+        [d async for d in router_module.routed_stream_chat_completion("gpt-4o", [])]
+    assert time.monotonic() - started < 0.5
+    # Основная модель съела весь срок — fallback уже не пробуем
+    assert closed == ["gpt-4o"]
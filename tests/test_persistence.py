@@ -0,0 +1,212 @@
+# tests/test_persistence.py
+import asyncio
+
+import pytest
+from sqlalchemy import func, select
+
+from app.database.models import BotState
+from app.telegram_bot.persistence import DatabasePersistence
+
+
+def _persistence(factory, **kwargs) -> DatabasePersistence:
+    kwargs.setdefault("flush_delay", 0.01)
+    return DatabasePersistence(factory, update_interval=60, **kwargs)
+
+
+async def _rows(factory) -> dict:
+    async with factory() as session:
+        rows = (await session.execute(select(BotState.namespace, BotState.key, BotState.data))).all()
+    return {(ns, key): data for ns, key, data in rows}
+
+
+@pytest.mark.asyncio
+async def test_user_data_survives_restart_and_loads_lazily(async_session_factory):
+    persistence = _persistence(async_session_factory)
+    assert await persistence.get_user_data() == {}
+    await persistence.update_user_data(1, {"rename_chat_id": 42})
+    await persistence.update_user_data(2, {"instructions_mode": "добавить"})
+    await persistence.flush()
+
+    restarted = _persistence(async_session_factory)
+    # При старте ничего не читается
+    assert await restarted.get_user_data() == {}
+    assert restarted.stats["loads"] == 0
+
+    user_data = {"fresh": True}
+    await restarted.refresh_user_data(1, user_data)
+    assert user_data == {"fresh": True, "rename_chat_id": 42}
+    # Повторный refresh в БД не ходит и данные не перетирает
+    user_data["rename_chat_id"] = 7
+    await restarted.refresh_user_data(1, user_data)
+    assert user_data["rename_chat_id"] == 7
+    assert restarted.stats["loads"] == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_refresh_shares_one_query(async_session_factory):
+    persistence = _persistence(async_session_factory)
+    await persistence.update_chat_data(-100, {"a": 1})
+    await persistence.flush()
+
+    restarted = _persistence(async_session_factory)
+    targets = [{} for _ in range(5)]
+    await asyncio.gather(*(restarted.refresh_chat_data(-100, t) for t in targets))
+    assert restarted.stats["loads"] == 1
+    assert sum(t == {"a": 1} for t in targets) == 1
+
+
+@pytest.mark.asyncio
+async def test_changes_are_batched_and_unchanged_skipped(async_session_factory):
+    persistence = _persistence(async_session_factory, flush_delay=0.05)
+    for user_id in range(20):
+        await persistence.update_user_data(user_id, {"n": user_id})
+    await persistence.update_conversation("rename_chat", (5, 5), 1)
+    assert await _rows(async_session_factory) == {}
+
+    await asyncio.sleep(0.15)
+    assert persistence.stats["flushes"] == 1
+    assert persistence.stats["written"] == 21
+    assert len(await _rows(async_session_factory)) == 21
+
+    # PTB передаёт все user_data раз в update_interval — неизменившиеся не пишем
+    for user_id in range(20):
+        await persistence.update_user_data(user_id, {"n": user_id})
+    await persistence.flush()
+    assert persistence.stats["unchanged"] == 20
+    assert persistence.stats["flushes"] == 1
+
+
+@pytest.mark.asyncio
+async def test_max_batch_flushes_without_delay(async_session_factory):
+    persistence = _persistence(async_session_factory, flush_delay=60, max_batch=3)
+    for user_id in range(3):
+        await persistence.update_user_data(user_id, {"n": user_id})
+    await asyncio.sleep(0.05)
+    assert persistence.stats["flushes"] == 1
+    assert persistence.snapshot()["pending"] == 0
+
+
+@pytest.mark.asyncio
+async def test_conversation_states_round_trip(async_session_factory):
+    persistence = _persistence(async_session_factory)
+    await persistence.update_conversation("rename_chat", (10, 20), 1)
+    await persistence.update_conversation("rename_chat", (11, 21), 1)
+    await persistence.update_conversation("new_chat", (10, 20), 0)
+    await persistence.flush()
+
+    restarted = _persistence(async_session_factory)
+    assert await restarted.get_conversations("rename_chat") == {(10, 20): 1, (11, 21): 1}
+    # Диалог завершён (END → None) — строка удаляется
+    await restarted.update_conversation("rename_chat", (10, 20), None)
+    await restarted.flush()
+    assert await restarted.get_conversations("rename_chat") == {(11, 21): 1}
+    assert await restarted.get_conversations("new_chat") == {(10, 20): 0}
+
+
+@pytest.mark.asyncio
+async def test_drop_and_empty_data_delete_rows(async_session_factory):
+    persistence = _persistence(async_session_factory)
+    await persistence.update_user_data(1, {"x": 1})
+    await persistence.update_user_data(2, {"x": 2})
+    await persistence.flush()
+
+    await persistence.drop_user_data(1)
+    await persistence.update_user_data(2, {})
+    await persistence.flush()
+    async with async_session_factory() as session:
+        assert await session.scalar(select(func.count()).select_from(BotState)) == 0
+    assert persistence.stats["deleted"] == 2
+
+
+@pytest.mark.asyncio
+async def test_not_serializable_data_is_skipped(async_session_factory):
+    persistence = _persistence(async_session_factory)
+    await persistence.update_user_data(1, {"obj": object()})
+    await persistence.update_user_data(2, {"ok": True})
+    await persistence.flush()
+    assert list(await _rows(async_session_factory)) == [("user", "2")]
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_changes(async_session_factory):
+    def broken_factory():
+        raise RuntimeError("БД недоступна")
+
+    persistence = _persistence(broken_factory)
+    await persistence.update_user_data(1, {"x": 1})
+    # Ошибка только логируется: Application.shutdown() не должен упасть
+    await persistence.flush()
+    assert persistence.snapshot()["pending"] == 1
+    assert persistence.stats["errors"] == 1
+
+    persistence.session_factory = async_session_factory
+    await persistence.flush()
+    assert await _rows(async_session_factory) == {("user", "1"): '{"x": 1}'}
+
+
+class _SlowCommitFactory:
+    """Фабрика сессий, у которых commit ждёт delay секунд — запись «в процессе»."""
+
+    def __init__(self, factory, delay: float):
+        self.factory = factory
+        self.delay = delay
+        self.writing = asyncio.Event()
+
+    def __call__(self):
+        return _SlowCommitSession(self, self.factory())
+
+
+class _SlowCommitSession:
+    def __init__(self, owner: _SlowCommitFactory, session_cm):
+        self.owner = owner
+        self.session_cm = session_cm
+
+    async def __aenter__(self):
+        self.session = await self.session_cm.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc):
+        return await self.session_cm.__aexit__(*exc)
+
+    async def execute(self, *args, **kwargs):
+        return await self.session.execute(*args, **kwargs)
+
+    async def commit(self):
+        self.owner.writing.set()
+        await asyncio.sleep(self.owner.delay)
+        await self.session.commit()
+
+
+@pytest.mark.asyncio
+async def test_flush_during_background_write_loses_nothing(async_session_factory):
+    slow = _SlowCommitFactory(async_session_factory, delay=0.05)
+    persistence = _persistence(slow)
+    await persistence.update_user_data(1, {"x": 1})
+    await slow.writing.wait()  # отложенная запись пользователя 1 уже идёт
+
+    await persistence.update_user_data(2, {"x": 2})
+    await persistence.flush()
+
+    assert set(await _rows(async_session_factory)) == {("user", "1"), ("user", "2")}
+    assert persistence.snapshot()["pending"] == 0
+    assert persistence.stats["errors"] == 0
+
+
+@pytest.mark.asyncio
+async def test_max_batch_during_background_write_loses_nothing(async_session_factory):
+    slow = _SlowCommitFactory(async_session_factory, delay=0.05)
+    persistence = _persistence(slow, max_batch=2)
+    await persistence.update_user_data(1, {"x": 1})
+    await slow.writing.wait()
+
+    # Набралась пачка, пока идёт запись: она уходит следом, а не вместо
+    await persistence.update_user_data(2, {"x": 2})
+    await persistence.update_user_data(3, {"x": 3})
+    for _ in range(50):
+        if persistence.stats["written"] == 3:
+            break
+        await asyncio.sleep(0.01)
+
+    assert set(await _rows(async_session_factory)) == {("user", "1"), ("user", "2"), ("user", "3")}
+    assert persistence.snapshot()["pending"] == 0
+    await persistence.flush()
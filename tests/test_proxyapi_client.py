@@ -0,0 +1,68 @@
+# tests/test_proxyapi_client.py
+import json
+
+import httpx
+import pytest
+
+from app.telegram_bot import proxyapi_client
+
+
+def _sse(*chunks: str) -> bytes:
+    lines = []
+    for text in chunks:
+        event = {"choices": [{"index": 0, "delta": {"content": text}}]}
+        lines.append(f"data: {json.dumps(event, ensure_ascii=False)}\n\n")
+    lines.append(": keep-alive\n\n")
+    lines.append("data: [DONE]\n\n")
+    return "".join(lines).encode("utf-8")
+
+
+@pytest.fixture
+def mock_api(monkeypatch):
+    """Подменяет общий AsyncClient клиентом с MockTransport."""
+    requests = []
+
+    def use(handler):
+        def recording_handler(request: httpx.Request):
+            requests.append(request)
+            return handler(request)
+        client = httpx.AsyncClient(transport=httpx.MockTransport(recording_handler))
+        monkeypatch.setattr(proxyapi_client, "_client", client)
+        return requests
+
+    return use
+
+
+@pytest.mark.asyncio
+async def test_create_chat_completion_reuses_shared_client(mock_api):
+    requests = mock_api(lambda r: httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}]}))
+
+    first = proxyapi_client.get_client()
+    data = await proxyapi_client.create_chat_completion("gpt-4o", [{"role": "user", "content": "hi"}])
+
+    assert data["choices"][0]["message"]["content"] == "ok"
+    assert proxyapi_client.get_client() is first
+    assert json.loads(requests[0].content)["model"] == "gpt-4o"
+
+
+@pytest.mark.asyncio
+async def test_stream_chat_completion_yields_deltas(mock_api):
+    requests = mock_api(lambda r: httpx.Response(200, content=_sse("При", "вет", "!")))
+
+    parts = [
+        delta async for delta in proxyapi_client.stream_chat_completion(
+            "gpt-4o", [{"role": "user", "content": "hi"}]
+        )
+    ]
+
+    assert parts == ["При", "вет", "!"]
+    assert json.loads(requests[0].content)["stream"] is True
+
+
+@pytest.mark.asyncio
+async def test_stream_chat_completion_raises_on_http_error(mock_api):
+    mock_api(lambda r: httpx.Response(500, content=b"boom"))
+
+    with pytest.raises(httpx.HTTPStatusError):
+        async for _ in proxyapi_client.stream_chat_completion("gpt-4o", []):
+            pass
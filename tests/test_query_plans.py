@@ -0,0 +1,131 @@
+# tests/test_query_plans.py
+"""
+Регрессионные тесты индексов: каждый запрос сервисов chat/user/payment
+прогоняется через EXPLAIN QUERY PLAN, полный проход по таблице (SCAN) запрещён.
+"""
+import re
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.database.models import Base
+from app.services import chat_service, payment_service, user_service
+
+TABLES = {table.name for table in Base.metadata.sorted_tables}
+SCAN_RE = re.compile(r"^SCAN (\w+)")
+
+
+@pytest_asyncio.fixture
+async def traced_db():
+    """
+    In-memory БД с тестовыми данными и списком всех выполненных SQL (запрос, параметры).
+    """
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
+
+    async with factory() as session:
+        user = await user_service.get_or_create_user(session, 1001)
+        chat = await chat_service.create_chat(session, user_id=1001, title="Чат")
+        for i in range(5):
+            await chat_service.add_message(session, chat.id, "user", f"сообщение {i}")
+        await payment_service.create_transaction(session, user.id, 100, 1000, "T-Kassa")
+
+    statements = []
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _trace(conn, cursor, statement, parameters, context, executemany):
+        if not executemany:
+            statements.append((statement, parameters))
+
+    yield factory, engine, statements
+    await engine.dispose()
+
+
+async def _full_scans(engine, statements) -> list[tuple[str, str]]:
+    scans = []
+    async with engine.connect() as conn:
+        for statement, parameters in statements:
+            if statement.lstrip().upper().startswith("INSERT"):
+                continue
+            raw = await conn.get_raw_connection()
+            cursor = await raw.driver_connection.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            for row in await cursor.fetchall():
+                match = SCAN_RE.match(row[3])
+                if match and match.group(1) in TABLES:
+                    scans.append((statement, row[3]))
+    return scans
+
+
+async def _assert_indexed(engine, statements):
+    assert statements, "сервис не выполнил ни одного запроса"
+    scans = await _full_scans(engine, statements)
+    assert not scans, "\n\n".join(f"{plan}\n{sql}" for sql, plan in scans)
+
+
+@pytest.mark.asyncio
+async def test_chat_service_queries_use_indexes(traced_db):
+    factory, engine, statements = traced_db
+    async with factory() as session:
+        chat = (await chat_service.get_user_chats(session, 1001))[0]
+        await chat_service.get_favorite_chats(session, 1001)
+        await chat_service.count_user_chats(session, 1001)
+        await chat_service.list_user_chats(session, 1001, limit=5, offset=5)
+        await chat_service.list_user_chats(session, 1001, limit=5, favorites_only=True)
+        await chat_service.add_message(session, chat.id, "assistant", "ответ")
+        await chat_service.rename_chat(session, chat.id, "Новое имя")
+        await chat_service.set_chat_favorite(session, chat.id, True)
+        await chat_service.get_chat_title(session, chat.id)
+        await chat_service.is_favorite_chat(session, chat.id)
+        await chat_service.get_chat_messages(session, chat.id)
+        await chat_service.get_chat_history_page(session, chat.id, 2, after_id=2)
+        await chat_service.get_chat_history_page(session, chat.id, 2, before_id=4)
+        await chat_service.get_chat_tail(session, chat.id, token_budget=1000)
+        await chat_service.get_chat_tail(session, chat.id, token_budget=1000, after_id=2)
+        await chat_service.set_chat_summary(session, chat.id, "summary", 2)
+        await chat_service.get_chat_summary(session, chat.id)
+        await chat_service.count_unsummarized_tokens(session, chat.id, after_id=2)
+        await chat_service.get_nth_latest_message_id(session, chat.id, 3)
+        await chat_service.get_messages_between(session, chat.id, 1, 4, limit=10)
+        await chat_service.delete_chat(session, chat.id)
+    await _assert_indexed(engine, statements)
+
+
+@pytest.mark.asyncio
+async def test_user_service_queries_use_indexes(traced_db):
+    factory, engine, statements = traced_db
+    async with factory() as session:
+        await user_service.get_or_create_user(session, 1001)
+        await user_service.get_user_model(session, 1001)
+        await user_service.set_user_model(session, 1001, "gpt-4o")
+        await user_service.get_user_instructions(session, 1001)
+        await user_service.set_user_instructions(session, 1001, "Отвечай кратко")
+        await user_service.get_active_chat_id(session, 1001)
+        await user_service.set_active_chat_id(session, 1001, 1)
+    await _assert_indexed(engine, statements)
+
+
+@pytest.mark.asyncio
+async def test_payment_service_queries_use_indexes(traced_db):
+    factory, engine, statements = traced_db
+    async with factory() as session:
+        txn = await payment_service.find_transaction_by_order_id(session, "order-1")
+        assert txn is not None
+        await payment_service.get_user_transactions(session, txn.user_id)
+        await payment_service.update_transaction_by_trx_id(session, txn.id, {"status": "processing"})
+        await payment_service.complete_transaction(session, txn.id)
+    await _assert_indexed(engine, statements)
+
+
+@pytest.mark.asyncio
+async def test_full_scan_is_detected(traced_db):
+    """Проверка самого теста: запрос без индекса должен ловиться."""
+    factory, engine, statements = traced_db
+    async with factory() as session:
+        await session.execute(text("SELECT * FROM chat_messages WHERE role = 'user'"))
+    scans = await _full_scans(engine, statements)
+    assert scans and scans[0][1].startswith("SCAN chat_messages")
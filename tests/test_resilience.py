@@ -0,0 +1,149 @@
+# tests/test_resilience.py
+import asyncio
+
+import httpx
+import pytest
+
+from app.telegram_bot import proxyapi_client
+from app.telegram_bot.resilience import (
+    AdaptiveLimiter,
+    CircuitBreaker,
+    Resilience,
+    ServiceBusyError,
+    parse_retry_after,
+)
+
+
+def _resilience(**overrides) -> Resilience:
+    params = dict(
+        limiter=AdaptiveLimiter(4, 1, 8),
+        breaker=CircuitBreaker(threshold=2, reset_timeout=30),
+        max_retries=2,
+        base_delay=0.001,
+        max_delay=0.05,
+        acquire_timeout=0.05,
+    )
+    params.update(overrides)
+    return Resilience(**params)
+
+
+def _use_transport(monkeypatch, handler):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(proxyapi_client, "_client", client)
+
+
+@pytest.mark.asyncio
+async def test_retries_429_honoring_retry_after_then_succeeds(monkeypatch):
+    resilience = _resilience()
+    monkeypatch.setattr(proxyapi_client, "proxy_resilience", resilience)
+    responses = iter([
+        httpx.Response(429, headers={"Retry-After": "0.01"}),
+        httpx.Response(200, json={"data": [{"id": "gpt-4o"}]}),
+    ])
+    _use_transport(monkeypatch, lambda r: next(responses))
+
+    models = await proxyapi_client.fetch_available_models()
+
+    assert models == ["gpt-4o"]
+    assert resilience.stats["retries"] == 1
+    assert resilience.limiter.limit < 4  # перегрузка уменьшила лимит
+
+
+@pytest.mark.asyncio
+async def test_client_errors_are_not_retried(monkeypatch):
+    resilience = _resilience()
+    monkeypatch.setattr(proxyapi_client, "proxy_resilience", resilience)
+    _use_transport(monkeypatch, lambda r: httpx.Response(400, json={"error": "bad"}))
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await proxyapi_client.fetch_available_models()
+
+    assert resilience.stats["retries"] == 0
+    assert resilience.breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_and_fails_fast(monkeypatch):
+    resilience = _resilience(max_retries=0)
+    monkeypatch.setattr(proxyapi_client, "proxy_resilience", resilience)
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503)
+
+    _use_transport(monkeypatch, handler)
+
+    for _ in range(2):
+        with pytest.raises(httpx.HTTPStatusError):
+            await proxyapi_client.fetch_available_models()
+    with pytest.raises(ServiceBusyError):
+        await proxyapi_client.fetch_available_models()
+
+    assert len(calls) == 2
+    assert resilience.snapshot()["circuit_state"] == "open"
+
+
+@pytest.mark.asyncio
+async def test_half_open_probe_closes_breaker_on_success():
+    breaker = CircuitBreaker(threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    assert breaker.is_open()
+
+    await asyncio.sleep(0.02)
+    breaker.before_call()
+    with pytest.raises(ServiceBusyError):
+        breaker.before_call()  # второй пробный запрос не пускаем
+    breaker.record_success()
+
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_cancelled_probe_lets_next_probe_through():
+    resilience = _resilience(breaker=CircuitBreaker(threshold=1, reset_timeout=0.01))
+    resilience.breaker.record_failure()
+    await asyncio.sleep(0.02)
+    started = asyncio.Event()
+
+    async def hanging_request():
+        started.set()
+        await asyncio.sleep(10)
+
+    probe = asyncio.ensure_future(resilience.send(hanging_request))
+    await started.wait()
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+
+    async def ok_request():
+        return httpx.Response(200, request=httpx.Request("GET", "https://proxy.test"))
+
+    response = await resilience.send(ok_request)
+    assert response.status_code == 200
+    assert resilience.breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_limiter_rejects_when_no_slot_frees_up():
+    resilience = _resilience(limiter=AdaptiveLimiter(1, 1, 1))
+
+    async with resilience.slot():
+        with pytest.raises(ServiceBusyError):
+            async with resilience.slot():
+                pass
+
+    assert resilience.stats["rejected"] == 1
+
+
+def test_aimd_limit_grows_slowly_and_halves_on_overload():
+    limiter = AdaptiveLimiter(10, 2, 20)
+    limiter.on_success()
+    assert limiter.limit == pytest.approx(10.1)
+    limiter.on_overload()
+    assert limiter.limit == pytest.approx(5.05)
+
+
+def test_parse_retry_after_seconds_and_missing():
+    assert parse_retry_after(httpx.Response(429, headers={"Retry-After": "3"})) == 3.0
+    assert parse_retry_after(httpx.Response(429)) is None
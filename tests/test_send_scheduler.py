@@ -0,0 +1,133 @@
+# tests/test_send_scheduler.py
+import asyncio
+import time
+
+import pytest
+from telegram.error import RetryAfter
+
+from app.telegram_bot.send_scheduler import SendScheduler, TokenBucket, is_limited
+
+
+def _recorder(log: list, name: str, fail_with=None):
+    async def callback():
+        if fail_with:
+            raise fail_with.pop(0)
+        log.append((name, time.monotonic()))
+        return True
+
+    return callback
+
+
+def test_token_bucket_reserves_consecutive_slots():
+    bucket = TokenBucket(rate=2, capacity=2, now=0.0)
+    assert bucket.reserve(0.0) == 0
+    assert bucket.reserve(0.0) == 0
+    assert bucket.reserve(0.0) == pytest.approx(0.5)
+    assert bucket.reserve(0.0) == pytest.approx(1.0)
+
+    bucket.pause(0.0, 5)
+    assert bucket.delay(0.0) == 5
+    assert not bucket.is_idle(1.0)
+    assert bucket.is_idle(10.0)
+
+
+def test_only_message_methods_are_limited():
+    assert is_limited("sendPhoto")
+    assert is_limited("editMessageMedia")
+    assert is_limited("answerCallbackQuery")
+    assert not is_limited("getUpdates")
+    assert not is_limited("setWebhook")
+    assert not is_limited("sendChatAction")
+
+
+@pytest.mark.asyncio
+async def test_per_chat_rate_spaces_requests():
+    scheduler = SendScheduler(global_rate=1000, chat_rate=20, chat_burst=1)
+    log = []
+    try:
+        await asyncio.gather(*(
+            scheduler.process_request(_recorder(log, i), (), {}, "sendPhoto", {"chat_id": 5}, None)
+            for i in range(3)
+        ))
+    finally:
+        await scheduler.shutdown()
+
+    assert [name for name, _ in log] == [0, 1, 2]
+    gaps = [b[1] - a[1] for a, b in zip(log, log[1:])]
+    assert all(gap >= 0.04 for gap in gaps)
+    assert scheduler.snapshot()["lanes"]["normal"]["sent"] == 3
+
+
+@pytest.mark.asyncio
+async def test_interactive_lane_overtakes_bulk():
+    scheduler = SendScheduler(global_rate=20, chat_rate=1000, chat_burst=1000)
+    log = []
+    try:
+        # Выбираем общий запас токенов, дальше — по одному раз в 50 мс
+        await asyncio.gather(*(
+            scheduler.process_request(_recorder([], "warm"), (), {}, "sendMessage", {}, None)
+            for _ in range(20)
+        ))
+        bulk = [
+            asyncio.create_task(scheduler.process_request(
+                _recorder(log, f"bulk{i}"), (), {}, "editMessageCaption",
+                {"chat_id": 1}, {"priority": "bulk"},
+            ))
+            for i in range(3)
+        ]
+        await asyncio.sleep(0)
+        click = asyncio.create_task(scheduler.process_request(
+            _recorder(log, "click"), (), {}, "answerCallbackQuery", {}, None
+        ))
+        await asyncio.gather(click, *bulk)
+    finally:
+        await scheduler.shutdown()
+
+    names = [name for name, _ in log]
+    assert names.index("click") < names.index("bulk1")
+    assert scheduler.snapshot()["queue_depth"] == 0
+
+
+@pytest.mark.asyncio
+async def test_retry_after_pauses_chat_and_retries():
+    scheduler = SendScheduler(global_rate=1000, chat_rate=1000, chat_burst=10, max_retries=1)
+    log = []
+    failures = [RetryAfter(0)]
+    try:
+        result = await scheduler.process_request(
+            _recorder(log, "photo", fail_with=failures), (), {}, "sendPhoto", {"chat_id": 7}, None
+        )
+    finally:
+        await scheduler.shutdown()
+
+    assert result is True and len(log) == 1
+    assert scheduler.stats["retry_after"] == 1 and scheduler.stats["retried"] == 1
+
+
+@pytest.mark.asyncio
+async def test_retry_after_is_raised_when_retries_exhausted():
+    scheduler = SendScheduler(global_rate=1000, chat_rate=1000, chat_burst=10)
+    failures = [RetryAfter(3)]
+    try:
+        with pytest.raises(RetryAfter):
+            await scheduler.process_request(
+                _recorder([], "edit", fail_with=failures), (), {}, "editMessageCaption",
+                {"chat_id": 7}, {"priority": "bulk", "max_retries": 0},
+            )
+        # Чат на паузе: следующий запрос туда ждал бы окончания RetryAfter
+        assert scheduler._chats[7].paused_until > time.monotonic() + 2
+        assert scheduler.stats["gave_up"] == 1
+    finally:
+        await scheduler.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_unlimited_endpoints_bypass_queue():
+    scheduler = SendScheduler(global_rate=1, chat_rate=1, chat_burst=1)
+    scheduler._global.pause(time.monotonic(), 60)
+    log = []
+    await asyncio.wait_for(
+        scheduler.process_request(_recorder(log, "updates"), (), {}, "getUpdates", {}, None), 1
+    )
+    assert len(log) == 1
+    await scheduler.shutdown()
@@ -0,0 +1,102 @@
+# tests/test_summary_service.py
+import pytest
+
+from app.database.models import Chat
+from app.services import summary_service
+from app.services.chat_service import add_message, get_chat_summary
+from app.services.context_service import build_context, SUMMARY_PREFIX
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    calls = []
+
+    async def fake_completion(model, messages, **kwargs):
+        calls.append({"model": model, "messages": messages})
+        return {"choices": [{"message": {"content": f"summary #{len(calls)}"}}]}
+
+    monkeypatch.setattr(summary_service, "create_chat_completion", fake_completion)
+    monkeypatch.setattr(summary_service, "SUMMARY_TRIGGER_TOKENS", 100)
+    monkeypatch.setattr(summary_service, "SUMMARY_KEEP_RECENT_MESSAGES", 2)
+    monkeypatch.setattr(summary_service, "SUMMARY_BATCH_TOKENS", 1000)
+    return calls
+
+
+async def _chat_with_messages(session, count: int) -> int:
+    chat = Chat(user_id=1, title="long")
+    session.add(chat)
+    await session.commit()
+    for i in range(count):
+        role = "user" if i % 2 == 0 else "assistant"
+        await add_message(session, chat.id, role, f"turn {i} " + "слово " * 10)
+    return chat.id
+
+
+@pytest.mark.asyncio
+async def test_short_chat_is_not_summarized(async_session_factory, fake_llm):
+    async with async_session_factory() as session:
+        chat_id = await _chat_with_messages(session, 2)
+
+    await summary_service.summarize_chat_if_needed(async_session_factory, chat_id)
+
+    assert fake_llm == []
+
+
+@pytest.mark.asyncio
+async def test_long_chat_keeps_recent_tail_and_stores_summary(async_session_factory, fake_llm):
+    async with async_session_factory() as session:
+        chat_id = await _chat_with_messages(session, 12)
+
+    await summary_service.summarize_chat_if_needed(async_session_factory, chat_id)
+
+    assert fake_llm[0]["model"] == summary_service.SUMMARY_MODEL
+    async with async_session_factory() as session:
+        summary, upto_id = await get_chat_summary(session, chat_id)
+        messages = await build_context(
+            session, chat_id, model="gpt-4o", instructions="", user_text="next", max_tokens=500
+        )
+
+    assert summary.startswith("summary #")
+    assert upto_id == 10  # два последних сообщения не сворачиваются
+    assert messages[0] == {"role": "system", "content": f"{SUMMARY_PREFIX}\n{summary}"}
+    assert [m["content"][:7] for m in messages[1:3]] == ["turn 10", "turn 11"]
+    assert messages[-1] == {"role": "user", "content": "next"}
+
+
+@pytest.mark.asyncio
+async def test_short_chat_with_large_content_keeps_recent_messages(async_session_factory, fake_llm):
+    chat = Chat(user_id=1, title="short")
+    async with async_session_factory() as session:
+        session.add(chat)
+        await session.commit()
+        # Одно сообщение длиннее порога, но его нужно оставить как есть
+        await add_message(session, chat.id, "user", "слово " * 200)
+
+    await summary_service.summarize_chat_if_needed(async_session_factory, chat.id)
+
+    assert fake_llm == []
+    async with async_session_factory() as session:
+        assert await get_chat_summary(session, chat.id) == (None, None)
+
+
+@pytest.mark.asyncio
+async def test_buffered_tail_is_counted_without_flush(async_session_factory, fake_llm, monkeypatch):
+    from app.services.chat_service import MessageWriteBuffer
+
+    buffer = MessageWriteBuffer(max_batch=100, interval=60)
+    monkeypatch.setattr(summary_service, "message_buffer", buffer)
+    async with async_session_factory() as session:
+        chat_id = await _chat_with_messages(session, 11)
+    buffer.start(async_session_factory)
+    try:
+        await buffer.add(async_session_factory, chat_id, "assistant", "turn 11 " + "слово " * 10)
+
+        await summary_service.summarize_chat_if_needed(async_session_factory, chat_id)
+
+        # Буферизованный ответ — один из двух последних: сворачивать его не нужно, и буфер не сброшен
+        assert buffer.pending_count() == 1
+        async with async_session_factory() as session:
+            _, upto_id = await get_chat_summary(session, chat_id)
+        assert upto_id == 10
+    finally:
+        await buffer.stop()
@@ -0,0 +1,138 @@
+# tests/test_telegram_webhook.py
+import asyncio
+import types
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.webhooks import telegram_webhook
+
+UPDATE = {
+    "update_id": 1001,
+    "message": {
+        "message_id": 7,
+        "date": 1700000000,
+        "chat": {"id": 42, "type": "private"},
+        "from": {"id": 42, "is_bot": False, "first_name": "Тест"},
+        "text": "Привет",
+    },
+}
+
+
+class FakeBot:
+    token = "123:abc"
+
+    def __init__(self, webhook_url: str = ""):
+        self.calls = []
+        self.webhook_url = webhook_url
+
+    async def get_webhook_info(self):
+        return types.SimpleNamespace(url=self.webhook_url)
+
+    async def set_webhook(self, **kwargs):
+        self.calls.append(("set_webhook", kwargs))
+        return True
+
+    async def delete_webhook(self, **kwargs):
+        self.calls.append(("delete_webhook", kwargs))
+        return True
+
+
+def _app(secret: str = "s3cret"):
+    application = types.SimpleNamespace(bot=None, update_queue=asyncio.Queue())
+    app = FastAPI()
+    app.include_router(telegram_webhook.router)
+    app.state.telegram_application = application
+    app.state.telegram_webhook_secret = secret
+    return app, application
+
+
+def test_valid_update_goes_to_update_queue():
+    app, application = _app()
+    client = TestClient(app)
+
+    response = client.post(
+        "/telegram-webhook", json=UPDATE, headers={telegram_webhook.SECRET_HEADER: "s3cret"}
+    )
+
+    assert response.status_code == 200
+    update = application.update_queue.get_nowait()
+    assert update.update_id == 1001
+    assert update.message.text == "Привет"
+
+
+def test_wrong_or_missing_secret_is_rejected():
+    app, application = _app()
+    client = TestClient(app)
+
+    assert client.post("/telegram-webhook", json=UPDATE).status_code == 403
+    assert client.post(
+        "/telegram-webhook", json=UPDATE, headers={telegram_webhook.SECRET_HEADER: "nope"}
+    ).status_code == 403
+    assert application.update_queue.empty()
+
+
+def test_route_is_disabled_without_registered_application():
+    app = FastAPI()
+    app.include_router(telegram_webhook.router)
+    response = TestClient(app).post(
+        "/telegram-webhook", json=UPDATE, headers={telegram_webhook.SECRET_HEADER: "x"}
+    )
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_register_and_unregister(monkeypatch):
+    monkeypatch.setattr(telegram_webhook, "TELEGRAM_WEBHOOK_URL", "https://bot.example.com/")
+    monkeypatch.setattr(telegram_webhook, "TELEGRAM_WEBHOOK_SECRET", "")
+    bot = FakeBot()
+    application = types.SimpleNamespace(bot=bot)
+    state = types.SimpleNamespace()
+
+    await telegram_webhook.register_webhook(application, state)
+
+    name, kwargs = bot.calls[0]
+    assert name == "set_webhook"
+    assert kwargs["url"].startswith("https://bot.example.com/telegram-webhook?v=")
+    # Секрет выведен из токена и совпадает с тем, что проверяет route
+    assert kwargs["secret_token"] == state.telegram_webhook_secret
+    assert state.telegram_webhook_secret == telegram_webhook.webhook_secret(bot.token)
+    assert len(state.telegram_webhook_secret) >= 32
+    assert state.telegram_application is application
+
+    # По умолчанию webhook при остановке не снимается
+    await telegram_webhook.unregister_webhook(application, state)
+    assert [name for name, _ in bot.calls] == ["set_webhook"]
+    assert state.telegram_application is None
+
+    monkeypatch.setattr(telegram_webhook, "TELEGRAM_WEBHOOK_DELETE_ON_SHUTDOWN", True)
+    await telegram_webhook.unregister_webhook(application, state)
+    assert bot.calls[-1][0] == "delete_webhook"
+
+
+@pytest.mark.asyncio
+async def test_restart_reuses_registered_webhook(monkeypatch):
+    monkeypatch.setattr(telegram_webhook, "TELEGRAM_WEBHOOK_URL", "https://bot.example.com")
+    monkeypatch.setattr(telegram_webhook, "TELEGRAM_WEBHOOK_SECRET", "")
+    first_bot = FakeBot()
+    first_state = types.SimpleNamespace()
+    await telegram_webhook.register_webhook(types.SimpleNamespace(bot=first_bot), first_state)
+    registered_url = first_bot.calls[0][1]["url"]
+
+    # Следующий запуск видит тот же адрес (и отпечаток секрета) — не перерегистрирует
+    second_bot = FakeBot(webhook_url=registered_url)
+    second_state = types.SimpleNamespace()
+    second_app = types.SimpleNamespace(bot=second_bot)
+    await telegram_webhook.register_webhook(second_app, second_state)
+    assert second_bot.calls == []
+    assert second_state.telegram_webhook_secret == first_state.telegram_webhook_secret
+
+    await telegram_webhook.unregister_webhook(second_app, second_state)
+    assert second_bot.calls == []
+
+    # Сменился секрет — адрес другой, webhook ставится заново
+    monkeypatch.setattr(telegram_webhook, "TELEGRAM_WEBHOOK_SECRET", "new-secret")
+    await telegram_webhook.register_webhook(second_app, second_state)
+    assert second_bot.calls[0][0] == "set_webhook"
+    assert second_bot.calls[0][1]["secret_token"] == "new-secret"
@@ -0,0 +1,174 @@
+# tests/test_update_ordering.py
+import asyncio
+
+import pytest
+from telegram import Update
+from telegram.ext import Application, ApplicationBuilder
+
+from app.telegram_bot.coalescer import MessageCoalescer
+from app.telegram_bot.update_ordering import ChatOrderedApplication, chat_key
+
+
+def _update(update_id: int, chat_id: int) -> Update:
+    return Update.de_json(
+        {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": 1700000000,
+                "chat": {"id": chat_id, "type": "private"},
+                "text": f"m{update_id}",
+            },
+        },
+        None,
+    )
+
+
+def _application(concurrency: int) -> ChatOrderedApplication:
+    return (
+        ApplicationBuilder()
+        .token("123:TEST")
+        .application_class(ChatOrderedApplication, kwargs={"update_concurrency": concurrency})
+        .concurrent_updates(100)
+        .build()
+    )
+
+
+@pytest.fixture
+def recorded(monkeypatch):
+    """Подменяет обработку апдейта в PTB: запись начала/конца и пауза."""
+    events = []
+    delays = {}
+
+    async def fake_process_update(self, update):
+        events.append(("start", update.update_id))
+        await asyncio.sleep(delays.get(update.effective_chat.id, 0.01))
+        events.append(("end", update.update_id))
+
+    monkeypatch.setattr(Application, "process_update", fake_process_update)
+    return events, delays
+
+
+@pytest.mark.asyncio
+async def test_same_chat_is_serialized_in_order(recorded):
+    events, _ = recorded
+    application = _application(concurrency=8)
+
+    await asyncio.gather(*(application.process_update(_update(i, chat_id=1)) for i in range(1, 6)))
+
+    assert events == [(kind, i) for i in range(1, 6) for kind in ("start", "end")]
+    assert application.snapshot()["chats_in_progress"] == 0
+
+
+@pytest.mark.asyncio
+async def test_slow_chat_does_not_block_others(recorded):
+    events, delays = recorded
+    delays[1] = 0.2
+    application = _application(concurrency=8)
+
+    await asyncio.gather(
+        application.process_update(_update(1, chat_id=1)),
+        application.process_update(_update(2, chat_id=2)),
+        application.process_update(_update(3, chat_id=3)),
+    )
+
+    # Быстрые чаты закончили раньше, чем медленный
+    assert events.index(("end", 2)) < events.index(("end", 1))
+    assert events.index(("end", 3)) < events.index(("end", 1))
+
+
+@pytest.mark.asyncio
+async def test_global_limit_caps_parallel_chats(monkeypatch):
+    application = _application(concurrency=2)
+    running = 0
+    peak = 0
+
+    async def fake(self, update):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    monkeypatch.setattr(Application, "process_update", fake)
+    await asyncio.gather(*(application.process_update(_update(i, chat_id=i)) for i in range(10)))
+
+    assert peak == 2
+
+
+def test_chat_key():
+    assert chat_key(_update(1, chat_id=42)) == 42
+    assert chat_key("not an update") is None
+
+
+def _button(update_id: int, chat_id: int) -> Update:
+    return Update.de_json(
+        {
+            "update_id": update_id,
+            "callback_query": {
+                "id": str(update_id),
+                "chat_instance": "ci",
+                "data": "nc",
+                "from": {"id": chat_id, "is_bot": False, "first_name": "Тест"},
+                "message": {
+                    "message_id": 1,
+                    "date": 1700000000,
+                    "chat": {"id": chat_id, "type": "private"},
+                },
+            },
+        },
+        None,
+    )
+
+
+def _with_coalescer(monkeypatch, application, window: float, handler_delay: float):
+    """Текст уходит в coalescer (как handle_user_message), кнопки пишутся в events."""
+    events = []
+
+    async def handle_batch(update, context, text):
+        events.append(("batch start", text))
+        await asyncio.sleep(handler_delay)
+        events.append(("batch end", text))
+
+    coalescer = MessageCoalescer(handle_batch, window=window, max_wait=window, serialize=application.chat_turn)
+    application.bot_data["message_coalescer"] = coalescer
+
+    async def fake_process_update(self, update):
+        if update.message is not None:
+            coalescer.submit(update.effective_chat.id, update, None, update.message.text)
+        else:
+            events.append(("button", update.update_id))
+
+    monkeypatch.setattr(Application, "process_update", fake_process_update)
+    return events, coalescer
+
+
+@pytest.mark.asyncio
+async def test_button_after_message_waits_for_pending_batch(monkeypatch):
+    application = _application(concurrency=8)
+    events, coalescer = _with_coalescer(monkeypatch, application, window=10.0, handler_delay=0.01)
+
+    await application.process_update(_update(1, chat_id=1))
+    # Окно склейки ещё открыто, но кнопка не должна обогнать сообщение
+    await application.process_update(_button(2, chat_id=1))
+
+    assert events == [("batch start", "m1"), ("batch end", "m1"), ("button", 2)]
+    assert not coalescer.has_pending(1)
+
+
+@pytest.mark.asyncio
+async def test_coalesced_batch_holds_chat_queue_and_slot(monkeypatch):
+    application = _application(concurrency=1)
+    events, coalescer = _with_coalescer(monkeypatch, application, window=0.01, handler_delay=0.05)
+
+    await application.process_update(_update(1, chat_id=1))
+    await asyncio.sleep(0.02)  # таймер сработал, пачка обрабатывается в фоне
+    assert application.snapshot()["busy_slots"] == 1
+    await asyncio.gather(
+        application.process_update(_button(2, chat_id=1)),
+        application.process_update(_button(3, chat_id=2)),
+    )
+
+    assert events[:2] == [("batch start", "m1"), ("batch end", "m1")]
+    assert sorted(events[2:]) == [("button", 2), ("button", 3)]
+    await coalescer.drain()
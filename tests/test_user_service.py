@@ -0,0 +1,88 @@
+# tests/test_user_service.py
+import pytest
+from sqlalchemy import event
+
+from app.database.models import User
+from app.services import user_service
+from app.services.message_pipeline import prepare_turn
+
+
+class _QueryCounter:
+    def __init__(self, session):
+        self.count = 0
+        self._engine = session.bind.sync_engine
+        event.listen(self._engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def close(self):
+        event.remove(self._engine, "before_cursor_execute", self._on_execute)
+
+
+@pytest.mark.asyncio
+async def test_menu_lookups_skip_db_on_warm_cache(async_session, fresh_profile_cache):
+    await user_service.get_or_create_user(async_session, 42)
+    await user_service.set_user_model(async_session, 42, "gpt-4o")
+    await user_service.set_active_chat_id(async_session, 42, 7)
+
+    counter = _QueryCounter(async_session)
+    try:
+        assert await user_service.get_active_chat_id(async_session, 42) == 7
+        assert await user_service.get_user_model(async_session, 42) == "gpt-4o"
+        assert await user_service.get_user_instructions(async_session, 42) is None
+    finally:
+        counter.close()
+
+    assert counter.count == 0
+    assert fresh_profile_cache.stats["hits"] == 3
+    assert fresh_profile_cache.hit_rate() == 1.0
+
+
+@pytest.mark.asyncio
+async def test_cold_lookup_loads_profile_once(async_session, fresh_profile_cache):
+    async_session.add(User(chat_id=5, selected_model="gpt-4o-mini", instructions="Кратко"))
+    await async_session.commit()
+
+    counter = _QueryCounter(async_session)
+    try:
+        assert await user_service.get_user_model(async_session, 5) == "gpt-4o-mini"
+        assert await user_service.get_user_instructions(async_session, 5) == "Кратко"
+        assert await user_service.get_active_chat_id(async_session, 404) is None
+    finally:
+        counter.close()
+
+    # Один SELECT профиля + один промах по несуществующему пользователю
+    assert counter.count == 2
+    assert fresh_profile_cache.stats["misses"] == 2
+
+
+@pytest.mark.asyncio
+async def test_invalidate_and_lru_eviction(async_session, monkeypatch):
+    cache = user_service.ProfileCache(max_entries=2)
+    monkeypatch.setattr(user_service, "profile_cache", cache)
+    for chat_id in (1, 2, 3):
+        await user_service.get_or_create_user(async_session, chat_id)
+
+    assert cache.get(1) is None
+    assert cache.get(3).chat_id == 3
+    assert cache.stats["evictions"] == 1
+
+    await user_service.set_user_instructions(async_session, 3, "Новые")
+    assert cache.get(3).instructions == "Новые"
+
+    user_service.invalidate_user_profile(3)
+    assert cache.get(3) is None
+    assert await user_service.get_user_instructions(async_session, 3) == "Новые"
+
+
+@pytest.mark.asyncio
+async def test_prepare_turn_writes_balance_through(async_session, fresh_profile_cache):
+    async_session.add(User(chat_id=9, balance_tokens=2.0))
+    await async_session.commit()
+
+    turn = await prepare_turn(async_session, 9, "Привет", max_tokens=100)
+
+    profile = fresh_profile_cache.get(9)
+    assert profile.balance_tokens == 1.0
+    assert profile.active_chat_id == turn.chat_db_id